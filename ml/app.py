@@ -1,21 +1,27 @@
-import json
 import logging
 import os
 # import time
 
 import requests
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, url_for
 from flask_cors import CORS, cross_origin
 from werkzeug.utils import secure_filename
 # from utils.route import generate_routes
 
+from utils.admission import init_app as init_admission
 from utils.chatbot_text import get_chat_response
+from utils.extraction_jobs import JobQueueFull, check_callback_url, get_job, new_job_id, submit_job, upload_path
 
 # from utils.get_photo_location import get_image_gps_from_url, get_nearest_address
 from utils.itinerary import generate_itinerary
 from utils.likeminds import match_tourists
+from utils.metrics import init_app as init_metrics, provider_call
+from utils.profiler import init_app as init_profiler
+from utils.responses import init_app as init_responses
+from utils.review_analytics import get_review_store
 from utils.pdf_parsing_itinerary import process_cv
+from utils.tracing import init_app as init_tracing, span
 
 # from utils.route import get_sustainable_transport
 from utils.waste_detector import (
@@ -27,6 +33,11 @@ load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
+init_tracing(app)
+init_metrics(app)
+init_profiler(app)
+init_admission(app)
+init_responses(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +51,8 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -61,7 +74,8 @@ def process_itinerary():
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(filepath)
+        with span("upload"):
+            file.save(filepath)
 
         try:
             # Process the file and get JSON output
@@ -73,7 +87,8 @@ def process_itinerary():
             if result is None:
                 return jsonify({"error": "Failed to process itinerary"}), 500
 
-            return jsonify(result)
+            with span("serialize"):
+                return jsonify(result)
         except Exception as e:
             # Clean up the uploaded file in case of error
             if os.path.exists(filepath):
@@ -83,6 +98,49 @@ def process_itinerary():
     return jsonify({"error": "Invalid file type"}), 400
 
 
+@app.route("/process-itinerary/jobs", methods=["POST"])
+def submit_itinerary_job():
+    """Queues a document for extraction and returns its job id right away."""
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = request.files["file"]
+
+    if not file.filename:
+        return jsonify({"error": "No selected file"}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type"}), 400
+
+    callback_url = request.form.get("callback_url")
+    if callback_url:
+        try:
+            check_callback_url(callback_url)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    job_id = new_job_id()
+    filepath = upload_path(job_id, file.filename.rsplit(".", 1)[1].lower())
+    file.save(filepath)
+
+    try:
+        job = submit_job(job_id, filepath, callback_url)
+    except JobQueueFull as e:
+        os.remove(filepath)
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+
+    job["status_url"] = url_for("itinerary_job_status", job_id=job_id)
+    return jsonify(job), 202, {"Location": job["status_url"]}
+
+
+@app.route("/process-itinerary/jobs/<job_id>", methods=["GET"])
+def itinerary_job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+
 @app.route("/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "healthy"}), 200
@@ -92,7 +150,8 @@ def health_check():
 def generate_travel_itinerary():
     """Endpoint to generate and store an itinerary based on user input."""
 
-    data = request.get_json()
+    with span("parse_request"):
+        data = request.get_json()
 
     # Validate required fields
     required_fields = [
@@ -109,7 +168,8 @@ def generate_travel_itinerary():
     # Call the itinerary generation logic
     response, status_code = generate_itinerary(data)
 
-    return jsonify(response), status_code
+    with span("serialize"):
+        return jsonify(response), status_code
 
 
 # @app.route('/analyze-reviews', methods=['POST'])
@@ -135,6 +195,27 @@ def generate_travel_itinerary():
 #         return jsonify({"error": f"Internal Server Error: {str(e)}"}), 500
 
 
+@app.route("/hotels/eco-value", methods=["GET"])
+def eco_value_hotels():
+    """Best-value eco hotels in a city, optionally only those with stays at or under a nightly price."""
+    city = request.args.get("city")
+    if not city:
+        return jsonify({"error": "city is required"}), 400
+    try:
+        max_price = float(request.args["max_price"]) if request.args.get("max_price") else None
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return jsonify({"error": "max_price and limit must be numbers"}), 400
+
+    hotels = get_review_store().best_value_eco_hotels(city, max_price=max_price, limit=limit)
+    return jsonify({"city": city, "max_price": max_price, "hotels": hotels})
+
+
+@app.route("/hotels/city-stats", methods=["GET"])
+def hotel_city_stats():
+    return jsonify(get_review_store().city_stats(request.args.get("city")))
+
+
 @app.route("/match-tourists", methods=["POST"])
 @cross_origin(origins=["http://localhost:3000"], supports_credentials=True)
 def match_tourists_endpoint():
@@ -222,8 +303,7 @@ def chat():
     if not user_input:
         return jsonify({"error": "User input is required."})
 
-    response = get_chat_response(user_input)
-    return jsonify(json.loads(response))
+    return jsonify(get_chat_response(user_input))
 
 
 @app.route("/detect-waste/", methods=["POST"])
@@ -243,10 +323,11 @@ def detect_waste():
         message = f"🚨 Waste Alert! 🚨\n\nDetected waste in an image provided by a tourist:\n{waste_info}\n\nPlease take immediate action."
 
         def send_telegram_message(bot_token, chat_id, message):
-            url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+            url = f"{TELEGRAM_API_URL}/bot{bot_token}/sendMessage"
             data = {"chat_id": chat_id, "text": message, "parse_mode": "Markdown"}
-            response = requests.post(url, data=data)
-            return response.json()
+            with provider_call("telegram", "send_message") as call:
+                response = call.check_status(requests.post(url, data=data))
+                return response.json()
 
         response = send_telegram_message(bot_token, chat_id, message)
         return jsonify({"waste_info": waste_info, "telegram_response": response})
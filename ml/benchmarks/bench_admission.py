@@ -0,0 +1,159 @@
+"""A traffic spike on the model-bound endpoints, with and without admission control.
+
+Starts the provider stubs and the app under gunicorn (one worker, so its
+thread pool is the bottleneck), then sends /chat/ and /generate-itinerary
+requests at a fixed arrival rate above its capacity while probing
+/health. Reports per-endpoint outcomes and latency, and how long /health
+took during the spike.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_admission
+    python -m benchmarks.bench_admission --rate 40 --duration 20 --latency groq=3
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.stubs import StubServer, parse_latency
+
+ML_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_TIMEOUT_S = 30
+HEALTH_INTERVAL_S = 0.1
+
+
+def start_app(port, env):
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                               cwd=ML_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("App process exited during startup")
+        try:
+            if requests.get(f"{base}/health", timeout=1).ok:
+                return process, base
+        except requests.RequestException:
+            # Connections are accepted before the master has finished preloading
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("App did not become healthy in time")
+
+
+def spike(base, rate, duration, itinerary_share):
+    """Open-loop arrivals at `rate` per second for `duration` seconds.
+
+    Returns {endpoint: [(status or "timeout", seconds, retry_after)]}.
+    """
+    def send(job):
+        endpoint, i = job
+        start = time.perf_counter()
+        try:
+            # Distinct questions and trips, so identical calls aren't coalesced or cached
+            if endpoint == "chat":
+                response = requests.post(f"{base}/chat/", json={"user_input": f"Tell me about the Maurya Empire ({i})"},
+                                         timeout=CLIENT_TIMEOUT_S)
+            else:
+                response = requests.post(f"{base}/generate-itinerary", json={
+                    "name": "Asha", "numberOfPeople": 4, "daysOfVisit": 3, "placesToVisit": f"Goa {i}",
+                    "dateOfVisit": "2025-03-10", "currentStay": "Taj Fort Aguada",
+                }, timeout=CLIENT_TIMEOUT_S)
+            status, retry_after = response.status_code, response.headers.get("Retry-After")
+        except requests.RequestException:
+            status, retry_after = "timeout", None
+        return endpoint, status, time.perf_counter() - start, retry_after
+
+    total = int(rate * duration)
+    every = max(1, round(1 / itinerary_share)) if itinerary_share else total + 1
+    futures = []
+    with ThreadPoolExecutor(max_workers=total) as pool:
+        started = time.perf_counter()
+        for i in range(total):
+            time.sleep(max(0.0, started + i / rate - time.perf_counter()))
+            futures.append(pool.submit(send, ("itinerary" if i % every == 0 else "chat", i)))
+    results = {}
+    for future in futures:
+        endpoint, status, seconds, retry_after = future.result()
+        results.setdefault(endpoint, []).append((status, seconds, retry_after))
+    return results
+
+
+def probe_health(base, stop, latencies):
+    while not stop.wait(HEALTH_INTERVAL_S):
+        start = time.perf_counter()
+        try:
+            requests.get(f"{base}/health", timeout=CLIENT_TIMEOUT_S)
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            latencies.append(float("inf"))
+
+
+def report(label, results, health):
+    print(f"\n{label}")
+    for endpoint, outcomes in results.items():
+        statuses = Counter(status for status, _, _ in outcomes)
+        served = np.array([seconds for status, seconds, _ in outcomes if status == 200]) * 1000
+        shed = np.array([seconds for status, seconds, _ in outcomes if status in (429, 503)]) * 1000
+        retry_after = sorted({int(r) for _, _, r in outcomes if r})
+        print(f"  {endpoint:<10} {dict(statuses)}")
+        if len(served):
+            print(f"  {'':<10} served p50 {np.percentile(served, 50):.0f} ms, p99 {np.percentile(served, 99):.0f} ms")
+        if len(shed):
+            print(f"  {'':<10} shed after p50 {np.percentile(shed, 50):.0f} ms, p99 {np.percentile(shed, 99):.0f} ms; "
+                  f"Retry-After values {retry_after}")
+    health = np.array(health) * 1000
+    answered = health[np.isfinite(health)]
+    print(f"  /health    p50 {np.percentile(answered, 50):.0f} ms, p99 {np.percentile(answered, 99):.0f} ms, "
+          f"max {answered.max():.0f} ms over {len(health)} probes, {len(health) - len(answered)} timed out")
+
+
+def run(args):
+    stubs = StubServer(latency=parse_latency(args.latency)).start()
+    workdir = tempfile.mkdtemp(prefix="bench-admission-")
+    try:
+        for admission in ("false", "true"):
+            env = dict(os.environ, **stubs.env())
+            env.update({
+                "ADMISSION_ENABLED": admission,
+                "WEB_WORKERS": "1",
+                "BIND": f"127.0.0.1:{args.port}",
+                "TOURIST_DB_PATH": os.path.join(workdir, "tourists.db"),
+                "TOURIST_FEATURES_DIR": os.path.join(workdir, "tourist_features"),
+                "SINGLEFLIGHT_DIR": os.path.join(workdir, "singleflight"),
+                "PYTHONPATH": ML_ROOT,
+            })
+            app_process, base = start_app(args.port, env)
+            health, stop = [], threading.Event()
+            prober = threading.Thread(target=probe_health, args=(base, stop, health), daemon=True)
+            try:
+                prober.start()
+                results = spike(base, args.rate, args.duration, args.itinerary_share)
+                stop.set()
+                prober.join()
+            finally:
+                app_process.send_signal(signal.SIGTERM)
+                app_process.wait()
+            report(f"admission control {'on' if admission == 'true' else 'off'}", results, health)
+    finally:
+        stubs.stop()
+    print(f"\nUpstream calls: {stubs.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20, help="arrivals per second during the spike")
+    parser.add_argument("--duration", type=float, default=10, help="seconds the spike lasts")
+    parser.add_argument("--itinerary-share", type=float, default=0.2, help="fraction of arrivals that are itineraries")
+    parser.add_argument("--latency", action="append", default=["groq=2", "openai=2", "gemini=2"],
+                        help="stub latency as provider=seconds")
+    parser.add_argument("--port", type=int, default=5056)
+    run(parser.parse_args())
@@ -0,0 +1,303 @@
+"""End-to-end throughput benchmark of the Flask app against local provider stubs.
+
+Starts the stub servers, launches the app in a child process with its
+clients pointed at them, then drives each endpoint with closed-loop workers
+at several concurrency levels and reports RPS, p50/p99 latency and the app
+process's peak RSS. Every endpoint/concurrency pair is measured in several
+interleaved runs. The median of those runs is compared against the saved
+baseline, so one noisy run doesn't get flagged as a regression.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_e2e                       # compare with baseline
+    python -m benchmarks.bench_e2e --save-baseline       # record a new baseline
+    python -m benchmarks.bench_e2e --endpoint chat --concurrency 1 --concurrency 16
+    python -m benchmarks.bench_e2e --repeats 5 --duration 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from benchmarks.stubs import StubServer, parse_latency
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "e2e.json")
+ML_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONCURRENCY = [1, 8, 32]
+DEFAULT_DURATION_S = 10.0
+# Runs per endpoint/concurrency; their median is what gets saved and compared
+DEFAULT_REPEATS = 3
+# Relative change in RPS or p99 beyond which a result counts as a regression
+DEFAULT_TOLERANCE = 0.2
+# Below this many requests per run a p99 is little more than the slowest request, too noisy to gate on
+MIN_P99_REQUESTS = 100
+
+
+def minimal_pdf(text):
+    """A one-page PDF containing `text`, built by hand so no PDF writer is needed."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+ITINERARY_PDF = minimal_pdf("Goa Getaway: 4 travellers, 10-03-2025 to 12-03-2025, staying at Taj Fort Aguada.")
+
+
+def endpoint_requests():
+    """Endpoint name -> function issuing one request with a requests.Session."""
+    def generate_itinerary(session, base, i):
+        # A different traveller each time, or every request after the first is a singleflight cache hit
+        return session.post(f"{base}/generate-itinerary", json={
+            "name": f"traveller-{i}", "numberOfPeople": 4, "daysOfVisit": 3, "placesToVisit": "Goa",
+            "dateOfVisit": "2025-03-10", "currentStay": "Taj Fort Aguada",
+        })
+
+    def chat(session, base, i):
+        return session.post(f"{base}/chat/", json={"user_input": "Tell me about the Maurya Empire"})
+
+    def process_itinerary(session, base, i):
+        files = {"file": (f"itinerary-{i}.pdf", ITINERARY_PDF, "application/pdf")}
+        return session.post(f"{base}/process-itinerary", files=files)
+
+    def match_tourists(session, base, i):
+        return session.post(f"{base}/match-tourists", json={
+            "name": f"tourist-{i}", "placetovisit": "Goa", "currentstay": "Taj Fort Aguada",
+            "date": "2025-03-10", "purposeofvisit": "beaches and forts",
+        })
+
+    def detect_waste(session, base, i):
+        return session.post(f"{base}/detect-waste/", json={"image_url": "https://example.com/beach.jpg"})
+
+    return {
+        "generate-itinerary": generate_itinerary,
+        "chat": chat,
+        "process-itinerary": process_itinerary,
+        "match-tourists": match_tourists,
+        "detect-waste": detect_waste,
+    }
+
+
+def rss_mb(pid):
+    """Resident set size of a process in MiB (Linux /proc)."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_app(port, env):
+    code = (
+        "from werkzeug.serving import make_server; import app; "
+        f"make_server('127.0.0.1', {port}, app.app, threaded=True).serve_forever()"
+    )
+    process = subprocess.Popen([sys.executable, "-c", code], cwd=ML_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("App process exited during startup")
+        try:
+            if requests.get(f"{base}/health", timeout=1).ok:
+                return process, base
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("App did not become healthy in time")
+
+
+def drive(send, base, concurrency, duration, pid):
+    """Closed-loop load: `concurrency` workers send requests back to back for `duration` seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        session = requests.Session()
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                # Unique across levels too, so no request repeats one still in a result cache
+                ok = send(session, base, f"{concurrency}-{worker_id}-{i}").status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+            i += 1
+
+    peak_rss = [rss_mb(pid)]
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(0.1):
+            peak_rss[0] = max(peak_rss[0], rss_mb(pid))
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "requests": int(len(latencies)),
+        "errors": errors[0],
+        "rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1) if len(latencies) else None,
+        "peak_rss_mb": round(peak_rss[0], 1),
+    }
+
+
+def median_result(runs):
+    """Field-wise median of repeated runs of one endpoint/concurrency; errors are summed over the runs."""
+    result = {}
+    for field in runs[0]:
+        values = [run[field] for run in runs if run[field] is not None]
+        result[field] = round(float(np.median(values)), 2) if values else None
+    result["requests"] = int(result["requests"])
+    result["errors"] = sum(run["errors"] for run in runs)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Lists human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if base["rps"] and result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{key}: RPS {result['rps']} < baseline {base['rps']}")
+        enough_samples = min(result["requests"], base["requests"]) >= MIN_P99_REQUESTS
+        if enough_samples and base["p99_ms"] and result["p99_ms"] and result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {result['p99_ms']} ms > baseline {base['p99_ms']} ms")
+        if base["peak_rss_mb"] and result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: peak RSS {result['peak_rss_mb']} MiB > baseline {base['peak_rss_mb']} MiB")
+    return regressions
+
+
+def print_header(label):
+    print(f"{label:<6} {'endpoint':<20} {'conc':>5} {'reqs':>6} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'rss MiB':>8}")
+
+
+def print_row(label, name, concurrency, result):
+    print(f"{label:<6} {name:<20} {concurrency:>5} {result['requests']:>6} {result['errors']:>5} {result['rps']:>8} "
+          f"{result['p50_ms']:>9} {result['p99_ms']:>9} {result['peak_rss_mb']:>8}")
+
+
+def app_env(stubs):
+    """Environment for a fresh app process, with its own empty data directory."""
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    env = dict(os.environ, **stubs.env())
+    env.update({
+        "TOURIST_DB_PATH": os.path.join(workdir, "tourists.db"),
+        "TOURIST_FEATURES_DIR": os.path.join(workdir, "tourist_features"),
+        "SINGLEFLIGHT_DIR": os.path.join(workdir, "singleflight"),
+        "PYTHONPATH": ML_ROOT,
+        # Raw capacity is measured here; shedding under a spike is bench_admission's job
+        "ADMISSION_ENABLED": "false",
+    })
+    return env
+
+
+def run(args):
+    stubs = StubServer(latency=parse_latency(args.latency)).start()
+    endpoints = endpoint_requests()
+    selected = args.endpoint or list(endpoints)
+    runs = {}
+    try:
+        print_header("run")
+        # Repeats are interleaved, so a slow spell on the host lands in one run of many pairs, not every run of
+        # one. Each repeat gets a fresh app, or the tourists saved by earlier runs would slow the later ones.
+        for repeat in range(1, args.repeats + 1):
+            app_process, base = start_app(args.port, app_env(stubs))
+            try:
+                for name in selected:
+                    for concurrency in args.concurrency or DEFAULT_CONCURRENCY:
+                        result = drive(endpoints[name], base, concurrency, args.duration, app_process.pid)
+                        runs.setdefault(f"{name}@{concurrency}", []).append(result)
+                        print_row(repeat, name, concurrency, result)
+            finally:
+                app_process.terminate()
+                app_process.wait()
+    finally:
+        stubs.stop()
+    print(f"Upstream calls: {stubs.calls}")
+
+    results = {key: median_result(key_runs) for key, key_runs in runs.items()}
+    print()
+    print_header("")
+    for key, result in results.items():
+        name, concurrency = key.rsplit("@", 1)
+        print_row("median", name, concurrency, result)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline recorded yet; run with --save-baseline")
+        return 0
+    with open(BASELINE_PATH) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", action="append", choices=list(endpoint_requests()))
+    parser.add_argument("--concurrency", action="append", type=int)
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_S, help="seconds per endpoint/concurrency")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="runs per endpoint/concurrency")
+    parser.add_argument("--latency", action="append", help="stub latency as provider=seconds, e.g. openai=0.8")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true")
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""Per-worker memory of the app under gunicorn for different worker counts.
+
+Three modes:
+  lazy      every worker imports the app and loads the models itself
+  preload   the master loads them and forks; the collector still runs over the shared heap
+  frozen    preload plus gc.freeze() before forking (the default)
+
+Each worker serves some warm-up requests before its RSS and PSS are read
+from /proc/<pid>/smaps_rollup. Linux only.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_prefork
+    python -m benchmarks.bench_prefork --workers 1 4 8 --requests 400
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from utils.prefork import memory_usage
+
+MODES = {
+    "lazy": {"PRELOAD_MODELS": "false", "GC_FREEZE": "false"},
+    "preload": {"PRELOAD_MODELS": "true", "GC_FREEZE": "false"},
+    "frozen": {"PRELOAD_MODELS": "true", "GC_FREEZE": "true"},
+}
+WARMUP_PATHS = ["/hotels/city-stats", "/hotels/eco-value?city=Goa", "/hotels/city-stats?city=Mumbai", "/metrics"]
+MB = 1024 * 1024
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def serve(workers, mode, port):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS="4", BIND=f"127.0.0.1:{port}", **MODES[mode])
+    master = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).ok and len(children(master.pid)) == workers:
+                return master
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    master.kill()
+    raise RuntimeError(f"gunicorn with {workers} workers ({mode}) did not start")
+
+
+def measure(workers, mode, port, requests_per_worker):
+    master = serve(workers, mode, port)
+    try:
+        urls = [f"http://127.0.0.1:{port}{WARMUP_PATHS[i % len(WARMUP_PATHS)]}"
+                for i in range(requests_per_worker * workers)]
+        with ThreadPoolExecutor(max_workers=4 * workers) as pool:
+            list(pool.map(lambda url: requests.get(url, timeout=30).status_code, urls))
+        usage = [memory_usage(pid) for pid in children(master.pid)]
+        return memory_usage(master.pid), [u for u in usage if u]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def run(args):
+    print(f"{'workers':>7} {'mode':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'shared/worker':>14} "
+          f"{'total PSS':>10}")
+    for workers in args.workers:
+        for mode in args.mode or list(MODES):
+            master, usage = measure(workers, mode, args.port, args.requests)
+            rss = sum(u["rss"] for u in usage) / len(usage) / MB
+            pss = sum(u["pss"] for u in usage) / len(usage) / MB
+            shared = sum(u["shared"] for u in usage) / len(usage) / MB
+            total = (master["pss"] + sum(u["pss"] for u in usage)) / MB
+            print(f"{workers:>7} {mode:>8} {rss:>9.0f}MB {pss:>9.0f}MB {shared:>12.0f}MB {total:>8.0f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--mode", action="append", choices=list(MODES))
+    parser.add_argument("--requests", type=int, default=200, help="warm-up requests per worker")
+    parser.add_argument("--port", type=int, default=8765)
+    run(parser.parse_args())
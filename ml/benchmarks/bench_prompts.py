@@ -0,0 +1,76 @@
+"""Compares itinerary prompt versions: input tokens, cacheable prefix and latency.
+
+Offline (default) it only counts tokens, and whether the shared prefix is
+long enough for OpenAI's prompt caching to apply at all. With --live it also
+sends each version to the configured OpenAI endpoint (OPENAI_API_KEY /
+OPENAI_BASE_URL, so the local stubs work too) and reports latency and cached
+prompt tokens.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_prompts
+    python -m benchmarks.bench_prompts --live 5
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from utils.itinerary_prompts import PROMPTS, build_messages, count_message_tokens, count_tokens
+
+SAMPLE_TRIPS = [
+    dict(user_name="Asha", tourists=4, days=3, place="Goa", date="2025-03-10", hotel="Taj Fort Aguada"),
+    dict(user_name="Ravi", tourists=2, days=2, place="Jaipur", date="2025-11-02", hotel="Rambagh Palace"),
+    dict(user_name="Meera", tourists=6, days=3, place="Munnar", date="2025-12-20", hotel="Blanket Hotel & Spa"),
+]
+
+# OpenAI caches only prompts whose shared prefix is at least this long
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+
+def shared_prefix_tokens(messages_a, messages_b):
+    """Tokens at the start of the serialized prompt that are identical between two requests."""
+    a = "".join(f"{m['role']}:{m['content']}" for m in messages_a)
+    b = "".join(f"{m['role']}:{m['content']}" for m in messages_b)
+    prefix = os.path.commonprefix([a, b])
+    return count_tokens(prefix)
+
+
+def live_latency(messages, runs):
+    import openai
+
+    client = openai.OpenAI()
+    latencies, prompt_tokens, cached_tokens = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.chat.completions.create(model="gpt-4o-mini", messages=messages,
+                                                  response_format={"type": "json_object"})
+        latencies.append(time.perf_counter() - start)
+        usage = response.usage
+        prompt_tokens.append(usage.prompt_tokens if usage else 0)
+        details = getattr(usage, "prompt_tokens_details", None) if usage else None
+        cached_tokens.append(getattr(details, "cached_tokens", 0) or 0)
+    return np.median(latencies) * 1000, np.mean(prompt_tokens), np.mean(cached_tokens)
+
+
+def run(live_runs):
+    header = f"{'version':<8} {'input tokens':>13} {'shared prefix':>14} {'cacheable':>10}"
+    if live_runs:
+        header += f" {'p50 ms':>9} {'api prompt tok':>15} {'cached tok':>11}"
+    print(header)
+    for version in PROMPTS["itinerary"]:
+        prompts = [build_messages("itinerary", version, **trip) for trip in SAMPLE_TRIPS]
+        tokens = np.mean([count_message_tokens(messages) for messages in prompts])
+        prefix = min(shared_prefix_tokens(prompts[0], other) for other in prompts[1:])
+        cacheable = "yes" if prefix >= PROVIDER_CACHE_MIN_TOKENS else "no"
+        line = f"{version:<8} {tokens:>13.0f} {prefix:>14} {cacheable:>10}"
+        if live_runs:
+            latency, api_tokens, cached = live_latency(prompts[0], live_runs)
+            line += f" {latency:>9.0f} {api_tokens:>15.0f} {cached:>11.0f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", type=int, default=0, metavar="RUNS", help="also time RUNS real calls per version")
+    run(parser.parse_args().live)
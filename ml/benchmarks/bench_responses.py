@@ -0,0 +1,101 @@
+"""Bytes on the wire and CPU per response for the app's JSON payloads.
+
+"before" is the previous path: Flask's stdlib JSON provider, no compression,
+and for chat the extra json.dumps(indent=4) / json.loads round trip. The other
+rows go through utils.responses (orjson, then the negotiated encoding). Each
+request runs through the full Flask app (routing, hooks, serialization,
+compression); CPU is the server side only, best of three runs.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_responses
+    python -m benchmarks.bench_responses --requests 2000
+"""
+import argparse
+import copy
+import io
+import json
+import time
+
+from flask import Flask, jsonify
+from werkzeug.test import EnvironBuilder
+
+from benchmarks.stubs import DEFAULT_PAYLOADS, ITINERARY_JSON
+from utils.responses import init_app as init_responses
+
+
+def itinerary(days):
+    trip = copy.deepcopy(ITINERARY_JSON)
+    template = trip["days"][0]
+    trip["days"] = [dict(copy.deepcopy(template), day=day, title=f"Goa Day {day}") for day in range(1, days + 1)]
+    return trip
+
+
+def payloads():
+    chat = {
+        "user_input": "Tell me about the Maurya Empire",
+        "bot_response": DEFAULT_PAYLOADS["chat"] * 8,
+        "metadata": {"source": "AI-generated", "model": "llama-3.3-70b-versatile"},
+    }
+    hotels = {"city": "Goa", "max_price": None, "hotels": [
+        {"hotel": f"Hotel {i}", "city": "Goa", "reviews": 40 + i % 17, "mean_sentiment": round(5 + i % 7 * 0.31, 3),
+         "eco_share": round(0.5 + i % 5 * 0.1, 3), "mean_price": 4000 + i * 7, "price_range": [3500.0, 9000.0],
+         "price_band": "mid-range", "value_score": round(1.2 - i * 0.0004, 4)}
+        for i in range(2500)
+    ]}
+    return {"chat": chat, "itinerary-3d": itinerary(3), "itinerary-14d": itinerary(14), "hotels-2500": hotels}
+
+
+def build_apps(data):
+    before, after = Flask("before"), Flask("after")
+    init_responses(after)
+
+    @before.route("/chat")
+    def chat_before():
+        # What get_chat_response and the /chat/ route used to do
+        return jsonify(json.loads(json.dumps(data["chat"], indent=4)))
+
+    @before.route("/<name>")
+    def payload_before(name):
+        return jsonify(data[name])
+
+    @after.route("/<name>")
+    def payload_after(name):
+        return jsonify(data[name])
+
+    return before, after
+
+
+def measure(app, path, encoding, requests, repeats=3):
+    """(body bytes, server CPU microseconds per response), the best of `repeats` runs."""
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    environ = EnvironBuilder(path=path, headers=headers).get_environ()
+
+    def one():
+        return b"".join(app.wsgi_app(dict(environ, **{"wsgi.input": io.BytesIO()}), lambda status, headers: None))
+
+    size = len(one())
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.process_time()
+        for _ in range(requests):
+            one()
+        best = min(best, (time.process_time() - start) / requests * 1e6)
+    return size, best
+
+
+def run(args):
+    data = payloads()
+    before, after = build_apps(data)
+    print(f"{'payload':<14} {'path':<8} {'bytes':>9} {'vs before':>10} {'CPU us':>8} {'vs before':>10}")
+    for name in data:
+        base_size, base_cpu = measure(before, f"/{name}", None, args.requests)
+        print(f"{name:<14} {'before':<8} {base_size:>9} {'':>10} {base_cpu:>8.0f} {'':>10}")
+        for encoding in ("identity", "gzip", "br"):
+            size, cpu = measure(after, f"/{name}", encoding, args.requests)
+            print(f"{'':<14} {encoding:<8} {size:>9} {size / base_size:>10.0%} {cpu:>8.0f} {cpu / base_cpu:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per payload and encoding")
+    run(parser.parse_args())
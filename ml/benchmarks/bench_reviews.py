@@ -0,0 +1,61 @@
+"""Benchmarks the columnar review store: incremental appends and the eco-value query.
+
+Grows a store in a temporary directory with synthetic reviews shaped like the
+bundled corpus, timing each append (which re-folds the per-hotel totals) and
+the best-value query at each size.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_reviews
+"""
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from utils.review_analytics import ReviewStore, reviews_from_csv
+
+CORPUS = "data/hotel_reviews_extended (1).csv"
+BATCH_ROWS = 100_000
+BATCHES = 10
+QUERY_REPEATS = 200
+
+
+def synthetic_batch(rng, corpus, n_rows):
+    """Resamples corpus rows with jittered scores and prices across 5000 hotels."""
+    rows = rng.integers(0, len(corpus), n_rows)
+    hotels = np.char.add("Hotel ", rng.integers(0, 5000, n_rows).astype(str))
+    return pa.table({
+        "hotel": pa.array(hotels.astype(object)),
+        "city": corpus["city"].take(pa.array(rows)),
+        "review": corpus["review"].take(pa.array(rows)),
+        "sentiment": pa.array(np.clip(corpus["sentiment"].to_numpy()[rows] + rng.normal(0, 1, n_rows), -10, 10)),
+        "price": pa.array(corpus["price"].to_numpy()[rows] * rng.uniform(0.8, 1.2, n_rows)),
+        "eco": corpus["eco"].take(pa.array(rows)),
+    })
+
+
+def run():
+    rng = np.random.default_rng(3)
+    corpus = reviews_from_csv(CORPUS)
+    with tempfile.TemporaryDirectory() as root:
+        store = ReviewStore(root)
+        print(f"{'reviews':>10} {'append ms':>10} {'query ms':>9} {'hotels':>7}")
+        total = 0
+        for _ in range(BATCHES):
+            batch = synthetic_batch(rng, corpus, BATCH_ROWS)
+            start = time.perf_counter()
+            total += store.append(batch)
+            append_ms = (time.perf_counter() - start) * 1000
+
+            store.best_value_eco_hotels("Goa", max_price=20000)  # derive stats for this version once
+            start = time.perf_counter()
+            for _ in range(QUERY_REPEATS):
+                hotels = store.best_value_eco_hotels("Goa", max_price=20000, limit=10)
+            query_ms = (time.perf_counter() - start) * 1000 / QUERY_REPEATS
+            print(f"{total:>10} {append_ms:>10.1f} {query_ms:>9.3f} {len(store.hotel_stats()['hotel']):>7}")
+        print("Top 3 in Goa under 20000:", [(h["hotel"], h["value_score"]) for h in hotels[:3]])
+
+
+if __name__ == "__main__":
+    run()
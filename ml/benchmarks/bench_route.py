@@ -0,0 +1,57 @@
+"""Benchmarks the day route solver on synthetic stops.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_route
+"""
+import time
+
+import numpy as np
+
+from utils.route_planner import haversine_matrix, nearest_neighbour_tour, solve_tour, tour_length
+
+STOP_COUNTS = [5, 10, 25, 50, 100, 200]
+REPEATS = 5
+
+# Roughly the Mumbai metro area
+CENTER = (19.07, 72.88)
+SPREAD_DEG = 0.25
+
+
+def random_day(rng, n_stops):
+    """Hotel at the centre plus n_stops scattered around it."""
+    stops = np.column_stack((
+        CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_stops),
+        CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, n_stops),
+    ))
+    return np.vstack([np.array(CENTER).reshape(1, 2), stops])
+
+
+def run():
+    rng = np.random.default_rng(42)
+    print(f"{'stops':>6} {'matrix ms':>10} {'solve ms':>10} {'NN km':>10} {'opt km':>10} {'saved':>7}")
+    for n_stops in STOP_COUNTS:
+        matrix_times, solve_times, nn_lengths, opt_lengths = [], [], [], []
+        for _ in range(REPEATS):
+            coords = random_day(rng, n_stops)
+
+            start = time.perf_counter()
+            dist = haversine_matrix(coords)
+            matrix_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            tour = solve_tour(dist)
+            solve_times.append(time.perf_counter() - start)
+
+            nn_lengths.append(tour_length(nearest_neighbour_tour(dist), dist))
+            opt_lengths.append(tour_length(tour, dist))
+
+        nn_km = float(np.mean(nn_lengths))
+        opt_km = float(np.mean(opt_lengths))
+        print(
+            f"{n_stops:>6} {np.median(matrix_times) * 1000:>10.2f} {np.median(solve_times) * 1000:>10.2f} "
+            f"{nn_km:>10.1f} {opt_km:>10.1f} {(1 - opt_km / nn_km) * 100:>6.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,104 @@
+"""Exercises the LLM router against the local provider stubs.
+
+Three scenarios, each on a fresh router:
+  routing   providers with different latencies; traffic should settle on the fastest
+  failover  one provider fails every call; its breaker should open and requests still succeed
+  hedging   the preferred provider has a slow tail; p99 with and without hedged requests
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_router
+    python -m benchmarks.bench_router --scenario hedging --requests 400
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.stubs import StubServer
+
+PROVIDERS = ["openai", "groq", "gemini"]
+CHAT_MESSAGES = [{"role": "user", "content": "Tell me about the Maurya Empire"}]
+
+
+def drive(router, requests, concurrency):
+    """Sends `requests` chat completions and returns (latencies in ms, answering models, failures)."""
+    def one(_):
+        start = time.perf_counter()
+        try:
+            completion = router.complete("chat", CHAT_MESSAGES, "bench_router")
+            return (time.perf_counter() - start) * 1000, completion.model
+        except Exception:
+            return (time.perf_counter() - start) * 1000, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    latencies = np.array([latency for latency, _ in results])
+    models = Counter(model for _, model in results if model)
+    failures = sum(1 for _, model in results if model is None)
+    return latencies, models, failures
+
+
+def report(name, latencies, models, failures, router):
+    print(f"\n{name}: p50 {np.percentile(latencies, 50):.0f} ms, p99 {np.percentile(latencies, 99):.0f} ms, "
+          f"failures {failures}/{len(latencies)}")
+    print(f"  answered by: {dict(models)}")
+    for model, status in router.status().items():
+        p50 = f"{status['p50'] * 1000:.0f} ms" if status["p50"] is not None else "-"
+        print(f"  {model:<30} state {status['state']:<9} samples {status['samples']:>4} "
+              f"errors {status['error_rate']:.0%} p50 {p50}")
+
+
+def scenario_routing(llm_router, stubs, args):
+    stubs.latency.update(openai=0.3, gemini=0.2, groq=0.08)
+    router = llm_router.LLMRouter(PROVIDERS)
+    report("routing", *drive(router, args.requests, args.concurrency), router)
+
+
+def scenario_failover(llm_router, stubs, args):
+    stubs.latency.update(openai=0.3, gemini=0.2, groq=0.08)
+    stubs.error_rate["groq"] = 1.0
+    router = llm_router.LLMRouter(PROVIDERS)
+    report("failover (groq failing)", *drive(router, args.requests, args.concurrency), router)
+    stubs.error_rate.clear()
+
+
+def scenario_hedging(llm_router, stubs, args):
+    stubs.latency.update(openai=0.1, gemini=0.15, groq=0.15)
+    stubs.tail["openai"] = (0.05, 1.5)
+    hedge_ratio = llm_router.HEDGE_MAX_RATIO
+    for label, ratio in (("without hedging", 0.0), ("with hedging", hedge_ratio)):
+        llm_router.HEDGE_MAX_RATIO = ratio
+        router = llm_router.LLMRouter(PROVIDERS)
+        # Warm up so every model has statistics and the router settles on openai
+        drive(router, 30, 1)
+        report(f"hedging, {label}", *drive(router, args.requests, args.concurrency), router)
+    llm_router.HEDGE_MAX_RATIO = hedge_ratio
+    stubs.tail.clear()
+
+
+SCENARIOS = {"routing": scenario_routing, "failover": scenario_failover, "hedging": scenario_hedging}
+
+
+def run(args):
+    stubs = StubServer().start()
+    # The router reads its endpoints from the environment when imported
+    os.environ.update(stubs.env())
+    from utils import llm_router
+
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            SCENARIOS[name](llm_router, stubs, args)
+    finally:
+        stubs.stop()
+    print(f"\nUpstream calls: {stubs.calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    run(parser.parse_args())
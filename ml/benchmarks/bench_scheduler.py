@@ -0,0 +1,78 @@
+"""Benchmarks the crowd-aware scheduler on synthetic trips built from the crowd dataset.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_scheduler
+"""
+import copy
+import time
+
+import numpy as np
+
+from utils.crowd_scheduler import (
+    DAY_END_MINUTES,
+    expected_crowding,
+    format_time,
+    load_crowd_curves,
+    schedule_day,
+    schedule_itinerary,
+)
+
+TRIP_DAYS = [1, 3, 7, 14, 30]
+REPEATS = 20
+
+
+def random_trip(rng, records, days):
+    """Days of breakfast, 2-4 sights in one city with naive times, lunch and dinner."""
+    cities = {}
+    for record in records.values():
+        if record["coords"] is not None:
+            cities.setdefault(record["city"], []).append(record)
+    trip = {"days": [], "notes": ""}
+    visited = []
+    for day in range(1, days + 1):
+        city = list(cities)[rng.integers(len(cities))]
+        visited.append(city)
+        sights = cities[city]
+        picks = rng.choice(len(sights), size=min(len(sights), rng.integers(2, 5)), replace=False)
+        activities = [{"time": "08:00", "title": "Breakfast", "location": "Hotel", "type": "meal"}]
+        clock = 10 * 60
+        for i, pick in enumerate(picks):
+            activities.append({"time": format_time(clock), "title": sights[pick]["name"],
+                               "location": sights[pick]["name"], "type": "sightseeing"})
+            clock += 120
+            if i == 0:
+                activities.append({"time": "13:00", "title": "Lunch", "location": "Local restaurant", "type": "meal"})
+                clock = max(clock, 14 * 60)
+        activities.append({"time": "20:00", "title": "Dinner", "location": "Local restaurant", "type": "meal"})
+        trip["days"].append({"day": day, "activities": activities})
+    return trip, ", ".join(dict.fromkeys(visited))
+
+
+def run():
+    rng = np.random.default_rng(7)
+    records = load_crowd_curves()
+    print(f"{'days':>5} {'ms/trip':>9} {'crowd before':>13} {'crowd after':>12} {'reduction':>10} "
+          f"{'relaxed days':>13} {'unfit days':>11}")
+    for days in TRIP_DAYS:
+        trips = [random_trip(rng, records, days) for _ in range(REPEATS)]
+        before = sum(expected_crowding(d["activities"], destination=place)
+                     for trip, place in trips for d in trip["days"])
+        scheduled = copy.deepcopy(trips)
+        start = time.perf_counter()
+        for trip, place in scheduled:
+            schedule_itinerary(trip, place)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / REPEATS
+        after = sum(expected_crowding(d["activities"], destination=place)
+                    for trip, place in scheduled for d in trip["days"])
+        # Days that only fit with meals moved freely, and those that keep the model's times (flagged in notes)
+        strict = [schedule_day(d["activities"], destination=place) is not None
+                  for trip, place in trips for d in trip["days"]]
+        relaxed = [schedule_day(d["activities"], destination=place, max_fixed_shift=DAY_END_MINUTES) is not None
+                   for trip, place in trips for d in trip["days"]]
+        n = days * REPEATS
+        print(f"{days:>5} {elapsed_ms:>9.2f} {before:>13.1f} {after:>12.1f} {1 - after / before:>10.0%} "
+              f"{sum(r and not s for s, r in zip(strict, relaxed)) / n:>13.0%} {relaxed.count(False) / n:>11.0%}")
+
+
+if __name__ == "__main__":
+    run()
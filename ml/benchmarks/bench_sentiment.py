@@ -0,0 +1,185 @@
+"""GREEN/RED agreement and transformer calls saved by the sentiment cascade.
+
+Runs the bundled review CSVs through utils.sentiment_cascade. Agreement
+comes from the two labelled CSVs, whose GREEN/RED labels are the multilingual
+BERT model's own output. The margin is picked by cross-validation: each fold
+of rows is scored with the margin that did best on the other folds, so no
+row is scored with a margin tuned on it. The hotel review CSVs have no
+labels and only count the BERT calls the cascade avoids.
+
+By default BERT is not run: escalated reviews are answered from the stored
+labels, so only the lexicon's own calls are checked ("lexicon agree") and the
+end-to-end agreement is not reported. With --bert the model is actually run
+for escalated reviews, and timed against the BERT-only path.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_sentiment
+    python -m benchmarks.bench_sentiment --bert
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from utils.sentiment_cascade import SENTIMENT_CASCADE_MARGIN, classify_reviews, is_english, lexicon_verdict
+
+ML_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LABELLED = {
+    "english": os.path.join(ML_ROOT, "data", "sentiment_analysis_results.csv"),
+    "multilingual": os.path.join(ML_ROOT, "data", "sentiment_analysis_results_multilingual.csv"),
+}
+UNLABELLED = {
+    "hotels_india": os.path.join(ML_ROOT, "data", "hotel_reviews_india.csv"),
+    "hotels_ext": os.path.join(ML_ROOT, "data", "hotel_reviews_extended (1).csv"),
+}
+MARGINS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+FOLDS = 5
+HEADER = (f"{'dataset':<13} {'reviews':>7} {'lexicon':>8} {'non-English':>12} {'uncertain':>10} "
+          f"{'BERT avoided':>13} {'lexicon agree':>14} {'agreement':>10}")
+
+
+def stored_labels(df):
+    """A transformer stand-in that answers with the labels saved in the CSV."""
+    by_text = dict(zip(df["Review"].astype(str), df["Sentiment"]))
+    return lambda texts: [by_text[text] for text in texts]
+
+
+def no_labels(texts):
+    """A transformer stand-in for the unlabelled CSVs, where only the escalations are counted."""
+    return [None] * len(texts)
+
+
+def memoized(transformer):
+    """Runs the model at most once per review, however many margins and folds ask for it."""
+    seen = {}
+
+    def classify(texts):
+        missing = [text for text in dict.fromkeys(texts) if text not in seen]
+        if missing:
+            seen.update(zip(missing, transformer(missing)))
+        return [seen[text] for text in texts]
+    return classify
+
+
+def evaluate(df, transformer, margin):
+    verdicts = classify_reviews(df["Review"].tolist(), transformer=transformer, margin=margin)
+    labels = df["Sentiment"].tolist() if "Sentiment" in df else [None] * len(verdicts)
+    cheap = [(v.label, label) for v, label in zip(verdicts, labels) if v.stage == "lexicon"]
+    return {
+        "reviews": len(verdicts),
+        "lexicon": len(cheap),
+        "lexicon_agree": sum(ours == theirs for ours, theirs in cheap),
+        "non_english": sum(v.reason == "non_english" for v in verdicts),
+        "uncertain": sum(v.reason == "uncertain" for v in verdicts),
+        "agree": sum(v.label == label for v, label in zip(verdicts, labels)),
+        "labelled": labels[0] is not None if labels else False,
+    }
+
+
+def combine(stats):
+    stats = list(stats)
+    total = {key: sum(s[key] for s in stats) for key in stats[0] if key != "labelled"}
+    total["labelled"] = all(s["labelled"] for s in stats)
+    return total
+
+
+def assign_folds(df, folds=FOLDS, seed=0):
+    """Fold number for every row, shuffled once with a fixed seed so runs are comparable."""
+    order = df.sample(frac=1, random_state=seed).index
+    return pd.Series(range(len(order)), index=order).reindex(df.index) % folds
+
+
+def best_margin(frames, transformers):
+    """The margin with the most agreement on these rows, the smallest (most BERT avoided) on a tie."""
+    scores = {margin: combine(evaluate(df, transformers[name], margin) for name, df in frames.items())["agree"]
+              for margin in MARGINS}
+    return max(MARGINS, key=lambda margin: (scores[margin], -margin))
+
+
+def cross_validate(frames, transformers, folds=FOLDS):
+    """{dataset: stats} with every row scored by a margin tuned on the other folds, and the margins picked."""
+    fold_of = {name: assign_folds(df, folds) for name, df in frames.items()}
+    held_out = {name: [] for name in frames}
+    picked = []
+    for fold in range(folds):
+        tuning = {name: df[fold_of[name] != fold] for name, df in frames.items()}
+        margin = best_margin(tuning, transformers)
+        picked.append(margin)
+        for name, df in frames.items():
+            held_out[name].append(evaluate(df[fold_of[name] == fold], transformers[name], margin))
+    return {name: combine(stats) for name, stats in held_out.items()}, picked
+
+
+def lexicon_cost(reviews, repeats=20):
+    """Microseconds per review for the cheap stage (language check plus lexicon)."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for review in reviews:
+            if is_english(review):
+                lexicon_verdict(review)
+    return (time.perf_counter() - start) / (repeats * len(reviews)) * 1e6
+
+
+def report(name, stats, bert=False):
+    """One table row; agreement needs labels, and end-to-end agreement needs the model actually run."""
+    n, cheap = stats["reviews"], stats["lexicon"]
+    lexicon_agreement = f"{stats['lexicon_agree'] / cheap:.0%}" if cheap and stats["labelled"] else "-"
+    agreement = f"{stats['agree'] / n:.0%}" if bert and stats["labelled"] else "-"
+    print(f"{name:<13} {n:>7} {cheap:>8} {stats['non_english']:>12} {stats['uncertain']:>10} "
+          f"{cheap / n:>13.0%} {lexicon_agreement:>14} {agreement:>10}")
+
+
+def run(args):
+    frames = {name: pd.read_csv(path) for name, path in LABELLED.items()}
+    hotels = {name: pd.read_csv(path) for name, path in UNLABELLED.items()}
+    if args.bert:
+        from utils.sentiment_multilingual import classify_sentiments, get_sentiment_analyzer
+
+        get_sentiment_analyzer()
+        model = memoized(classify_sentiments)
+        transformers = {name: model for name in [*frames, *hotels]}
+    else:
+        transformers = {name: stored_labels(df) for name, df in frames.items()}
+        transformers.update({name: no_labels for name in hotels})
+
+    held_out, picked = cross_validate(frames, transformers)
+    print(f"Labelled rows, held out: {FOLDS}-fold cross-validation, margins picked per fold "
+          f"{', '.join(f'{margin:.1f}' for margin in picked)}")
+    print("Escalated reviews are " + ("run through the model" if args.bert else
+          "answered from the stored labels, not by BERT; pass --bert for end-to-end agreement") + "\n")
+    print(HEADER)
+    for name, stats in held_out.items():
+        report(name, stats, args.bert)
+
+    print(f"\nUnlabelled hotel reviews, margin {SENTIMENT_CASCADE_MARGIN} (SENTIMENT_CASCADE_MARGIN)\n")
+    print(HEADER)
+    for name, df in hotels.items():
+        report(name, evaluate(df, transformers[name], SENTIMENT_CASCADE_MARGIN), args.bert)
+    report("all CSVs", combine(evaluate(df, transformers[name], SENTIMENT_CASCADE_MARGIN)
+                          for name, df in {**frames, **hotels}.items()), args.bert)
+
+    reviews = [str(review) for df in [*frames.values(), *hotels.values()] for review in df["Review"]]
+    print(f"\nCheap stage: {lexicon_cost(reviews):.0f} us per review")
+    if args.bert:
+        from utils.sentiment_multilingual import classify_sentiments
+
+        start = time.perf_counter()
+        classify_sentiments(reviews)
+        bert_only = time.perf_counter() - start
+        start = time.perf_counter()
+        classify_reviews(reviews)
+        cascade = time.perf_counter() - start
+        print(f"BERT on every review: {bert_only:.2f} s; cascade: {cascade:.2f} s ({cascade / bert_only:.0%})")
+
+    print("\nMargin sweep, all labelled rows (in-sample: the rows the margin is tuned on)")
+    print(f"{'margin':<13}" + HEADER[13:])
+    for margin in MARGINS:
+        report(f"{margin:.1f}", combine(evaluate(df, transformers[name], margin) for name, df in frames.items()),
+               args.bert)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bert", action="store_true", help="run the multilingual model for escalated reviews")
+    run(parser.parse_args())
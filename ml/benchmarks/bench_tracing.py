@@ -0,0 +1,103 @@
+"""Per-request cost of trace spans and the sampling profiler.
+
+Times a route that does a few milliseconds of CPU work in five spans,
+through the full Flask app, with: no hooks; tracing only; tracing plus the
+profiler's hooks with no window open (the normal state); and while a
+profiling window is sampling every request. CPU is the whole process,
+so the sampler thread's work is included; best of five interleaved runs.
+
+Run from the ml/ directory:
+    python -m benchmarks.bench_tracing
+    python -m benchmarks.bench_tracing --requests 2000 --work-ms 5
+"""
+import argparse
+import io
+import tempfile
+import time
+import timeit
+
+from flask import Flask, jsonify
+from werkzeug.test import EnvironBuilder
+
+from utils.profiler import SamplingProfiler, init_app as init_profiler
+from utils.tracing import init_app as init_tracing, span
+
+STAGES = ["upload", "parse_document", "prompt", "model", "parse_json"]
+
+
+def build_app(name, work_ms, tracing=False, profiler=None):
+    app = Flask(name)
+    if tracing:
+        init_tracing(app)
+    if profiler is not None:
+        init_profiler(app, profiler)
+
+    def busy(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    @app.route("/work")
+    def work():
+        for stage in STAGES:
+            with span(stage):
+                busy(work_ms / 1000 / len(STAGES))
+        return jsonify({"ok": True})
+
+    return app
+
+
+def measure(apps, requests, repeats=5):
+    """Server CPU microseconds per request for each app, the best of `repeats` interleaved runs."""
+    environ = EnvironBuilder(path="/work").get_environ()
+
+    def one(app):
+        return b"".join(app.wsgi_app(dict(environ, **{"wsgi.input": io.BytesIO()}), lambda status, headers: None))
+
+    best = [float("inf")] * len(apps)
+    for _ in range(repeats):
+        # Round-robin, so drift in machine speed hits every variant alike
+        for i, app in enumerate(apps):
+            one(app)
+            start = time.process_time()
+            for _ in range(requests):
+                one(app)
+            best[i] = min(best[i], (time.process_time() - start) / requests * 1e6)
+    return best
+
+
+def run(args):
+    # Separate control files, or the idle profiler would join the other's window
+    idle = SamplingProfiler(tempfile.mkdtemp(prefix="bench-tracing-"))
+    sampling = SamplingProfiler(tempfile.mkdtemp(prefix="bench-tracing-"))
+    rows = [
+        ("no hooks", build_app("bare", args.work_ms)),
+        ("tracing", build_app("traced", args.work_ms, tracing=True)),
+        ("tracing + profiler off", build_app("idle", args.work_ms, tracing=True, profiler=idle)),
+        ("profiling every request", build_app("sampling", args.work_ms, tracing=True, profiler=sampling)),
+    ]
+    # Long enough to outlast the timed runs; the sampler stops when the window closes
+    window = sampling.request_window(3600, 1.0, args.interval_ms)
+
+    print(f"{args.work_ms} ms of work per request; sampling every {args.interval_ms} ms while profiling\n")
+    print(f"{'':<26} {'CPU us':>8} {'overhead us':>12}")
+    cpu = measure([app for _, app in rows], args.requests)
+    sampling.stop_window()
+    for (label, _), us in zip(rows, cpu):
+        print(f"{label:<26} {us:>8.0f} {us - cpu[0]:>12.1f}")
+
+    calls = 1_000_000
+    outside = timeit.timeit(lambda: span("model").__enter__(), number=calls) / calls * 1e9
+    print(f"\nspan() outside a request (background jobs, scripts): {outside:.0f} ns")
+    time.sleep(args.interval_ms / 1000 * 2)
+    folded = sampling.merged_profile(window["id"]) or ""
+    print(f"Profile {window['id']}: {len(folded.splitlines())} distinct stacks, "
+          f"{sum(int(line.rsplit(' ', 1)[1]) for line in folded.splitlines())} samples")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--work-ms", type=float, default=2, help="CPU work per request, split over the spans")
+    parser.add_argument("--interval-ms", type=float, default=10, help="sampling interval while profiling")
+    run(parser.parse_args())
@@ -0,0 +1,234 @@
+"""Local stand-ins for the OpenAI, Groq, Gemini and Telegram HTTP APIs.
+
+Each provider answers with a canned payload after a configurable delay, so
+the app can be benchmarked offline without paying for model calls. A share
+of each provider's calls can be made to fail, to exercise failover.
+
+Run standalone from the ml/ directory:
+    python -m benchmarks.stubs --port 8765 --latency openai=0.8 --latency gemini=1.2 --error-rate groq=0.5
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds each provider takes to answer; overridable per run
+DEFAULT_LATENCY_S = {"openai": 0.5, "groq": 0.4, "gemini": 0.6, "telegram": 0.05}
+
+ITINERARY_JSON = {
+    "title": "Goa Getaway",
+    "startDate": "2025-03-10",
+    "endDate": "2025-03-12",
+    "accommodation": {"name": "Taj Fort Aguada", "address": "Sinquerim, Candolim, Goa", "phone": "+91 832 664 5858"},
+    "contacts": [{"name": "Emergency Support", "role": "24/7 Assistance", "phone": "+91 112", "email": None}],
+    "days": [
+        {
+            "day": day,
+            "date": f"March {9 + day}, 2025",
+            "title": f"Goa Day {day}",
+            "activities": [
+                {"time": "08:00", "title": "Breakfast", "location": "Hotel Restaurant",
+                 "description": "Breakfast at the hotel", "type": "meal", "included": True},
+                {"time": "09:30", "title": "Fort Aguada", "location": "Fort Aguada",
+                 "description": "Walk the 17th century Portuguese fort and lighthouse.", "type": "sightseeing"},
+                {"time": "13:00", "title": "Lunch", "location": "Britto's, Baga",
+                 "description": "Goan seafood thali by the beach.", "type": "meal"},
+                {"time": "16:00", "title": "Chapora Fort", "location": "Chapora Fort",
+                 "description": "Sunset views over the Chapora river.", "type": "sightseeing"},
+            ],
+        }
+        for day in range(1, 4)
+    ],
+    "notes": "Carry sunscreen and stay hydrated.",
+}
+
+DEFAULT_PAYLOADS = {
+    "itinerary": "Here is your itinerary:\n```json\n" + json.dumps(ITINERARY_JSON, indent=2) + "\n```",
+    "chat": "The Maurya Empire, founded by Chandragupta Maurya around 322 BCE, was one of the largest "
+            "empires in Indian history. Under Ashoka it spread Buddhism across Asia.",
+    "waste": "Detected waste: Plastic Waste (bottles, wrappers), Organic Waste (food scraps).",
+    "extraction": json.dumps({
+        "name": "Goa Getaway",
+        "numberOfPeople": 4,
+        "daysOfVisit": 3,
+        "placesToVisit": ["Fort Aguada", "Chapora Fort", "Baga Beach"],
+        "dateOfVisit": "10-03-2025",
+        "currentStay": "Taj Fort Aguada",
+    }),
+}
+
+
+def itinerary_skeleton(days):
+    return json.dumps({
+        key: value for key, value in ITINERARY_JSON.items() if key != "days"
+    } | {
+        "days": [{"day": day, "date": f"Day {day} date", "title": f"Goa Day {day}", "area": f"Area {day}"}
+                 for day in range(1, days + 1)],
+    })
+
+
+def itinerary_day(day):
+    template = ITINERARY_JSON["days"][0]
+    activities = [dict(activity) for activity in template["activities"]]
+    # The fort repeats on every day so the merge has something to de-duplicate
+    activities.append({"time": "18:00", "title": f"Hidden gem {day}", "location": f"Hidden gem {day}",
+                       "description": "A quiet local favourite.", "type": "sightseeing"})
+    return json.dumps(dict(template, day=day, title=f"Goa Day {day}", activities=activities))
+
+
+def chat_payload(server, prompt):
+    """Picks the canned reply for a chat completion from what its prompt asks for."""
+    if '"image_url"' in prompt:
+        return server.payloads["waste"]
+    if "Itinerary to analyse" in prompt or "numberOfPeople" in prompt:
+        return server.payloads["extraction"]
+    if "Outline the trip" in prompt:
+        return itinerary_skeleton(int(re.search(r"Trip: (\d+) days", prompt).group(1)))
+    day = re.search(r"Plan day (\d+) of", prompt)
+    if day:
+        return itinerary_day(int(day.group(1)))
+    if "itinerary" in prompt:
+        return server.payloads["itinerary"]
+    return server.payloads["chat"]
+
+
+def _openai_completion(model, content):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1200, "completion_tokens": len(content) // 4,
+                  "total_tokens": 1200 + len(content) // 4},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if "json" in content_type and body:
+            return json.loads(body)
+        return {}
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        request = self._read_json()
+        path = self.path.split("?")[0]
+
+        if path.endswith("/chat/completions"):
+            if path.startswith("/openai/"):
+                provider = "groq"
+            elif path.startswith("/gemini/"):
+                provider = "gemini"
+            else:
+                provider = "openai"
+            payload = chat_payload(server, json.dumps(request.get("messages", [])))
+            response = _openai_completion(request.get("model", "stub"), payload)
+        elif path.endswith("/sendMessage"):
+            provider = "telegram"
+            response = {"ok": True, "result": {"message_id": 1, "date": int(time.time()), "text": "stub"}}
+        else:
+            self._reply(404, {"error": f"No stub for {path}"})
+            return
+
+        server.record(provider)
+        delay = server.latency.get(provider, 0)
+        slow_share, slow_delay = server.tail.get(provider, (0, 0))
+        if random.random() < slow_share:
+            delay = slow_delay
+        time.sleep(delay)
+        if random.random() < server.error_rate.get(provider, 0):
+            self._reply(500, {"error": {"message": f"Injected {provider} failure", "type": "server_error"}})
+            return
+        self._reply(200, response)
+
+
+class StubServer(ThreadingHTTPServer):
+    """One HTTP server answering for every stubbed provider; counts calls per provider."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=None, payloads=None, error_rate=None, tail=None):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency = dict(DEFAULT_LATENCY_S, **(latency or {}))
+        # provider -> fraction of calls answered with a 500; both dicts may be changed while running
+        self.error_rate = dict(error_rate or {})
+        # provider -> (fraction of calls, seconds they take instead), to model a latency tail
+        self.tail = dict(tail or {})
+        self.payloads = dict(DEFAULT_PAYLOADS, **(payloads or {}))
+        self.calls = {}
+        self._calls_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, provider):
+        with self._calls_lock:
+            self.calls[provider] = self.calls.get(provider, 0) + 1
+
+    def env(self):
+        """Environment variables that point the app's clients at this server."""
+        return {
+            "OPENAI_BASE_URL": f"{self.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "GROQ_BASE_URL": self.url,
+            "GROQ_API_KEY": "stub",
+            "GEMINI_OPENAI_BASE_URL": f"{self.url}/gemini/v1beta/openai",
+            "GEMINI_API_KEY": "stub",
+            "TELEGRAM_API_URL": self.url,
+            "BOT_TOKEN": "stub",
+            "CHAT_ID": "1",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="provider-stubs", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_latency(values):
+    """Parses provider=number pairs (latencies in seconds or error rates)."""
+    latency = {}
+    for value in values or []:
+        provider, seconds = value.split("=", 1)
+        latency[provider] = float(seconds)
+    return latency
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", action="append", help="provider=seconds, e.g. openai=0.8")
+    parser.add_argument("--error-rate", action="append", help="provider=fraction of failed calls, e.g. groq=0.5")
+    args = parser.parse_args()
+
+    server = StubServer(args.port, parse_latency(args.latency), error_rate=parse_latency(args.error_rate))
+    for key, value in server.env().items():
+        print(f"{key}={value}")
+    server.serve_forever()
@@ -0,0 +1,49 @@
+"""Pre-fork serving. Run from the ml/ directory:
+
+    gunicorn -c gunicorn.conf.py app:app
+"""
+import os
+
+import dotenv
+
+from utils import prefork
+
+dotenv.load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", "4"))
+# Threads per worker; most request time is spent waiting on model providers. Admission control
+# keeps model-bound requests (running + queued) to 12 of them by default, leaving the rest for cheap endpoints
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "16"))
+timeout = int(os.getenv("WEB_TIMEOUT_S", "120"))
+
+# Import app.py in the master so workers are forked with it already loaded
+preload_app = prefork.PRELOAD_MODELS
+
+prefork.prepare_master()
+
+
+def when_ready(server):
+    if preload_app:
+        prefork.preload_models()
+
+
+def pre_fork(server, worker):
+    prefork.before_fork()
+
+
+def post_fork(server, worker):
+    prefork.after_fork()
+    # A worker replacing one that owned the extraction pool takes it over straight away
+    from utils import extraction_jobs
+
+    if extraction_jobs.JOB_WORKERS_EMBEDDED:
+        extraction_jobs.ensure_workers()
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,306 @@
+import functools
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from utils import llm_router
+from utils.llm_router import MIN_SAMPLES, LLMRouter, RouterChatModel, RouterError
+from utils.metrics import PROVIDER_HEDGES
+
+PROVIDERS = ["openai", "gemini", "groq"]
+MESSAGES = [{"role": "user", "content": "Tell me about the Maurya Empire"}]
+# Latencies warm_up gives each model, openai the fastest
+WARM_LATENCY = {"gpt-4o-mini": 0.01, "gemini-2.0-flash": 0.05, "llama-3.3-70b-versatile": 0.05}
+# Upper bound on waiting for a held call, so a broken test fails instead of hanging
+WAIT_TIMEOUT_S = 10
+
+
+class FakeClock:
+    """Monotonic clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+
+class FakeProviders:
+    """Stands in for the provider APIs: counts calls, and fails or holds them on demand.
+
+    Each call that answers moves the clock on by the provider's latency.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.calls = {}
+        self.failing = set()
+        self.latency = {}
+        self.gates = {}
+        self.entered = defaultdict(threading.Event)
+        self._lock = threading.Lock()
+
+    def client(self, provider):
+        create = functools.partial(self.create, provider)
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def hold(self, provider, gate=None):
+        """Makes the provider's calls wait until the returned event is set."""
+        self.gates[provider] = gate or threading.Event()
+        self.entered[provider].clear()
+        return self.gates[provider]
+
+    def release_all(self):
+        for gate in self.gates.values():
+            gate.set()
+
+    def create(self, provider, model, messages, **request):
+        with self._lock:
+            self.calls[provider] = self.calls.get(provider, 0) + 1
+        self.entered[provider].set()
+        if provider in self.gates:
+            self.gates[provider].wait(WAIT_TIMEOUT_S)
+        self.clock.advance(self.latency.get(provider, 0.01))
+        if provider in self.failing:
+            raise RuntimeError(f"{provider} is down")
+        message = SimpleNamespace(content=f"Answer from {model}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(prompt_tokens=1200, completion_tokens=10))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def providers(clock, monkeypatch):
+    fake = FakeProviders(clock)
+    # Only the hedging tests turn hedging on, so no other test depends on thread timing
+    monkeypatch.setattr(llm_router, "HEDGE_MAX_RATIO", 0.0)
+    yield fake
+    fake.release_all()
+
+
+@pytest.fixture
+def router(providers, clock):
+    return LLMRouter(PROVIDERS, clock=clock, client_factory=providers.client)
+
+
+def complete(router, **options):
+    return router.complete("chat", MESSAGES, "test_router", **options)
+
+
+def hedges(provider):
+    return PROVIDER_HEDGES.labels(provider, "test_router")._value.get()
+
+
+def test_failed_call_fails_over_to_the_next_model(router, providers):
+    providers.failing.add("openai")
+
+    completion = complete(router)
+
+    assert completion.model == "gemini-2.0-flash"
+    assert providers.calls == {"openai": 1, "gemini": 1}
+
+
+def test_error_when_every_model_fails(router, providers):
+    providers.failing.update(PROVIDERS)
+
+    with pytest.raises(RouterError, match="All models failed"):
+        complete(router)
+    assert providers.calls == {"openai": 1, "gemini": 1, "groq": 1}
+
+
+def test_breaker_opens_after_repeated_failures(router, providers):
+    providers.failing.add("openai")
+    breaker = router._breakers["gpt-4o-mini"]
+    for _ in range(breaker.failures):
+        with pytest.raises(RouterError):
+            complete(router, models=["gpt-4o-mini"])
+
+    assert router.status()["gpt-4o-mini"]["state"] == "open"
+    with pytest.raises(RouterError, match="No healthy model"):
+        complete(router, models=["gpt-4o-mini"])
+    assert providers.calls["openai"] == breaker.failures
+    # Other models keep serving the task meanwhile
+    assert complete(router).model == "gemini-2.0-flash"
+
+
+def open_breaker(router, name, providers, clock):
+    """Opens `name`'s breaker, then lets its cooldown pass."""
+    providers.failing.add("openai")
+    breaker = router._breakers[name]
+    for _ in range(breaker.failures):
+        with pytest.raises(RouterError):
+            complete(router, models=[name])
+    providers.failing.clear()
+    clock.advance(breaker.cooldown)
+    return breaker
+
+
+def test_half_open_breaker_lets_one_trial_through_and_closes_on_success(router, providers, clock):
+    breaker = open_breaker(router, "gpt-4o-mini", providers, clock)
+    release = providers.hold("openai")
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        trial = pool.submit(complete, router, models=["gpt-4o-mini"])
+        assert providers.entered["openai"].wait(WAIT_TIMEOUT_S)
+        assert router.status()["gpt-4o-mini"]["state"] == "half_open"
+        # Only the trial call goes to the model while it is half-open
+        with pytest.raises(RouterError, match="No healthy model"):
+            complete(router, models=["gpt-4o-mini"])
+        release.set()
+        assert trial.result().model == "gpt-4o-mini"
+
+    assert breaker.state == "closed"
+    assert complete(router, models=["gpt-4o-mini"]).model == "gpt-4o-mini"
+
+
+def test_failed_trial_reopens_the_breaker(router, providers, clock):
+    breaker = open_breaker(router, "gpt-4o-mini", providers, clock)
+    providers.failing.add("openai")
+
+    with pytest.raises(RouterError):
+        complete(router, models=["gpt-4o-mini"])
+
+    assert breaker.state == "open"
+    with pytest.raises(RouterError, match="No healthy model"):
+        complete(router, models=["gpt-4o-mini"])
+
+
+def warm_up(router):
+    """Gives every model enough samples for a p95, with openai the fastest."""
+    for name, latency in WARM_LATENCY.items():
+        for _ in range(MIN_SAMPLES):
+            router._record(name, latency, True)
+    assert router.candidates("chat")[0] == "gpt-4o-mini"
+
+
+def on_hedge_decision(router):
+    """Event set once the router has decided whether to hedge a slow call."""
+    decided = threading.Event()
+    allow_hedge = router._allow_hedge
+
+    def deciding():
+        try:
+            return allow_hedge()
+        finally:
+            decided.set()
+
+    router._allow_hedge = deciding
+    return decided
+
+
+def test_slow_call_is_hedged_on_another_provider(router, providers, monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGE_MAX_RATIO", 1.0)
+    warm_up(router)
+    release = providers.hold("openai")
+    before = hedges("gemini")
+
+    completion = complete(router)
+
+    assert completion.model == "gemini-2.0-flash"
+    assert hedges("gemini") - before == 1
+    # The slow original is left running instead of being waited for
+    assert providers.calls["openai"] == 1 and not release.is_set()
+
+
+def test_hedging_is_capped_at_a_share_of_requests(router, providers):
+    warm_up(router)
+    providers.hold("openai", on_hedge_decision(router))
+
+    assert complete(router).provider == "openai"
+    assert providers.calls == {"openai": 1}
+
+
+class QueueingPool:
+    """Runs calls on the router's pool, except those to `held` models, which stay queued forever."""
+
+    def __init__(self, pool, held):
+        self.pool = pool
+        self.held = held
+        self.queued = []
+
+    def submit(self, fn, name, *args):
+        if name in self.held:
+            future = Future()
+            self.queued.append(future)
+            return future
+        return self.pool.submit(fn, name, *args)
+
+
+def half_open_trial(router, name):
+    """Opens `name`'s breaker with its cooldown already over, so its next call is the half-open trial."""
+    breaker = router._breakers[name]
+    breaker.state, breaker.opened_at, breaker.cooldown = "open", 0.0, 0.0
+    return breaker
+
+
+def test_queued_losing_hedge_is_cancelled_and_frees_its_trial(router, providers, clock, monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGE_MAX_RATIO", 1.0)
+    warm_up(router)
+    gemini = half_open_trial(router, "gemini-2.0-flash")
+    groq = router._breakers["llama-3.3-70b-versatile"]
+    groq.state, groq.opened_at = "open", clock()
+    router._pool = QueueingPool(router._pool, {"gemini-2.0-flash"})
+    # openai answers only once the hedge to gemini has been queued
+    providers.hold("openai", on_hedge_decision(router))
+    before = hedges("gemini")
+
+    completion = complete(router)
+
+    assert completion.model == "gpt-4o-mini"
+    assert hedges("gemini") - before == 1
+    assert [future.cancelled() for future in router._pool.queued] == [True]
+    # The trial slot the hedge claimed is free again
+    assert gemini.state == "half_open" and not gemini.trial_running
+    assert "gemini-2.0-flash" in router.candidates("chat")
+
+
+def test_hedge_dequeued_after_the_answer_is_dropped(router, providers, clock):
+    gemini = half_open_trial(router, "gemini-2.0-flash")
+    assert gemini.acquire(clock())
+    settled = threading.Event()
+    settled.set()
+
+    with pytest.raises(RouterError, match="already answered"):
+        router._call("gemini-2.0-flash", MESSAGES, "test_router", None, {}, settled)
+
+    assert "gemini" not in providers.calls
+    assert not gemini.trial_running
+
+
+def test_pinned_chat_model_keeps_one_model_for_the_whole_chain(router, providers, monkeypatch):
+    monkeypatch.setattr(llm_router, "_router", router)
+    llm = RouterChatModel(task="chat", operation="test_router", pin_model=True)
+    providers.failing.add("openai")
+    first = llm.invoke([HumanMessage(content="step 1")])
+    providers.failing.clear()
+
+    second = llm.invoke([HumanMessage(content="step 2")])
+
+    assert first.response_metadata["model_name"] == "gemini-2.0-flash"
+    assert second.response_metadata["model_name"] == "gemini-2.0-flash"
+    assert second.usage_metadata["input_tokens"] == 1200
+    # Unpinned, the next step would have gone back to the preferred model
+    assert complete(router).model == "gpt-4o-mini"
+
+
+def test_concurrent_requests_share_the_pool(router, providers):
+    threads = [threading.Thread(target=complete, args=(router,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(providers.calls.values()) == 8
@@ -0,0 +1,53 @@
+import pytest
+
+from utils.review_analytics import ReviewStore
+
+ECO_REVIEW = "Solar panels and great recycling."
+
+
+def reviews(hotel, sentiments, prices, city="Goa"):
+    return [{"hotel": hotel, "city": city, "review": ECO_REVIEW, "sentiment": sentiment, "price": price}
+            for sentiment, price in zip(sentiments, prices)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReviewStore(str(tmp_path))
+
+
+def names(hotels):
+    return [hotel["hotel"] for hotel in hotels]
+
+
+def test_cheaper_hotel_wins_at_equal_sentiment_even_when_negative(store):
+    # Half the reviews praise the sustainability, so both count as eco, but the mean sentiment is -4
+    store.append_records(reviews("Cheap", [1, -9], [2000, 2000]) + reviews("Dear", [1, -9], [20000, 20000]))
+
+    hotels = store.best_value_eco_hotels("Goa")
+
+    assert names(hotels) == ["Cheap", "Dear"]
+    assert hotels[0]["value_score"] > hotels[1]["value_score"] > 0
+
+
+def test_better_sentiment_wins_at_equal_price(store):
+    store.append_records(reviews("Liked", [8, 8], [5000, 5000]) + reviews("Disliked", [1, -9], [5000, 5000])
+                         + reviews("Neutral", [4, -4], [5000, 5000]))
+
+    assert names(store.best_value_eco_hotels("goa ")) == ["Liked", "Neutral", "Disliked"]
+
+
+def test_max_price_keeps_hotels_with_a_stay_at_that_price(store):
+    # Mean 6000, but one night cost 3000
+    store.append_records(reviews("Mixed", [5, 5], [3000, 9000]) + reviews("Steady", [5, 5], [5000, 5000]))
+
+    assert names(store.best_value_eco_hotels("Goa", max_price=4000)) == ["Mixed"]
+    assert names(store.best_value_eco_hotels("Goa", max_price=5000)) == ["Steady", "Mixed"]
+    assert store.best_value_eco_hotels("Goa", max_price=2000) == []
+
+
+def test_only_eco_hotels_in_the_city_are_listed(store):
+    store.append_records(reviews("Elsewhere", [5], [3000], city="Mumbai")
+                         + [{"hotel": "Plain", "city": "Goa", "review": "Nice pool.", "sentiment": 9, "price": 3000}]
+                         + reviews("Green", [5], [3000]))
+
+    assert names(store.best_value_eco_hotels("Goa")) == ["Green"]
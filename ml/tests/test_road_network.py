@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from utils import route
+from utils.road_network import ROAD_MAX_SNAP_M, build_graph_from_osm
+
+# Four junctions on a north-south street in Mumbai, about 111 m apart
+LAT, LON, STEP = 19.0700, 72.8700, 0.001
+GOA_STOPS = [(15.5527, 73.7517), (15.5440, 73.7553), (15.5010, 73.7639)]
+
+
+def node(osm_id, i, lon_offset=0.0):
+    return {"type": "node", "id": osm_id, "lat": LAT + i * STEP, "lon": LON + lon_offset}
+
+
+def way(refs, highway, **tags):
+    return {"type": "way", "nodes": refs, "tags": {"highway": highway, **tags}}
+
+
+@pytest.fixture
+def elements():
+    return [
+        node(1, 0), node(2, 1), node(3, 2), node(4, 3),
+        # A footpath junction off to the side, out of reach for cars
+        node(5, 1, lon_offset=STEP),
+        way([1, 2, 3], "residential"),
+        way([3, 4], "primary", oneway="yes"),
+        way([2, 5], "footway"),
+        # Not a road, and a way whose middle node is missing from the export
+        {"type": "way", "nodes": [1, 4], "tags": {"building": "yes"}},
+        way([1, 99, 4], "residential"),
+    ]
+
+
+@pytest.fixture
+def graph(elements):
+    return build_graph_from_osm(elements)
+
+
+def leg_m(a, b):
+    return abs(a - b) * STEP * np.pi / 180 * 6371000
+
+
+def test_build_graph_from_osm(graph):
+    assert graph.num_nodes == 5
+    assert graph.node_ids.tolist() == [1, 2, 3, 4, 5]
+    # 1-2 and 2-3 both ways, 3->4 one way, 2-5 both ways; ignored ways add nothing
+    edges = {(tail, int(head)) for tail in range(graph.num_nodes)
+             for head in graph.indices[graph.indptr[tail]:graph.indptr[tail + 1]]}
+    assert edges == {(0, 1), (1, 0), (1, 2), (2, 1), (2, 3), (1, 4), (4, 1)}
+    assert graph.length_m[graph.indptr[0]] == pytest.approx(leg_m(0, 1), rel=1e-3)
+
+
+def test_one_way_edge_is_only_usable_forwards(graph):
+    assert np.isfinite(graph.shortest_time(2, 3, "car"))
+    assert graph.shortest_time(3, 2, "car") == np.inf
+
+
+def test_mode_without_access_gets_no_route(graph):
+    assert graph.shortest_time(0, 4, "car") == np.inf
+    assert np.isfinite(graph.shortest_time(0, 4, "walk"))
+
+
+def test_a_star_agrees_with_batched_dijkstra(graph):
+    nodes = np.arange(graph.num_nodes)
+    for mode in ("car", "walk", "scooter"):
+        matrix = graph.time_matrix(nodes, nodes, mode)
+        astar = [[graph.shortest_time(a, b, mode) for b in nodes] for a in nodes]
+        np.testing.assert_allclose(astar, matrix, rtol=1e-5)
+
+
+def test_travel_time_matrix_in_minutes(graph):
+    stops = [(LAT, LON), (LAT + 2 * STEP, LON), (LAT + 3 * STEP, LON)]
+
+    minutes = graph.travel_time_matrix(stops, "car")
+
+    residential = leg_m(0, 2) / (20 / 3.6) / 60
+    primary = leg_m(2, 3) / (40 / 3.6) / 60
+    assert minutes[0, 1] == pytest.approx(residential, rel=1e-3)
+    assert minutes[0, 2] == pytest.approx(residential + primary, rel=1e-3)
+    assert minutes[2, 0] == np.inf
+    assert np.diag(minutes).tolist() == [0, 0, 0]
+
+
+def test_off_graph_stops_get_no_road_times(graph):
+    near = (LAT + 0.2 * STEP, LON + 0.0002)
+    _, snap_m = graph.nearest_nodes([near] + GOA_STOPS)
+    assert snap_m[0] < ROAD_MAX_SNAP_M < snap_m[1:].min()
+
+    minutes = graph.travel_time_matrix([(LAT, LON), near] + GOA_STOPS, "car")
+
+    assert np.isfinite(minutes[:2, :2]).all()
+    assert np.isinf(minutes[2:, :]).all() and np.isinf(minutes[:, 2:]).all()
+
+
+def test_route_in_another_city_falls_back_to_the_estimate(graph, monkeypatch):
+    monkeypatch.setattr(route, "get_road_graph", lambda: graph)
+    day = {"activities": [{"location": f"Stop {i}", "coordinates": {"lat": lat, "lng": lon}}
+                          for i, (lat, lon) in enumerate(GOA_STOPS[1:])]}
+    transport = route.TRANSPORT_OPTIONS["couple"]
+
+    plan = route.plan_day(day, "Hotel", GOA_STOPS[0], "Goa", transport)
+
+    for leg in plan["route_plan"]:
+        assert leg["estimated_time_min"] == route.estimate_travel_time(leg["distance_km"], transport["speed_kmh"])
+        assert leg["estimated_time_min"] > 0
@@ -0,0 +1,165 @@
+import time
+
+import mongomock
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from utils.metrics import ROUTE_STORE_DROPPED
+from utils.route_store import ROUTE_MAX_ATTEMPTS, RouteStore
+
+
+class RecordingCollection:
+    """mongomock collection that records insert_many batches and can be made to fail."""
+
+    def __init__(self):
+        self.collection = mongomock.MongoClient()["TravelPlannerDB"]["SustainableRoutes"]
+        self.batches = []
+        self.down = False
+        self.reject = set()
+
+    def insert_many(self, documents, ordered=True):
+        if self.down:
+            raise AutoReconnect("connection refused")
+        self.batches.append([document["_id"] for document in documents])
+        rejected = [i for i, document in enumerate(documents) if document["name"] in self.reject]
+        accepted = [document for i, document in enumerate(documents) if i not in rejected]
+        try:
+            if accepted:
+                self.collection.insert_many(accepted, ordered=ordered)
+        except BulkWriteError as e:
+            # Map indexes back to positions in the full batch
+            positions = [i for i in range(len(documents)) if i not in rejected]
+            errors = [dict(err, index=positions[err["index"]]) for err in e.details["writeErrors"]]
+        else:
+            errors = []
+        errors += [{"index": i, "code": 121, "errmsg": "Document failed validation"} for i in rejected]
+        if errors:
+            raise BulkWriteError({"writeErrors": sorted(errors, key=lambda err: err["index"])})
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def route(name, day="2025-03-10"):
+    return {"name": name, "dateOfVisit": day, "numberOfPeople": 2, "sustainable_routes": {}}
+
+
+def dropped(reason):
+    return ROUTE_STORE_DROPPED.labels(reason)._value.get()
+
+
+@pytest.fixture
+def collection():
+    return RecordingCollection()
+
+
+@pytest.fixture
+def store(collection):
+    # A long interval keeps the background flusher out of the way unless a test wakes it
+    store = RouteStore(collection, batch_size=3, flush_interval=60)
+    yield store
+    store.close()
+
+
+def test_flush_writes_buffered_documents_in_one_batch(store, collection):
+    ids = [store.add(route(f"traveller-{i}")) for i in range(2)]
+
+    assert collection.count_documents({}) == 0
+    assert store.flush() == 2
+    assert collection.batches == [ids]
+    assert collection.count_documents({}) == 2
+
+
+def test_full_batch_wakes_the_flusher(collection):
+    store = RouteStore(collection, batch_size=3, flush_interval=60)
+    try:
+        ids = [store.add(route(f"traveller-{i}")) for i in range(3)]
+        deadline = time.monotonic() + 5
+        while not collection.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert collection.batches == [ids]
+    finally:
+        store.close()
+
+
+def test_buffered_document_is_readable_before_flush(store):
+    route_id = store.add(route("asha"))
+
+    assert store.find_route(route_id)["name"] == "asha"
+    store.flush()
+    assert store.find_route(str(route_id))["name"] == "asha"
+
+
+def test_duplicate_keys_are_treated_as_already_written(store, collection):
+    document = route("asha")
+    store.add(document)
+    store.flush()
+
+    # A retry of a document that was written before the error was reported
+    store.add(dict(document))
+    store.add(route("ravi"))
+    assert store.flush() == 2
+    assert collection.count_documents({}) == 2
+    assert store._buffer == []
+
+
+def test_failed_batch_is_requeued_and_written_later(store, collection):
+    ids = [store.add(route(f"traveller-{i}")) for i in range(2)]
+    collection.down = True
+    assert store.flush() == 0
+    assert [document["_id"] for document in store._buffer] == ids
+
+    collection.down = False
+    assert store.flush() == 2
+    assert collection.count_documents({}) == 2
+
+
+def test_buffer_is_capped_while_mongo_is_down(collection):
+    store = RouteStore(collection, batch_size=100, flush_interval=60, max_buffered=3)
+    try:
+        collection.down = True
+        before = dropped("overflow")
+        ids = [store.add(route(f"traveller-{i}")) for i in range(5)]
+        store.flush()
+
+        assert [document["_id"] for document in store._buffer] == ids[2:]
+        assert dropped("overflow") - before == 2
+    finally:
+        collection.down = False
+        store.close()
+
+
+def test_rejected_documents_are_retried_then_dropped(store, collection):
+    collection.reject = {"bad"}
+    before = dropped("rejected")
+    store.add(route("bad"))
+    store.add(route("good"))
+
+    assert store.flush() == 1
+    assert [document["name"] for document in store._buffer] == ["bad"]
+    for _ in range(ROUTE_MAX_ATTEMPTS - 1):
+        store.flush()
+
+    assert store._buffer == []
+    assert dropped("rejected") - before == 1
+    assert collection.count_documents({}) == 1
+
+
+def test_close_flushes_what_is_left(collection):
+    store = RouteStore(collection, batch_size=100, flush_interval=60)
+    store.add(route("asha"))
+    store.add(route("ravi"))
+    store.close()
+
+    assert collection.count_documents({}) == 2
+
+
+def test_find_routes_returns_indexed_summary_fields(store, collection):
+    store.add(route("asha", "2025-03-12"))
+    store.add(route("asha", "2025-03-10"))
+    store.add(route("ravi"))
+    store.flush()
+
+    routes = store.find_routes("asha")
+    assert [r["dateOfVisit"] for r in routes] == ["2025-03-10", "2025-03-12"]
+    assert set(routes[0]) == {"_id", "name", "dateOfVisit", "numberOfPeople"}
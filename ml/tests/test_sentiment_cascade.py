@@ -0,0 +1,42 @@
+import pytest
+
+from utils.sentiment_cascade import classify_reviews, is_english
+
+SHORT_ENGLISH = [
+    "Excellent sustainable practices, including waste management.",
+    "Terrible food, rude staff.",
+    "Loved it!",
+    "Great eco-friendly rooms and solar heating.",
+]
+HINDI = "खाना ताजा था, लेकिन रेस्तरां भीड़भाड़ और शोरगुल वाला था। एक सुखद अनुभव नहीं था।"
+ROMANISED_HINDI = ("Khana bahut accha tha lekin service bahut slow thi aur staff ne hamari baat "
+                   "par dhyan nahi diya phir bhi jagah sundar thi")
+
+
+@pytest.mark.parametrize("review", SHORT_ENGLISH)
+def test_short_english_reviews_are_english(review):
+    assert is_english(review)
+
+
+def test_long_english_review_is_english():
+    assert is_english("The hotel's sustainability initiatives are impressive, with solar panels and water "
+                      "recycling systems. The staff was incredibly courteous and helpful.")
+
+
+@pytest.mark.parametrize("review", [HINDI, ROMANISED_HINDI, "", "12345 !!!"])
+def test_other_languages_and_empty_text_are_not_english(review):
+    assert not is_english(review)
+
+
+def test_only_non_english_and_uncertain_reviews_reach_the_transformer():
+    seen = []
+
+    def transformer(texts):
+        seen.extend(texts)
+        return ["RED"] * len(texts)
+
+    verdicts = classify_reviews([SHORT_ENGLISH[0], SHORT_ENGLISH[1], HINDI], transformer=transformer)
+
+    assert [(v.label, v.stage) for v in verdicts[:2]] == [("GREEN", "lexicon"), ("RED", "lexicon")]
+    assert verdicts[2] == ("RED", "transformer", "non_english")
+    assert seen == [HINDI]
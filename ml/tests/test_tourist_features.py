@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from utils import tourist_features
+from utils.tourist_features import FeatureStore
+
+N_FEATURES = 64
+
+
+def rows(*columns):
+    """One unit row per column index."""
+    matrix = np.zeros((len(columns), N_FEATURES), dtype=np.float32)
+    matrix[np.arange(len(columns)), columns] = 1.0
+    return csr_matrix(matrix)
+
+
+def query(column):
+    vector = np.zeros(N_FEATURES, dtype=np.float32)
+    vector[column] = 1.0
+    return vector
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeatureStore(str(tmp_path), n_features=N_FEATURES)
+
+
+def test_single_saves_are_folded_into_the_newest_segment(store):
+    for tourist_id in range(1, 21):
+        store.append([tourist_id], rows(tourist_id))
+
+    assert len(store.segments()) == 1
+    assert len(store) == 20
+    assert store.best_match(query(7), range(1, 21)) == (7, 1.0)
+
+
+def test_append_starts_a_new_segment_once_the_newest_is_full(store, monkeypatch):
+    monkeypatch.setattr(tourist_features, "APPEND_SEGMENT_ROWS", 4)
+    store.append([1, 2, 3], rows(1, 2, 3))
+    store.append([4], rows(4))
+    store.append([5], rows(5))
+
+    assert [len(seg) for seg in store.segments()] == [4, 1]
+    # Candidates spread over both segments, some of them unknown
+    assert store.best_match(query(5), [2, 5, 99]) == (5, 1.0)
+    assert store.best_match(query(2), [2, 5]) == (2, 1.0)
+
+
+def test_best_match_accepts_a_sparse_query(store):
+    store.append([1, 2], rows(1, 2))
+
+    assert store.best_match(csr_matrix(query(2)), [1, 2]) == (2, 1.0)
+    assert store.best_match(query(3), [42]) == (None, 0.0)
+
+
+def test_another_process_sees_folded_appends(store, tmp_path):
+    other = FeatureStore(str(tmp_path), n_features=N_FEATURES)
+    store.append([1], rows(1))
+    assert other.best_match(query(1), [1]) == (1, 1.0)
+
+    store.append([2], rows(2))
+
+    assert [len(seg) for seg in other.segments()] == [2]
+    assert other.best_match(query(2), [1, 2]) == (2, 1.0)
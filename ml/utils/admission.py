@@ -0,0 +1,193 @@
+import itertools
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+import dotenv
+
+from utils.metrics import record_admission_wait, record_queued, record_shed
+from utils.tracing import span
+
+dotenv.load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+# Model-bound requests running at once in this process, across all limited endpoints
+ADMISSION_MODEL_SLOTS = int(os.getenv("ADMISSION_MODEL_SLOTS", "8"))
+# Model-bound requests allowed to wait for a slot. Each holds a server thread while it waits, so
+# slots + queued must stay below the worker's thread count to leave threads for cheap endpoints
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "4"))
+# Weight of the newest sample in each endpoint's moving average of service time
+SERVICE_TIME_ALPHA = 0.2
+
+# concurrency: the endpoint's share of the slots; queue: how many of it may wait;
+# priority: lower is admitted first and shed last; max_wait_s: longest it may wait;
+# service_s: service-time estimate used until real requests have been timed
+Limit = namedtuple("Limit", "concurrency queue priority max_wait_s service_s")
+
+ENDPOINT_LIMITS = {
+    # Interactive, short answers
+    "/chat/": Limit(6, 4, 0, 5, 3),
+    "/detect-waste/": Limit(3, 2, 1, 10, 5),
+    "/generate-itinerary": Limit(4, 2, 1, 20, 20),
+    # Batch work; clients can use /process-itinerary/jobs instead
+    "/process-itinerary": Limit(2, 1, 2, 30, 30),
+}
+
+
+class Overloaded(Exception):
+    """A request turned away: `status` 429 or 503, `retry_after` in whole seconds."""
+
+    def __init__(self, message, status, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Ticket:
+    __slots__ = ("route", "priority", "seq", "arrived", "started", "evicted")
+
+    def __init__(self, route, priority, seq, arrived):
+        self.route = route
+        self.priority = priority
+        self.seq = seq
+        self.arrived = arrived
+        self.started = None
+        self.evicted = False
+
+
+class AdmissionController:
+    """Admission for model-bound endpoints in one process: shared slots, per-endpoint caps, priority queue.
+
+    A request starts at once if a slot is free for it, waits in a bounded
+    queue ordered by (priority, arrival), or is turned away straight away
+    when its endpoint's queue is full (429) or its estimated wait exceeds
+    max_wait_s (503). When the whole queue is full, a higher-priority arrival
+    evicts the lowest-priority waiter. Waiters still queued at max_wait_s
+    are turned away too. Wait estimates come from each endpoint's moving
+    average of service time.
+    """
+
+    def __init__(self, limits=ENDPOINT_LIMITS, slots=ADMISSION_MODEL_SLOTS, max_queued=ADMISSION_MAX_QUEUED):
+        self.limits = limits
+        self.slots = slots
+        self.max_queued = max_queued
+        self._cond = threading.Condition()
+        self._running = []
+        self._waiting = []
+        self._service = {route: limit.service_s for route, limit in limits.items()}
+        self._seq = itertools.count()
+
+    def _can_start(self, route):
+        if len(self._running) >= self.slots:
+            return False
+        return sum(t.route == route for t in self._running) < self.limits[route].concurrency
+
+    def _next(self):
+        """The waiter that gets the next free slot: the best-ranked one whose endpoint has room."""
+        eligible = [t for t in self._waiting if self._can_start(t.route)]
+        return min(eligible, key=lambda t: (t.priority, t.seq), default=None)
+
+    def estimated_wait(self, route, priority, now):
+        """Seconds before a request for `route` arriving now would start."""
+        own = [t for t in self._running if t.route == route]
+        # Blocked either by its own endpoint's cap or by all slots being taken
+        blocking = own if len(own) >= self.limits[route].concurrency else self._running
+        first_free = min((max(0.0, self._service[t.route] - (now - t.started)) for t in blocking), default=0.0)
+        ahead = sum(self._service[t.route] for t in self._waiting if t.priority <= priority)
+        return first_free + ahead / self.slots
+
+    def _start(self, ticket):
+        ticket.started = time.monotonic()
+        self._running.append(ticket)
+        record_admission_wait(ticket.route, ticket.started - ticket.arrived)
+        # Several slots may have freed at once; let the next eligible waiter check again
+        if self._next() is not None:
+            self._cond.notify_all()
+        return ticket
+
+    def _leave_queue(self, ticket):
+        self._waiting.remove(ticket)
+        record_queued(ticket.route, -1)
+
+    def _shed(self, route, status, wait, reason, message):
+        record_shed(route, reason)
+        return Overloaded(message, status, max(1, math.ceil(wait)), reason)
+
+    def admit(self, route):
+        """Blocks until the request may run and returns its ticket; raises Overloaded otherwise."""
+        limit = self.limits[route]
+        with self._cond:
+            now = time.monotonic()
+            ticket = Ticket(route, limit.priority, next(self._seq), now)
+            ahead = [t for t in self._waiting if t.priority <= limit.priority and self._can_start(t.route)]
+            if self._can_start(route) and not ahead:
+                return self._start(ticket)
+
+            wait = self.estimated_wait(route, limit.priority, now)
+            if sum(t.route == route for t in self._waiting) >= limit.queue:
+                raise self._shed(route, 429, wait, "queue_full", "Too many requests to this endpoint; retry later")
+            if wait > limit.max_wait_s:
+                raise self._shed(route, 503, wait, "overloaded", "Service is overloaded; retry later")
+            if len(self._waiting) >= self.max_queued:
+                worst = max(self._waiting, key=lambda t: (t.priority, t.seq))
+                if worst.priority <= limit.priority:
+                    raise self._shed(route, 503, wait, "overloaded", "Service is overloaded; retry later")
+                worst.evicted = True
+                self._leave_queue(worst)
+                self._cond.notify_all()
+
+            self._waiting.append(ticket)
+            record_queued(route, 1)
+            deadline = now + limit.max_wait_s
+            while True:
+                if ticket.evicted:
+                    wait = self.estimated_wait(route, limit.priority, time.monotonic())
+                    raise self._shed(route, 503, wait, "evicted", "Service is overloaded; retry later")
+                if self._next() is ticket:
+                    self._leave_queue(ticket)
+                    return self._start(ticket)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._leave_queue(ticket)
+                    wait = self.estimated_wait(route, limit.priority, time.monotonic())
+                    raise self._shed(route, 503, wait, "timed_out", "Service is overloaded; retry later")
+                self._cond.wait(remaining)
+
+    def release(self, ticket):
+        with self._cond:
+            self._running.remove(ticket)
+            elapsed = time.monotonic() - ticket.started
+            self._service[ticket.route] += SERVICE_TIME_ALPHA * (elapsed - self._service[ticket.route])
+            self._cond.notify_all()
+
+
+def init_app(app, controller=None):
+    """Puts the endpoints in ENDPOINT_LIMITS behind admission control; returns the controller."""
+    from flask import g, jsonify, request
+
+    if not ADMISSION_ENABLED:
+        return None
+    controller = controller or AdmissionController()
+
+    @app.before_request
+    def _admit():
+        route = request.url_rule.rule if request.url_rule else None
+        if route not in controller.limits or request.method == "OPTIONS":
+            return None
+        try:
+            with span("admission"):
+                g.admission_ticket = controller.admit(route)
+        except Overloaded as e:
+            return jsonify({"error": str(e), "retry_after": e.retry_after}), e.status, {"Retry-After": str(e.retry_after)}
+        return None
+
+    @app.teardown_request
+    def _release(exc):
+        ticket = g.pop("admission_ticket", None)
+        if ticket is not None:
+            controller.release(ticket)
+
+    return controller
@@ -1,19 +1,26 @@
-import os
 import json
 import dotenv
-from langchain_openai import ChatOpenAI
+from utils.llm_router import get_router
+from utils.singleflight import SingleFlight, request_key
 
 # Load environment variables
 dotenv.load_dotenv()
-openai_api_key = os.getenv("OPENAI_API_KEY")
-
-# Initialize OpenAI API
-chatopenai = ChatOpenAI(model="gpt-4o-mini")
 
 # Track conversation history
 conversation_history = []
 
+chat_flight = SingleFlight("chat")
+
 def get_chat_response(user_input):
+    """Generates a response, sharing one model call among identical concurrent questions."""
+    return chat_flight.do(
+        # The answer depends on the conversation so far, not just the question
+        request_key("chat", user_input, conversation_history),
+        lambda: request_chat_response(user_input),
+        shareable=lambda result: "error" not in result,
+    )
+
+def request_chat_response(user_input):
     """Generates a response based on user input while tracking conversation history."""
     global conversation_history
 
@@ -33,9 +40,9 @@ def get_chat_response(user_input):
     )
 
     try:
-        # Get AI response
-        response = chatopenai.invoke(prompt)
-        generated_text = response.content.strip()
+        # Get AI response from the fastest healthy model
+        completion = get_router().complete("chat", [{"role": "user", "content": prompt}], "chat")
+        generated_text = completion.text.strip()
 
         # Structure output in JSON
         response_data = {
@@ -43,7 +50,7 @@ def get_chat_response(user_input):
             "bot_response": generated_text,
             "metadata": {
                 "source": "AI-generated",
-                "model": "gpt-4o-mini"
+                "model": completion.model
             }
         }
 
@@ -53,10 +60,10 @@ def get_chat_response(user_input):
             "bot": generated_text
         })
 
-        return json.dumps(response_data, indent=4)
+        return response_data
 
     except Exception as e:
-        return json.dumps({"error": str(e)})
+        return {"error": str(e)}
 
 # Interactive terminal chat
 if __name__ == "__main__":
@@ -67,4 +74,4 @@ if __name__ == "__main__":
             print("Exiting chatbot. Goodbye!")
             break
         response = get_chat_response(user_input)
-        print("Bot:", response)
+        print("Bot:", response.get("bot_response", response.get("error")))
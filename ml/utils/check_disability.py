@@ -1,6 +1,7 @@
 import requests
 import os
 from dotenv import load_dotenv
+from utils.metrics import provider_call
 
 load_dotenv()
 
@@ -15,8 +16,9 @@ def get_wheelchair_accessible(lat, lon, radius):
 
         url = f"https://maps.googleapis.com/maps/api/place/nearbysearch/json?location={location}&radius={radius}&type=tourist_attraction&keyword=wheelchair+accessible&key={API_KEY}"
 
-        response = requests.get(url)
-        places_data = response.json()
+        with provider_call("google_places", "nearby_search") as call:
+            response = call.check_status(requests.get(url))
+            places_data = response.json()
 
         # Format the response
         accessible_places = [{
@@ -0,0 +1,261 @@
+import os
+import re
+from functools import lru_cache
+
+import dotenv
+import numpy as np
+import pandas as pd
+
+from utils.metrics import record_schedule
+from utils.route_planner import haversine_matrix
+
+dotenv.load_dotenv()
+
+CROWD_CURVES_PATH = os.getenv("CROWD_CURVES_PATH", "data/crowd_curves.csv")
+
+SLOT_MINUTES = 15
+DAY_START_MINUTES = 6 * 60
+DAY_END_MINUTES = 23 * 60
+N_SLOTS = (DAY_END_MINUTES - DAY_START_MINUTES) // SLOT_MINUTES
+
+# Activity types scored against crowd curves; the rest (meals, transport) only keep near their time
+CROWD_TYPES = {"sightseeing", "activity", "shopping"}
+DEFAULT_VISIT_MINUTES = {"sightseeing": 90, "activity": 120, "shopping": 60, "meal": 60, "transport": 30}
+# How far meals and transport may move from the time the itinerary gave them; lifted for days that don't fit otherwise
+MAX_FIXED_SHIFT_MINUTES = 60
+# Cost per hour moved, in crowd-index hours; small for sights so flat curves leave them alone
+SHIFT_WEIGHT = {"crowd": 0.02, "fixed": 0.5}
+
+CITY_SPEED_KMH = 25
+TRAVEL_BUFFER_MINUTES = 10
+DEFAULT_TRAVEL_MINUTES = 20
+
+HOUR_COLUMNS = [f"h{hour:02d}" for hour in range(24)]
+TIME_PATTERN = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?", re.IGNORECASE)
+
+
+def parse_time(value):
+    """Minutes after midnight from "09:30", "9:30 AM" or "4 pm"; None if there's no time in it."""
+    match = TIME_PATTERN.search(str(value or ""))
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower().startswith("p") else 0)
+    if hour > 24 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def format_time(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def normalize_name(name):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(name).casefold()).split())
+
+
+@lru_cache(maxsize=1)
+def load_crowd_curves(path=CROWD_CURVES_PATH):
+    """Attraction name -> record with its 15-minute crowd curve over the scheduling day.
+
+    Rows named "*<type>" are the fallback curves for attractions not in the dataset. The bundled
+    curves are hand-made placeholders, not measurements; "#" lines in the file are comments.
+    """
+    frame = pd.read_csv(path, comment="#")
+    # Hourly index repeated per slot, starting at DAY_START
+    slot_hours = (DAY_START_MINUTES + np.arange(N_SLOTS) * SLOT_MINUTES) // 60
+    curves = frame[HOUR_COLUMNS].to_numpy(dtype=np.float64)[:, slot_hours]
+    records = {}
+    for row, curve in zip(frame.itertuples(index=False), curves):
+        key = normalize_name(row.name) if not row.name.startswith("*") else row.name
+        records[key] = {
+            "name": row.name,
+            "key": key,
+            "city": row.city,
+            "city_key": normalize_name(row.city),
+            "coords": None if pd.isna(row.lat) else (float(row.lat), float(row.lon)),
+            "opens": parse_time(row.opens),
+            "closes": parse_time(row.closes),
+            "visit_minutes": int(row.visit_minutes),
+            "curve": curve,
+        }
+    return records
+
+
+def destination_key(destination):
+    """Normalized destination padded with spaces, for whole-word matching; "" when unknown."""
+    if isinstance(destination, (list, tuple)):
+        destination = " ".join(map(str, destination))
+    return f" {normalize_name(destination)} " if destination else ""
+
+
+def local_records(records, destination):
+    """The fallback curves plus the attractions in one of the destination's cities."""
+    places = destination_key(destination)
+    return {key: record for key, record in records.items()
+            if key.startswith("*") or (places and f" {record['city_key']} " in places)}
+
+
+def find_attraction(activity, records, destination=None):
+    """Dataset record for an activity, matched on location or title; the type's fallback otherwise.
+
+    Only attractions in the trip's destination are considered, and the whole
+    attraction name has to appear as words in the activity's ("Sunset at Baga
+    Beach" matches Baga Beach; a bare "Beach" or "Palace" doesn't match anything).
+    """
+    places = destination_key(destination)
+    for field in ("location", "title"):
+        name = f" {normalize_name(activity.get(field, ''))} "
+        if not places or not name.strip():
+            continue
+        best = None
+        for key, record in records.items():
+            if key.startswith("*") or f" {record['city_key']} " not in places:
+                continue
+            # Longest name wins, e.g. "Agra Fort" over a hypothetical "Fort"
+            if f" {key} " in name and (best is None or len(key) > len(best["key"])):
+                best = record
+        if best is not None:
+            return best
+    return records.get(f"*{activity.get('type')}")
+
+
+def activity_costs(activity, record, original, max_fixed_shift=MAX_FIXED_SHIFT_MINUTES):
+    """(cost per start slot, duration in slots); infeasible starts cost inf."""
+    activity_type = activity.get("type")
+    slots = np.arange(N_SLOTS)
+    starts = DAY_START_MINUTES + slots * SLOT_MINUTES
+    crowd_scored = activity_type in CROWD_TYPES and record is not None
+
+    minutes = record["visit_minutes"] if crowd_scored else DEFAULT_VISIT_MINUTES.get(activity_type, 60)
+    duration = max(1, -(-minutes // SLOT_MINUTES))
+    ends = starts + duration * SLOT_MINUTES
+    feasible = ends <= DAY_END_MINUTES
+
+    if crowd_scored:
+        # Expected crowding: the curve integrated over the visit, in crowd-index hours
+        cumulative = np.concatenate(([0.0], np.cumsum(record["curve"])))
+        end_slots = np.minimum(slots + duration, N_SLOTS)
+        costs = (cumulative[end_slots] - cumulative[slots]) * SLOT_MINUTES / 60
+        feasible &= (starts >= record["opens"]) & (ends <= record["closes"])
+        weight = SHIFT_WEIGHT["crowd"]
+    else:
+        costs = np.zeros(N_SLOTS)
+        if original is not None:
+            feasible &= np.abs(starts - original) <= max_fixed_shift
+        weight = SHIFT_WEIGHT["fixed"]
+
+    if original is not None:
+        costs = costs + weight * np.abs(starts - original) / 60
+    return np.where(feasible, costs, np.inf), duration
+
+
+def travel_slots(activities, records):
+    """Slots needed to get from each activity to the next."""
+    minutes = np.full(max(len(activities) - 1, 0), DEFAULT_TRAVEL_MINUTES, dtype=np.float64)
+    coords = [record["coords"] if record else None for record in records]
+    located = [i for i, c in enumerate(coords) if c is not None]
+    if len(located) > 1:
+        distances = haversine_matrix(np.array([coords[i] for i in located]))
+        position = {index: k for k, index in enumerate(located)}
+        for i in range(len(activities) - 1):
+            if i in position and i + 1 in position:
+                km = distances[position[i], position[i + 1]]
+                minutes[i] = km / CITY_SPEED_KMH * 60 + TRAVEL_BUFFER_MINUTES
+    for i in range(len(activities) - 1):
+        # A transport activity already is the journey
+        if "transport" in (activities[i].get("type"), activities[i + 1].get("type")):
+            minutes[i] = 0
+    return np.ceil(minutes / SLOT_MINUTES).astype(int)
+
+
+def schedule_day(activities, records=None, destination=None, max_fixed_shift=MAX_FIXED_SHIFT_MINUTES):
+    """Start slots for the day's activities, in their given order, minimising total expected crowding.
+
+    Dynamic programme over (activity, start slot): each activity may start
+    once the previous one has ended and the travel between them is done.
+    Each step is a vectorised prefix-minimum over the slot grid, so a day
+    costs O(activities x slots). Returns None when nothing fits. Only as
+    good as the crowd curves: the bundled ones are placeholder data.
+    """
+    if not activities:
+        return []
+    records = local_records(load_crowd_curves() if records is None else records, destination)
+    matched = [find_attraction(activity, records, destination) for activity in activities]
+    originals = [parse_time(activity.get("time")) for activity in activities]
+
+    costs, durations = zip(*(activity_costs(activity, record, original, max_fixed_shift)
+                             for activity, record, original in zip(activities, matched, originals)))
+    travel = travel_slots(activities, matched)
+    slots = np.arange(N_SLOTS)
+
+    total = costs[0]
+    back = []
+    for i in range(1, len(activities)):
+        gap = durations[i - 1] + travel[i - 1]
+        best = np.minimum.accumulate(total)
+        # Position of the running minimum, for backtracking
+        best_at = np.maximum.accumulate(np.where(total == best, slots, 0))
+        previous = np.full(N_SLOTS, np.inf)
+        previous_at = np.zeros(N_SLOTS, dtype=int)
+        if gap < N_SLOTS:
+            previous[gap:] = best[:N_SLOTS - gap]
+            previous_at[gap:] = best_at[:N_SLOTS - gap]
+        total = costs[i] + previous
+        back.append(previous_at)
+
+    last = int(np.argmin(total))
+    if not np.isfinite(total[last]):
+        return None
+    starts = [last]
+    for previous_at in reversed(back):
+        starts.append(int(previous_at[starts[-1]]))
+    return [DAY_START_MINUTES + slot * SLOT_MINUTES for slot in reversed(starts)]
+
+
+def expected_crowding(activities, records=None, destination=None):
+    """Total crowd-index hours of the activities at their current times (for reporting)."""
+    records = local_records(load_crowd_curves() if records is None else records, destination)
+    total = 0.0
+    for activity in activities:
+        record = find_attraction(activity, records, destination)
+        start = parse_time(activity.get("time"))
+        if activity.get("type") not in CROWD_TYPES or record is None or start is None:
+            continue
+        slot = (start - DAY_START_MINUTES) // SLOT_MINUTES
+        duration = -(-record["visit_minutes"] // SLOT_MINUTES)
+        if 0 <= slot < N_SLOTS:
+            total += float(record["curve"][slot:slot + duration].sum()) * SLOT_MINUTES / 60
+    return total
+
+
+def schedule_itinerary(itinerary, destination=None, records=None):
+    """Rewrites activity times in every day of an itinerary.
+
+    A day that doesn't fit is retried with meals and transport free to move
+    anywhere in the day. One that still doesn't fit keeps the model's times,
+    and the itinerary's notes tell the traveller to check that day's timings.
+    """
+    records = local_records(load_crowd_curves() if records is None else records, destination)
+    unfit = []
+    for day in itinerary.get("days", []):
+        activities = day.get("activities") or []
+        starts = schedule_day(activities, records, destination)
+        result = "scheduled"
+        if starts is None:
+            starts = schedule_day(activities, records, destination, max_fixed_shift=DAY_END_MINUTES)
+            result = "relaxed"
+        if starts is None:
+            record_schedule("unfit")
+            unfit.append(str(day.get("day", len(unfit) + 1)))
+            continue
+        record_schedule(result)
+        for activity, start in zip(activities, starts):
+            activity["time"] = format_time(start)
+    if unfit:
+        warning = (f"Day{'s' if len(unfit) > 1 else ''} {', '.join(unfit)}: the plan may not fit opening hours "
+                   "and travel times; check timings locally.")
+        notes = itinerary.get("notes")
+        itinerary["notes"] = f"{notes} {warning}" if isinstance(notes, str) and notes else warning
+    return itinerary
@@ -0,0 +1,399 @@
+import fcntl
+import ipaddress
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import dotenv
+import requests
+
+from utils.metrics import provider_call
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.db")
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", "data/job_uploads")
+
+# Worker processes running process_cv; the only bound on concurrent extractions
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Submissions beyond this many queued jobs are refused
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+# Finished jobs (and their results) are kept this long
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+# Smaller documents go first; a job that has waited this long competes as if it were half its size
+JOB_AGING_S = float(os.getenv("JOB_AGING_S", "60"))
+# Set to false when workers run as their own service (python -m utils.extraction_jobs)
+JOB_WORKERS_EMBEDDED = os.getenv("JOB_WORKERS_EMBEDDED", "true").lower() == "true"
+# Comma-separated hosts callbacks may go to; when unset any host resolving to public addresses is allowed
+JOB_CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if h.strip()}
+
+POLL_INTERVAL_S = 0.2
+SUPERVISE_INTERVAL_S = 1.0
+SWEEP_INTERVAL_S = 60.0
+CALLBACK_TIMEOUT_S = 10
+CALLBACK_ATTEMPTS = 3
+# Non-2xx answers worth retrying; any other 3xx/4xx means the callback will never be accepted
+CALLBACK_RETRY_STATUSES = {408, 425, 429}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    callback_url TEXT,
+    worker_pid INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def upload_path(job_id, extension):
+    """Where an uploaded document waits for a worker."""
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    return os.path.join(JOB_UPLOAD_DIR, f"{job_id}.{extension}")
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, timezone.utc).isoformat() if value else None
+
+
+class JobStore:
+    """SQLite-backed extraction jobs, shared by the web processes and the workers."""
+
+    def __init__(self, path=JOB_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, job_id, path, callback_url=None, max_queued=JOB_MAX_QUEUED):
+        conn = self._connection()
+        with conn:
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                raise JobQueueFull(f"{queued} documents are already waiting; try again later")
+            conn.execute(
+                "INSERT INTO jobs (id, status, path, size_bytes, callback_url, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, path, os.path.getsize(path), callback_url, time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Public view of a job, or None if it doesn't exist or its result has expired."""
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["finished_at"] and time.time() - row["finished_at"] > JOB_RESULT_TTL_S):
+            return None
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "size_bytes": row["size_bytes"],
+            "created_at": _timestamp(row["created_at"]),
+            "started_at": _timestamp(row["started_at"]),
+            "finished_at": _timestamp(row["finished_at"]),
+        }
+        if row["status"] == "done":
+            job["result"] = json.loads(row["result"])
+        elif row["status"] == "failed":
+            job["error"] = row["error"]
+        return job
+
+    def callback_url(self, job_id):
+        row = self._connection().execute("SELECT callback_url FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["callback_url"] if row else None
+
+    def claim(self, worker_pid):
+        """Atomically takes the next job, smallest (age-adjusted) document first; (id, path) or None."""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            rows = conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+                "            ORDER BY size_bytes / (1.0 + (? - created_at) / ?), created_at LIMIT 1) "
+                "RETURNING id, path",
+                (worker_pid, now, now, JOB_AGING_S),
+            ).fetchall()
+        return (rows[0]["id"], rows[0]["path"]) if rows else None
+
+    def finish(self, job_id, result=None, error=None):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "done", json.dumps(result) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def fail_running(self, worker_pid, error):
+        """Marks whatever a dead worker was running as failed and returns those job ids."""
+        conn = self._connection()
+        with conn:
+            rows = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE status = 'running' AND worker_pid = ? RETURNING id, path",
+                (error, time.time(), worker_pid),
+            ).fetchall()
+        for row in rows:
+            remove_file(row["path"])
+        return [row["id"] for row in rows]
+
+    def requeue_running(self):
+        """Puts jobs left running by a previous worker pool back in the queue."""
+        conn = self._connection()
+        with conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL WHERE status = 'running'"
+            ).rowcount
+
+    def sweep(self, ttl=JOB_RESULT_TTL_S):
+        conn = self._connection()
+        with conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - ttl,)
+            ).rowcount
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def check_callback_url(url, allowed_hosts=JOB_CALLBACK_HOSTS):
+    """Raises ValueError unless `url` is http(s) to an allowed host whose addresses are all public.
+
+    Keeps the server from being pointed at itself, the internal network or
+    the cloud metadata endpoint (169.254.169.254).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed_hosts and host not in allowed_hosts:
+        raise ValueError(f"callback_url host {host} is not allowed")
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"callback_url host {host} can't be resolved: {e}") from e
+    for address in addresses:
+        # Covers loopback, RFC 1918, link-local, CGNAT, unspecified and reserved ranges
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+def notify(job, callback_url):
+    """POSTs the finished job to the client's callback URL, retrying with backoff."""
+    for attempt in range(CALLBACK_ATTEMPTS):
+        try:
+            # Checked again at send time: the name may resolve differently than when the job was submitted
+            check_callback_url(callback_url)
+        except ValueError as e:
+            logger.warning("Callback for job %s refused: %s", job["job_id"], e)
+            return False
+        try:
+            with provider_call("callback", "job_finished") as call:
+                # A redirect could lead to an address the check never saw
+                response = call.check_status(requests.post(callback_url, json=job, timeout=CALLBACK_TIMEOUT_S,
+                                                           allow_redirects=False))
+            if 200 <= response.status_code < 300:
+                return True
+            if 300 <= response.status_code < 500 and response.status_code not in CALLBACK_RETRY_STATUSES:
+                logger.warning("Callback for job %s rejected with HTTP %s", job["job_id"], response.status_code)
+                return False
+        except requests.RequestException as e:
+            logger.warning("Callback for job %s failed: %s", job["job_id"], e)
+        time.sleep(2 ** attempt)
+    return False
+
+
+def run_worker(parent_pid):
+    """Worker process loop: claim the next job, extract it, store the result, call back."""
+    # Imported here so only worker processes load the extraction chain
+    from utils.pdf_parsing_itinerary import process_cv
+
+    store = JobStore()
+    pid = os.getpid()
+    # A SIGTERMed web process doesn't take its daemon children with it; leave once re-parented
+    while os.getppid() == parent_pid:
+        claimed = store.claim(pid)
+        if claimed is None:
+            time.sleep(POLL_INTERVAL_S)
+            continue
+
+        job_id, path = claimed
+        result, error = None, None
+        try:
+            result = process_cv(path)
+            if result is None:
+                error = "Failed to process itinerary"
+        except Exception as e:
+            error = str(e)
+        finally:
+            remove_file(path)
+        store.finish(job_id, result, error)
+
+        callback_url = store.callback_url(job_id)
+        if callback_url:
+            notify(store.get(job_id), callback_url)
+
+
+class WorkerPool:
+    """A fixed number of worker processes, replaced if they die, plus the expired-job sweep."""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self.store = JobStore()
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._stop = threading.Event()
+
+    def _spawn(self):
+        process = self._context.Process(target=run_worker, args=(os.getpid(),), name="extraction-worker",
+                                        daemon=True)
+        process.start()
+        return process
+
+    def start(self):
+        requeued = self.store.requeue_running()
+        if requeued:
+            logger.info("Requeued %d jobs left running by a previous worker pool", requeued)
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name="extraction-supervisor", daemon=True)
+        self._supervisor.start()
+        return self
+
+    def _supervise(self):
+        last_sweep = time.monotonic()
+        while not self._stop.wait(SUPERVISE_INTERVAL_S):
+            for i, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                # Not requeued: a document that crashes a worker would crash the next one too
+                failed = self.store.fail_running(process.pid, "Worker exited while processing the document")
+                logger.warning("Extraction worker %s exited (code %s); failed jobs %s",
+                               process.pid, process.exitcode, failed)
+                self._processes[i] = self._spawn()
+            if time.monotonic() - last_sweep >= SWEEP_INTERVAL_S:
+                self.store.sweep()
+                last_sweep = time.monotonic()
+
+    def stop(self):
+        self._stop.set()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join()
+
+    def join(self):
+        self._supervisor.join()
+
+
+_store = None
+_pool = None
+_pool_lock_file = None
+_next_takeover = 0.0
+_lock = threading.Lock()
+
+
+def get_job_store():
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = JobStore()
+    return _store
+
+
+def ensure_workers():
+    """Starts the worker pool unless another process on this host already runs it.
+
+    Ownership is an flock on a file next to the job database, so with several
+    web processes exactly one runs the pool. If its process dies or is
+    recycled, the next process to call this takes over (on a submission, a
+    status poll or a web worker starting) and requeues the jobs left running.
+    """
+    global _pool, _pool_lock_file, _next_takeover
+    if _pool is not None:
+        return _pool
+    # Status polls call this often; while another process owns the pool, retry the lock only now and then
+    if time.monotonic() < _next_takeover:
+        return None
+    with _lock:
+        if _pool is not None:
+            return _pool
+        # post_fork can get here before any JobStore has created the database's directory
+        os.makedirs(os.path.dirname(JOB_DB_PATH) or ".", exist_ok=True)
+        lock_file = open(f"{JOB_DB_PATH}.workers.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            _next_takeover = time.monotonic() + SUPERVISE_INTERVAL_S
+            return None
+        _pool_lock_file = lock_file
+        _pool = WorkerPool().start()
+        return _pool
+
+
+def submit_job(job_id, path, callback_url=None):
+    job = get_job_store().submit(job_id, path, callback_url)
+    if JOB_WORKERS_EMBEDDED:
+        ensure_workers()
+    return job
+
+
+def get_job(job_id):
+    # Someone is waiting on this job, so make sure some process is working the queue
+    if JOB_WORKERS_EMBEDDED:
+        ensure_workers()
+    return get_job_store().get(job_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    get_job_store()
+    pool = ensure_workers()
+    if pool is None:
+        raise SystemExit("Another process is already running the extraction workers")
+    print(f"Running {pool.workers} extraction workers on {JOB_DB_PATH}")
+    pool.join()
@@ -3,6 +3,7 @@ import piexif
 from geopy.geocoders import Nominatim
 import requests
 from io import BytesIO
+from utils.metrics import provider_call
 
 geolocator = Nominatim(user_agent="LOC Project")
 
@@ -51,7 +52,8 @@ def get_nearest_address(latitude, longitude):
 
     coordinates = f"{latitude}, {longitude}"
     try:
-        location = geolocator.reverse(coordinates, exactly_one=True)
+        with provider_call("nominatim", "reverse"):
+            location = geolocator.reverse(coordinates, exactly_one=True)
 
         if location:
             return location.address
@@ -1,13 +1,46 @@
 import os
-import openai
 import re
-import json
+import logging
 import dotenv
+from concurrent.futures import ThreadPoolExecutor
+from utils.crowd_scheduler import schedule_itinerary
+from utils.itinerary_prompts import build_messages, check_token_budget
+from utils.itinerary_schema import (
+    DAY_SCHEMA,
+    ITINERARY_SCHEMA,
+    broken_days,
+    is_valid_day,
+    normalize_day,
+    normalize_itinerary,
+    repair_json,
+    response_format,
+    validate_itinerary,
+)
+from utils.llm_router import get_router
+from utils.metrics import record_retry
+from utils.singleflight import SingleFlight, request_key
+from utils.tracing import bind, span
 
 dotenv.load_dotenv()
 
-# OpenAI API Key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+logger = logging.getLogger(__name__)
+
+itinerary_flight = SingleFlight("itinerary")
+
+# Trips at least this long are generated as a skeleton plus one call per day in parallel
+PARALLEL_MIN_DAYS = int(os.getenv("ITINERARY_PARALLEL_MIN_DAYS", "4"))
+MAX_PARALLEL_DAYS = int(os.getenv("ITINERARY_MAX_PARALLEL_DAYS", "8"))
+
+# Ask for schema-constrained output (OpenAI structured outputs) instead of free-form JSON
+STRUCTURED_OUTPUT = os.getenv("ITINERARY_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Model calls per day before giving up on it
+DAY_ATTEMPTS = 2
+
+# Re-time activities against per-attraction crowd curves before returning the itinerary
+CROWD_SCHEDULING = os.getenv("ITINERARY_CROWD_SCHEDULING", "true").lower() == "true"
+
+# Activity types that may legitimately repeat on several days
+REPEATABLE_ACTIVITY_TYPES = {"meal", "transport", "accommodation", "rest"}
 
 def clean_itinerary_output(text):
     """Removes markdown symbols and extra spacing."""
@@ -38,19 +71,16 @@ def parse_itinerary(text):
 
     return itinerary_dict
 
-def optimize_itinerary(itinerary):
-    """Optimizes itinerary by shifting times to avoid peak hours."""
-    # Expecting itinerary to be a dict with keys like "Day 1", "Day 2", etc.
-    for day, schedule in itinerary.items():
-        for period in ["Morning", "Afternoon", "Evening"]:
-            if period in schedule:
-                for activity in schedule[period]:
-                    time_val = activity.get("time", "")
-                    if "10:00" in time_val:
-                        activity["time"] = "09:00"
-                    elif "14:30" in time_val:
-                        activity["time"] = "15:30"
-    return itinerary
+def optimize_itinerary(itinerary, place):
+    """Re-times each day's activities to avoid peak crowds, within opening hours and travel times."""
+    if not CROWD_SCHEDULING:
+        return itinerary
+    try:
+        return schedule_itinerary(itinerary, place)
+    except Exception as e:
+        # The model's own times are still a usable plan
+        logger.warning("Crowd scheduling failed, keeping the model's times: %s", e)
+        return itinerary
 
 def add_hidden_gems(itinerary):
     """Adds sidequests containing hidden gems to each day."""
@@ -95,170 +125,205 @@ def generate_itinerary(data):
     date = data["dateOfVisit"]
     hotel = data["currentStay"]
 
-    system_message = (
-            "You are a professional AI itinerary planner specialized in creating detailed travel plans. "
-            "You excel at producing structured, well-organized itineraries in JSON format. "
-            "Always consider optimal timing, local customs, and tourist preferences in your recommendations."
+    if not str(days).isdigit() or int(days) < 1:
+        return {"error": "daysOfVisit must be a positive whole number"}, 400
+    days = int(days)
+    trip = dict(tourists=tourists, days=days, place=place, hotel=hotel)
+
+    # Long trips: one cheap outline call, then every day concurrently
+    parallel = data.get("parallel")
+    if isinstance(parallel, str):
+        # Form posts and query strings send text; "false" must not count as truthy
+        parallel = {"true": True, "1": True, "false": False, "0": False}.get(parallel.strip().lower(), parallel)
+    if parallel is None:
+        parallel = days >= PARALLEL_MIN_DAYS
+    elif not isinstance(parallel, bool):
+        return {"error": "parallel must be true or false"}, 400
+    if parallel:
+        with span("prompt"):
+            messages = build_messages("itinerary_skeleton", date=date, **trip)
+            try:
+                check_token_budget(messages)
+            except ValueError as e:
+                return {"error": str(e)}, 400
+        key = request_key("itinerary-by-day", {field: data[field] for field in required_fields})
+        return itinerary_flight.do(
+            key,
+            lambda: request_itinerary_by_day(messages, trip),
+            shareable=lambda result: result[1] == 200,
         )
 
-    user_prompt = (
-        f"Create a detailed, structured {days}-day itinerary for {place}, "
-        f"starting from {date}, for {tourists} tourists staying at {hotel}. Your name is {user_name}.\n\n"
-        "The itinerary must be well-organized, structured in JSON format, and divided into:\n"
-        "- Morning: Sightseeing, activities, tours.\n"
-        "- Afternoon: Lunch recommendations, local cuisine.\n"
-        "- Evening: Cultural activities, entertainment, nightlife.\n"
-        "- Sidequests: Include at least two unique 'Hidden Gems' for tourists to explore.\n\n"
-        "Optimize visit timings to avoid peak crowd hours.\n"
-        "Return ONLY valid JSON format without any additional text.\n"
-        "You are an AI travel planner. Generate a detailed, structured {days}-day itinerary for {place}, "
-        "starting from {date}, for {tourists} tourists staying at {hotel}. Provide a well-structured and readable "
-        "itinerary in plain text, avoiding JSON formatting.\n\n"
-        "Each day should include:\n"
-        "- Morning: Sightseeing, activities, tours\n"
-        "- Afternoon: Lunch recommendations, local cuisine\n"
-        "- Evening: Cultural activities, entertainment, nightlife.\n"
-        "- Sidequests: Include at least two unique 'Hidden Gems' for tourists to explore.\n\n"
-        "I want the response in a json format that looks like this:\n"
-        "{\n"
-        '    "title": "Cape Town Adventure",\n'
-        '    "startDate": "2024-03-15",\n'
-        '    "endDate": "2024-03-17",\n'
-        '    "accommodation": {\n'
-        '        "name": "Hotel Southern Sun Cape Sun",\n'
-        '        "address": "Strand Street, Cape Town City Centre, Cape Town, 8001, South Africa",\n'
-        '        "phone": "+27 21 488 5100"\n'
-        "    },\n"
-        '    "contacts": [\n'
-        '        {\n'
-        '            "name": "John Smith",\n'
-        '            "role": "Tour Guide",\n'
-        '            "phone": "+27 123 456 789",\n'
-        '            "email": "john@example.com"\n'
-        "        },\n"
-        '        {\n'
-        '            "name": "Emergency Support",\n'
-        '            "role": "24/7 Assistance",\n'
-        '            "phone": "+27 987 654 321"\n'
-        "        }\n"
-        "    ],\n"
-        '    "days": [\n'
-        '        {\n'
-        '            "day": 1,\n'
-        '            "date": "March 15, 2024",\n'
-        '            "title": "Mumbai - Cape Town",\n'
-        '            "activities": [\n'
-        '                {\n'
-        '                    "time": "10:00",\n'
-        '                    "title": "Departure from Mumbai",\n'
-        '                    "location": "Chhatrapati Shivaji International Terminal",\n'
-        '                    "description": "Assemble at Mumbai\'s Chatrapati Shivaji international terminal to board your flight for Cape Town via Addis Ababa / Nairobi / Seychelles.",\n'
-        '                    "type": "transport"\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "20:00",\n'
-        '                    "title": "Arrival & Hotel Transfer",\n'
-        '                    "location": "Cape Town International Airport",\n'
-        '                    "description": "On arrival in Cape Town after clearing customs & immigrations formalities we shall proceed to board our coach for transfer to the hotel.",\n'
-        '                    "type": "transport"\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "21:30",\n'
-        '                    "title": "Dinner",\n'
-        '                    "location": "Hotel Restaurant",\n'
-        '                    "description": "Welcome dinner at the hotel restaurant",\n'
-        '                    "type": "meal",\n'
-        '                    "included": true\n'
-        "                }\n"
-        "            ]\n"
-        "        },\n"
-        '        {\n'
-        '            "day": 2,\n'
-        '            "date": "March 16, 2024",\n'
-        '            "title": "Cape Town Exploration",\n'
-        '            "activities": [\n'
-        '                {\n'
-        '                    "time": "07:30",\n'
-        '                    "title": "Breakfast",\n'
-        '                    "location": "Hotel Restaurant",\n'
-        '                    "description": "Breakfast at the hotel",\n'
-        '                    "type": "meal",\n'
-        '                    "included": true\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "09:00",\n'
-        '                    "title": "Cape Town City Tour",\n'
-        '                    "location": "Various Locations",\n'
-        '                    "description": "Tour including the Malay Quarter, Castle, and Table Bay to Millerton lighthouse",\n'
-        '                    "type": "sightseeing",\n'
-        '                    "included": true\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "13:00",\n'
-        '                    "title": "Lunch",\n'
-        '                    "location": "Local Restaurant",\n'
-        '                    "description": "Lunch at a local restaurant",\n'
-        '                    "type": "meal",\n'
-        '                    "included": true\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "14:30",\n'
-        '                    "title": "Table Mountain",\n'
-        '                    "location": "Table Mountain",\n'
-        '                    "description": "Experience Table Mountain by Aerial Cable Car which trips you 1089 meters above Cape Town",\n'
-        '                    "type": "sightseeing",\n'
-        '                    "included": true\n'
-        "                }\n"
-        "            ]\n"
-        "        },\n"
-        '        {\n'
-        '            "day": 3,\n'
-        '            "date": "March 17, 2024",\n'
-        '            "title": "Cape Peninsula Tour",\n'
-        '            "activities": [\n'
-        '                {\n'
-        '                    "time": "08:00",\n'
-        '                    "title": "Breakfast",\n'
-        '                    "location": "Hotel Restaurant",\n'
-        '                    "description": "Breakfast at the hotel",\n'
-        '                    "type": "meal",\n'
-        '                    "included": true\n'
-        "                },\n"
-        '                {\n'
-        '                    "time": "09:00",\n'
-        '                    "title": "Peninsula Tour",\n'
-        '                    "location": "Cape Peninsula",\n'
-        '                    "description": "Full day tour of the Cape Peninsula. Travel at a pace that allows you to explore the beauty of the Cape Peninsula.",\n'
-        '                    "type": "sightseeing",\n'
-        '                    "included": true\n'
-        "                }\n"
-        "            ]\n"
-        "        }\n"
-        "    ],\n"
-        '    "notes": "Please carry comfortable walking shoes and don\'t forget your camera! Weather can be unpredictable, so pack accordingly."\n'
-        "}\n\n"
-        "Ensure readability with proper spacing and bullet points."
+    variables = dict(user_name=user_name, tourists=tourists, days=days, place=place, date=date, hotel=hotel)
+    with span("prompt"):
+        messages = build_messages("itinerary", **variables)
+        try:
+            check_token_budget(messages)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+    # Identical concurrent requests (e.g. a shared trip) wait on a single model call
+    key = request_key("itinerary", {field: data[field] for field in required_fields})
+    return itinerary_flight.do(
+        key,
+        lambda: request_itinerary(messages, trip),
+        shareable=lambda result: result[1] == 200,
     )
 
+def output_format(name, schema):
+    if STRUCTURED_OUTPUT:
+        return response_format(name, schema)
+    return {"type": "json_object"}
+
+def call_model(messages, operation, output=None):
+    """Runs one chat completion on the fastest healthy model and returns the Completion."""
+    completion = get_router().complete("itinerary", messages, operation, response_format=output)
+    logger.debug("Raw %s response from %s: %s", operation, completion.model, completion.text)
+    return completion
+
+def generate_day(outline_day, other_areas, trip):
+    """Generates one valid day, re-asking the model once if the reply can't be repaired."""
+    with span("prompt"):
+        messages = build_messages("itinerary_day", outline_day=outline_day, other_areas=other_areas, **trip)
+        # The outline comes from the model, so a runaway area list can push a day prompt over budget
+        check_token_budget(messages)
+    completion = None
+    for attempt in range(DAY_ATTEMPTS):
+        if attempt:
+            record_retry(completion.provider if completion else "router", "itinerary_day")
+        try:
+            completion = call_model(messages, "itinerary_day", output_format("itinerary_day", DAY_SCHEMA))
+            with span("parse_json"):
+                # A cut-off day would lose its last activities silently; ask again instead
+                day = normalize_day(repair_json(completion.text, close=False), outline_day["day"])
+        except ValueError:
+            continue
+        if is_valid_day(day):
+            day["day"] = outline_day["day"]
+            return day
+    raise ValueError(f"Could not generate a valid plan for day {outline_day['day']}")
+
+def repair_itinerary(itinerary, trip):
+    """Re-requests only the days that are missing or fail validation."""
+    normalize_itinerary(itinerary)
+    broken = broken_days(itinerary, trip["days"])
+    if not broken:
+        return itinerary
+
+    days = itinerary["days"]
+    titles = ", ".join(day.get("title", "") for number, day in enumerate(days, start=1)
+                       if number not in broken and isinstance(day, dict))
+
+    def regenerate(number):
+        existing = days[number - 1] if number <= len(days) and isinstance(days[number - 1], dict) else {}
+        outline_day = {"day": number, "date": existing.get("date", ""), "area": trip["place"]}
+        return generate_day(outline_day, titles, trip)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_DAYS, len(broken))) as pool:
+        fixed = dict(zip(broken, pool.map(bind(regenerate), broken)))
+
+    itinerary["days"] = [fixed.get(number) or days[number - 1] for number in range(1, trip["days"] + 1)]
+    return itinerary
+
+def request_itinerary(messages, trip):
+    """Asks the model for an itinerary, repairing it locally or per day rather than regenerating it."""
     try:
-        openai_client = openai.OpenAI()
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+        completion = call_model(messages, "generate_itinerary", output_format("itinerary", ITINERARY_SCHEMA))
+        with span("parse_json"):
+            itinerary = repair_json(completion.text)
+        if not isinstance(itinerary, dict):
+            raise ValueError("Model output is not a JSON object")
+        with span("repair_days"):
+            itinerary = repair_itinerary(itinerary, trip)
+        with span("schedule"):
+            itinerary = optimize_itinerary(itinerary, trip["place"])
+        with span("validate"):
+            validate_itinerary(itinerary)
+        return itinerary, 200
+
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+def normalize_outline(outline_days, days, place):
+    """Exactly `days` outline entries numbered 1..days, filling gaps with the whole destination."""
+    by_number = {}
+    for position, outline_day in enumerate(outline_days, start=1):
+        number = outline_day.get("day", position)
+        number = int(number) if str(number).isdigit() else position
+        if 1 <= number <= days and number not in by_number:
+            by_number[number] = dict(outline_day, day=number)
+    outline = []
+    for number in range(1, days + 1):
+        outline_day = by_number.get(number, {"day": number})
+        outline_day.setdefault("area", place)
+        outline_day.setdefault("title", f"Day {number}")
+        outline.append(outline_day)
+    return outline
+
+def attraction_key(activity):
+    """Identity of an attraction for cross-day de-duplication, or None for repeatable activities."""
+    if str(activity.get("type", "")).lower() in REPEATABLE_ACTIVITY_TYPES:
+        return None
+    name = activity.get("location") or activity.get("title") or ""
+    return " ".join(str(name).split()).casefold() or None
+
+def merge_days(skeleton, outline, day_results):
+    """Builds the regular itinerary schema from the outline and per-day plans.
+
+    Days are merged in day order and an attraction already visited on an
+    earlier day is dropped from later ones, so the result doesn't depend on
+    which call finished first.
+    """
+    seen = set()
+    merged_days = []
+    for outline_day, day in zip(outline, day_results):
+        activities = []
+        for activity in day.get("activities", []):
+            key = attraction_key(activity)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            activities.append(activity)
+        merged_days.append({
+            "day": outline_day["day"],
+            "date": outline_day.get("date") or day.get("date", ""),
+            "title": day.get("title") or outline_day["title"],
+            "activities": activities,
+        })
+
+    return {
+        "title": skeleton.get("title", ""),
+        "startDate": skeleton.get("startDate", ""),
+        "endDate": skeleton.get("endDate", ""),
+        "accommodation": skeleton.get("accommodation", {}),
+        "contacts": skeleton.get("contacts", []),
+        "days": merged_days,
+        "notes": skeleton.get("notes", ""),
+    }
+
+def request_itinerary_by_day(messages, trip):
+    """Generates the outline, then every day concurrently, and merges them into one itinerary."""
+    try:
+        completion = call_model(messages, "itinerary_skeleton", {"type": "json_object"})
+        with span("parse_json"):
+            skeleton = repair_json(completion.text)
+        outline = normalize_outline(skeleton.get("days", []), trip["days"], trip["place"])
 
-        raw_itinerary = response.choices[0].message.content
-        print("RAW ITINERARY RESPONSE:", raw_itinerary)
+        def plan_day(outline_day):
+            other_areas = ", ".join(d["area"] for d in outline if d["day"] != outline_day["day"])
+            return generate_day(outline_day, other_areas, trip)
 
-        if raw_itinerary is None:
-            raise Exception("Failed to generate itinerary")
+        with span("plan_days"), ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_DAYS, len(outline))) as pool:
+            day_results = list(pool.map(bind(plan_day), outline))
 
-        response = raw_itinerary.strip().split("```json")[1].split("```")[0]
-        response_json = json.loads(response)
-        return response_json, 200
+        itinerary = merge_days(skeleton, outline, day_results)
+        # Fills in any top-level fields the outline left out or got the type wrong
+        normalize_itinerary(itinerary)
+        with span("schedule"):
+            itinerary = optimize_itinerary(itinerary, trip["place"])
+        with span("validate"):
+            validate_itinerary(itinerary)
+        return itinerary, 200
 
     except Exception as e:
         return {"error": str(e)}, 500
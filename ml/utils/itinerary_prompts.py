@@ -0,0 +1,156 @@
+import json
+import os
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# Prompt version used for single-call itineraries
+ITINERARY_PROMPT_VERSION = os.getenv("ITINERARY_PROMPT_VERSION", "v2")
+
+# Requests whose prompt would exceed this many input tokens are rejected
+PROMPT_TOKEN_BUDGET = int(os.getenv("ITINERARY_PROMPT_TOKEN_BUDGET", "2500"))
+
+SYSTEM_MESSAGE = (
+    "You are a professional AI itinerary planner specialized in creating detailed travel plans. "
+    "You excel at producing structured, well-organized itineraries in JSON format. "
+    "Always consider optimal timing, local customs, and tourist preferences in your recommendations."
+)
+
+# One-day example of the response schema. Serialized once, so the prefix is byte-identical on every call.
+ITINERARY_EXAMPLE = {
+    "title": "Cape Town Adventure",
+    "startDate": "2024-03-15",
+    "endDate": "2024-03-15",
+    "accommodation": {"name": "Hotel Southern Sun Cape Sun", "address": "Strand Street, Cape Town, 8001",
+                      "phone": "+27 21 488 5100"},
+    "contacts": [{"name": "Emergency Support", "role": "24/7 Assistance", "phone": "+27 987 654 321",
+                  "email": None}],
+    "days": [{
+        "day": 1,
+        "date": "March 15, 2024",
+        "title": "Cape Town Exploration",
+        "activities": [
+            {"time": "07:30", "title": "Breakfast", "location": "Hotel Restaurant",
+             "description": "Breakfast at the hotel", "type": "meal", "included": True},
+            {"time": "09:00", "title": "Table Mountain", "location": "Table Mountain",
+             "description": "Cable car to the summit before the midday queues", "type": "sightseeing",
+             "included": True},
+            {"time": "13:00", "title": "Lunch", "location": "Bo-Kaap",
+             "description": "Cape Malay curry in the Bo-Kaap quarter", "type": "meal", "included": False},
+        ],
+    }],
+    "notes": "Carry comfortable walking shoes; weather can change quickly.",
+}
+
+ITINERARY_RULES = (
+    "Return only a JSON object, with no text before or after it, shaped like this example:\n"
+    + json.dumps(ITINERARY_EXAMPLE, separators=(",", ":")) + "\n"
+    "Rules:\n"
+    '- "days" has one entry per day of the trip, each with "day", "date", "title" and chronological "activities".\n'
+    '- Every activity has "time" (HH:MM), "title", "location", "description", '
+    '"type" (transport, meal, sightseeing, activity or shopping) and "included" (true/false).\n'
+    "- Each day covers morning sightseeing, lunch with local cuisine, and evening culture or entertainment.\n"
+    "- Include at least two lesser-known hidden gems across the trip.\n"
+    "- Time visits to avoid peak crowd hours."
+)
+
+SKELETON_RULES = (
+    "Outline the trip described by the user. Return only a JSON object with these keys:\n"
+    '- "title", "startDate" and "endDate" (YYYY-MM-DD), "notes"\n'
+    '- "accommodation": {"name", "address", "phone"}\n'
+    '- "contacts": [{"name", "role", "phone", "email" (null if unknown)}]\n'
+    '- "days": one entry per day of the trip, each {"day", "date" (e.g. "March 15, 2024"), "title", "area"}, '
+    "where area is the neighbourhood or region explored that day. Give each day a different area where possible.\n"
+    "Do not list activities."
+)
+
+DAY_RULES = (
+    "Plan the single day of a trip described by the user. Return only a JSON object: "
+    '{"day", "date", "title", "activities": [{"time" (HH:MM), "title", "location", "description", '
+    '"type" (transport, meal, sightseeing, activity or shopping), "included" (true/false)}]}.\n'
+    "Include breakfast, lunch and dinner and at least one lesser-known hidden gem. "
+    "Do not plan attractions belonging to the areas covered on other days. "
+    "Optimize visit timings to avoid peak crowd hours."
+)
+
+
+def itinerary_v2(user_name, tourists, days, place, date, hotel):
+    """Static instructions and schema in the system message; only the trip details vary.
+
+    The shared prefix (~440 tokens) is below the 1024 tokens OpenAI needs before it caches a
+    prefix, so the gain over the original prompt is its 3x smaller size, not cached input. Keeping
+    the stable part first means caching applies without reordering if the rules ever grow past
+    the threshold.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE + "\n\n" + ITINERARY_RULES},
+        {"role": "user", "content": f"Trip for {user_name}: {days} days in {place}, starting {date}, "
+                                    f"for {tourists} tourists staying at {hotel}."},
+    ]
+
+
+def skeleton_v1(tourists, days, place, date, hotel):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE + "\n\n" + SKELETON_RULES},
+        {"role": "user", "content": f"Trip: {days} days in {place}, starting {date}, "
+                                    f"for {tourists} tourists staying at {hotel}."},
+    ]
+
+
+def day_v1(outline_day, other_areas, tourists, days, place, hotel):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE + "\n\n" + DAY_RULES},
+        {"role": "user", "content": f"Trip: {days} days in {place} for {tourists} tourists staying at {hotel}.\n"
+                                    f"Plan day {outline_day['day']} of {days}, date: {outline_day.get('date', '')}, "
+                                    f"area: {outline_day['area']}.\n"
+                                    f"Other days cover: {other_areas or 'none'}."},
+    ]
+
+
+PROMPTS = {
+    "itinerary": {"v2": itinerary_v2},
+    "itinerary_skeleton": {"v1": skeleton_v1},
+    "itinerary_day": {"v1": day_v1},
+}
+
+DEFAULT_VERSIONS = {
+    "itinerary": ITINERARY_PROMPT_VERSION,
+    "itinerary_skeleton": "v1",
+    "itinerary_day": "v1",
+}
+
+
+def build_messages(name, version=None, **variables):
+    """Chat messages for a named prompt at the given (or configured) version."""
+    return PROMPTS[name][version or DEFAULT_VERSIONS[name]](**variables)
+
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Token count for gpt-4o-mini; falls back to a 4-chars-per-token estimate without tiktoken data."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text))
+
+
+def count_message_tokens(messages):
+    # ~4 tokens of chat framing per message
+    return sum(count_tokens(message["content"]) + 4 for message in messages)
+
+
+def check_token_budget(messages, budget=PROMPT_TOKEN_BUDGET):
+    """Returns the prompt's token count, raising ValueError when it exceeds the budget."""
+    tokens = count_message_tokens(messages)
+    if tokens > budget:
+        raise ValueError(f"Prompt is {tokens} tokens, over the {budget}-token budget")
+    return tokens
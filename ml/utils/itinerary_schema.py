@@ -0,0 +1,287 @@
+import json
+import re
+
+import fastjsonschema
+
+ACTIVITY_TYPES = ["transport", "meal", "sightseeing", "activity", "shopping"]
+
+ACTIVITY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "time": {"type": "string"},
+        "title": {"type": "string"},
+        "location": {"type": "string"},
+        "description": {"type": "string"},
+        "type": {"type": "string", "enum": ACTIVITY_TYPES},
+        "included": {"type": "boolean"},
+    },
+    "required": ["time", "title", "location", "description", "type", "included"],
+    "additionalProperties": False,
+}
+
+DAY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "day": {"type": "integer"},
+        "date": {"type": "string"},
+        "title": {"type": "string"},
+        "activities": {"type": "array", "items": ACTIVITY_SCHEMA},
+    },
+    "required": ["day", "date", "title", "activities"],
+    "additionalProperties": False,
+}
+
+CONTACT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "role": {"type": "string"},
+        "phone": {"type": "string"},
+        # Strict structured output can't leave a property out, so a contact without one says null
+        "email": {"type": ["string", "null"]},
+    },
+    "required": ["name", "role", "phone", "email"],
+    "additionalProperties": False,
+}
+
+ITINERARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "startDate": {"type": "string"},
+        "endDate": {"type": "string"},
+        "accommodation": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "address": {"type": "string"},
+                "phone": {"type": "string"},
+            },
+            "required": ["name", "address", "phone"],
+            "additionalProperties": False,
+        },
+        "contacts": {"type": "array", "items": CONTACT_SCHEMA},
+        "days": {"type": "array", "items": DAY_SCHEMA},
+        "notes": {"type": "string"},
+    },
+    "required": ["title", "startDate", "endDate", "accommodation", "contacts", "days", "notes"],
+    "additionalProperties": False,
+}
+
+# Compiled once to plain Python; validating a full trip takes microseconds
+validate_itinerary = fastjsonschema.compile(ITINERARY_SCHEMA)
+validate_day = fastjsonschema.compile(DAY_SCHEMA)
+
+ValidationError = fastjsonschema.JsonSchemaException
+
+
+def response_format(name, schema):
+    """OpenAI structured-output request for a strict JSON schema."""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+_decoder = json.JSONDecoder()
+
+
+def _structure(text):
+    """Yields (index, char) for characters outside string literals, plus the quotes opening and closing them."""
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                yield i, ch
+            continue
+        if ch == '"':
+            in_string = True
+        yield i, ch
+
+
+def _object_end(text):
+    """Index just past the JSON object `text` starts with, or None if it is never closed."""
+    try:
+        return _decoder.raw_decode(text)[1]
+    except ValueError:
+        pass
+    # Not valid as it stands (e.g. trailing commas); match brackets instead
+    depth = 0
+    for i, ch in _structure(text):
+        if ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def strip_to_json(raw):
+    """Drops markdown fences and any prose before or after the outermost JSON object."""
+    text = raw.strip()
+    fenced = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    start = text.find("{")
+    if start < 0:
+        return text
+    text = text[start:]
+    end = _object_end(text)
+    return text[:end] if end else text
+
+
+def remove_trailing_commas(text):
+    """Drops commas directly before a closing bracket, leaving string contents alone."""
+    parts = []
+    last = 0
+    for i, ch in _structure(text):
+        if ch == "," and text[i + 1:].lstrip()[:1] in ("}", "]"):
+            parts.append(text[last:i])
+            last = i + 1
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def close_truncated(text):
+    """Cuts a truncated document back to its last complete element and closes open brackets.
+
+    An array element that was cut off is dropped whole, with everything nested in it, so a
+    half-written day or activity goes missing (and gets flagged) instead of passing as complete.
+    """
+    stack = []
+    quotes = 0
+    last_safe = None
+
+    def between_elements(stack):
+        # Outside any array, or directly inside the only open one
+        arrays = stack.count("[")
+        return arrays == 0 or (arrays == 1 and stack[-1] == "[")
+
+    for i, ch in _structure(text):
+        if ch == '"':
+            quotes += 1
+        elif ch in "{[":
+            if stack and stack[-1] == "[" and between_elements(stack):
+                last_safe = (i, list(stack))
+            stack.append(ch)
+            if between_elements(stack):
+                last_safe = (i + 1, list(stack))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if between_elements(stack):
+                last_safe = (i + 1, list(stack))
+        elif ch == "," and between_elements(stack):
+            last_safe = (i, list(stack))
+
+    if (not stack and quotes % 2 == 0) or last_safe is None:
+        return text
+    cut, open_brackets = last_safe
+    closing = "".join("}" if bracket == "{" else "]" for bracket in reversed(open_brackets))
+    return text[:cut].rstrip().rstrip(",") + closing
+
+
+def repair_json(raw, close=True):
+    """Parses model output, locally fixing fences, trailing commas and truncation as needed.
+
+    With close=False a truncated document is an error rather than being cut back.
+    """
+    text = strip_to_json(raw)
+    fixes = [lambda t: t, remove_trailing_commas]
+    if close:
+        fixes.append(lambda t: remove_trailing_commas(close_truncated(t)))
+    for fix in fixes:
+        try:
+            return json.loads(fix(text))
+        except ValueError:
+            continue
+    raise ValueError("Model output is not valid JSON and could not be repaired")
+
+
+def drop_unknown_fields(obj, schema):
+    """Removes keys the schema doesn't define (models like to add extras such as "cost")."""
+    for key in [key for key in obj if key not in schema["properties"]]:
+        del obj[key]
+    return obj
+
+
+def normalize_activity(activity):
+    """Fills the small gaps models commonly leave in an activity before validation."""
+    if not isinstance(activity, dict):
+        return activity
+    drop_unknown_fields(activity, ACTIVITY_SCHEMA)
+    activity.setdefault("included", False)
+    for field in ("time", "title", "location", "description"):
+        activity.setdefault(field, "")
+    activity_type = str(activity.get("type", "")).lower()
+    activity["type"] = activity_type if activity_type in ACTIVITY_TYPES else "activity"
+    return activity
+
+
+def normalize_day(day, number):
+    if not isinstance(day, dict):
+        return day
+    drop_unknown_fields(day, DAY_SCHEMA)
+    day.setdefault("day", number)
+    if isinstance(day["day"], str) and day["day"].isdigit():
+        day["day"] = int(day["day"])
+    day.setdefault("date", "")
+    day.setdefault("title", f"Day {number}")
+    if isinstance(day.get("activities"), list):
+        day["activities"] = [normalize_activity(activity) for activity in day["activities"]]
+    return day
+
+
+def is_valid_day(day):
+    try:
+        validate_day(day)
+    except ValidationError:
+        return False
+    # normalize_activity fills missing fields with "", which the schema alone would accept
+    activities = day["activities"]
+    return bool(activities) and all(activity["title"].strip() and activity["location"].strip()
+                                    for activity in activities)
+
+
+def normalize_itinerary(itinerary):
+    """Coerces the top-level fields to the schema's types and normalizes every day, in place."""
+    drop_unknown_fields(itinerary, ITINERARY_SCHEMA)
+    for field in ("title", "startDate", "endDate", "notes"):
+        if not isinstance(itinerary.get(field), str):
+            itinerary[field] = str(itinerary.get(field) or "")
+
+    accommodation = itinerary.get("accommodation")
+    if not isinstance(accommodation, dict):
+        accommodation = itinerary["accommodation"] = {}
+    drop_unknown_fields(accommodation, ITINERARY_SCHEMA["properties"]["accommodation"])
+    for field in ("name", "address", "phone"):
+        accommodation[field] = str(accommodation.get(field) or "")
+
+    contacts = itinerary.get("contacts")
+    if not isinstance(contacts, list):
+        contacts = []
+    itinerary["contacts"] = [
+        dict({field: str(contact.get(field) or "") for field in ("name", "role", "phone")},
+             email=str(contact["email"]) if contact.get("email") else None)
+        for contact in contacts if isinstance(contact, dict)
+    ]
+
+    days = itinerary.get("days")
+    if not isinstance(days, list):
+        days = itinerary["days"] = []
+
+    for number, day in enumerate(days, start=1):
+        normalize_day(day, number)
+    return itinerary
+
+
+def broken_days(itinerary, expected_days):
+    """Day numbers (1-based) of a normalized itinerary that are missing or invalid."""
+    days = itinerary["days"]
+    broken = [number for number, day in enumerate(days, start=1) if not is_valid_day(day)]
+    broken.extend(range(len(days) + 1, expected_days + 1))
+    return broken
@@ -1,47 +1,64 @@
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import HashingVectorizer
 import dotenv
 
+from utils.tourist_features import N_FEATURES, get_feature_store
+from utils.tourist_store import get_tourist_store
+
 dotenv.load_dotenv()
 
-def fetch_all_tourists():
-    """Retrieve all tourists. (MongoDB logic removed)"""
-    return []
+# Stateless, so a profile's vector can be computed once at save time and
+# persisted. Rows are L2-normalised, making the dot product the cosine similarity.
+vectorizer = HashingVectorizer(n_features=N_FEATURES, alternate_sign=False, norm="l2", dtype=np.float32)
+
+def feature_text(tourist):
+    """Text fed to the vectorizer for one tourist."""
+    return f"{tourist.get('placetovisit', '')} {tourist.get('currentstay', '')} {tourist.get('date', '')} {tourist.get('purposeofvisit', '')}"
 
-def calculate_similarity(new_tourist, tourists):
+def fetch_candidate_ids(new_tourist):
+    """Streams id batches of tourists heading to the same place on overlapping dates."""
+    return get_tourist_store().iter_candidate_ids(new_tourist)
+
+def calculate_similarity(new_tourist, candidate_id_batches):
     """Computes cosine similarity between tourists based on travel preferences."""
-    tourists.append(new_tourist)  # Add the new tourist for comparison
-
-    # Create feature text for TF-IDF vectorization using purposeofvisit
-    feature_texts = [
-        f"{t.get('placetovisit', '')} {t.get('currentstay', '')} {t.get('date', '')} {t.get('purposeofvisit', '')}"
-        for t in tourists
-    ]
-
-    # Compute TF-IDF vectors & similarity matrix
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(feature_texts)
-    similarity_matrix = cosine_similarity(tfidf_matrix)
-
-    # Get similarity scores for the last added tourist
-    last_index = len(tourists) - 1
-    similarity_scores = similarity_matrix[last_index][:-1]  # Exclude self-comparison
-
-    # Find best match
-    if similarity_scores.size > 0:
-        best_match_index = np.argmax(similarity_scores)
-        best_match = tourists[best_match_index]
-        best_match_score = similarity_scores[best_match_index]
-    else:
-        best_match = None
-        best_match_score = 0
+    # Dense once here rather than converted per batch and segment
+    query_vector = vectorizer.transform([feature_text(new_tourist)]).toarray().ravel()
+    features = get_feature_store()
 
+    best_id = None
+    best_match_score = 0
+    for id_batch in candidate_id_batches:
+        tourist_id, score = features.best_match(query_vector, id_batch)
+        if tourist_id is not None and (best_id is None or score > best_match_score):
+            best_id, best_match_score = tourist_id, score
+
+    # Only the winning profile is decoded
+    best_match = get_tourist_store().get_profile(best_id) if best_id is not None else None
     return best_match, best_match_score
 
 def save_tourist(data):
-    """Saves new tourist data. (MongoDB logic removed)"""
-    pass
+    """Saves new tourist data to the profile store and its feature vector to the feature store."""
+    tourist_id = get_tourist_store().save(data)
+    get_feature_store().append([tourist_id], vectorizer.transform([feature_text(data)]))
+
+def rebuild_tourist_features(batch_size=10000):
+    """Backfills feature vectors for stored tourists that don't have one yet."""
+    features = get_feature_store()
+    known = set()
+    for seg in features.segments():
+        known.update(seg.ids.tolist())
+
+    ids, texts = [], []
+    for tourist_id, profile in get_tourist_store().iter_all():
+        if tourist_id in known:
+            continue
+        ids.append(tourist_id)
+        texts.append(feature_text(profile))
+        if len(ids) >= batch_size:
+            features.append(ids, vectorizer.transform(texts))
+            ids, texts = [], []
+    if ids:
+        features.append(ids, vectorizer.transform(texts))
 
 def match_tourists(new_tourist):
     """Matches the new tourist with the best similar existing tourist based on travel preferences."""
@@ -49,12 +66,13 @@ def match_tourists(new_tourist):
     if not all(field in new_tourist for field in required_fields):
         return {"error": "Missing required fields for matching"}, 400
 
-    # Fetch existing tourists for matching (MongoDB logic removed)
-    existing_tourists = fetch_all_tourists()
-
-    best_match, score = calculate_similarity(new_tourist, existing_tourists)
+    # Only tourists with the same destination and overlapping dates are scored
+    try:
+        candidates = fetch_candidate_ids(new_tourist)
+        best_match, score = calculate_similarity(new_tourist, candidates)
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-    # Save the new tourist data (MongoDB logic removed)
     save_tourist(new_tourist)
 
     if best_match:
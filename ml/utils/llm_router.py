@@ -0,0 +1,419 @@
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import dotenv
+import numpy as np
+import openai
+from groq import Groq
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from utils.metrics import provider_call, record_circuit_state, record_hedge, record_retry, record_tokens, token_counts
+from utils.tracing import bind, span
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_KEY_ENV = {"openai": "OPENAI_API_KEY", "groq": "GROQ_API_KEY", "gemini": "GEMINI_API_KEY"}
+
+# Providers the router may send work to; defaults to every provider with an API key set
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "").split(",") if p.strip()] or [
+    provider for provider, key_env in API_KEY_ENV.items() if os.getenv(key_env)
+]
+
+# Gemini is reached through its OpenAI-compatible endpoint so every provider speaks one API
+GEMINI_OPENAI_BASE_URL = os.getenv("GEMINI_OPENAI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+# SDK-level retries per call; failing over to another provider is the router's job
+LLM_CLIENT_RETRIES = int(os.getenv("LLM_CLIENT_RETRIES", "1"))
+
+# Latency and error rates are computed over this rolling window
+STATS_WINDOW_S = float(os.getenv("LLM_STATS_WINDOW_S", "300"))
+STATS_MAX_SAMPLES = 200
+# Samples a model needs before its statistics are trusted; until then it is probed first
+MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "5"))
+
+# Hedged requests are capped at this share of all requests so a slow spell can't double the load
+HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "32"))
+
+MODELS = [
+    {"name": "gpt-4o-mini", "provider": "openai", "capabilities": {"text", "json", "json_schema", "vision"}},
+    {"name": "gemini-2.0-flash", "provider": "gemini", "capabilities": {"text", "json", "vision"}},
+    {"name": "llama-3.3-70b-versatile", "provider": "groq", "capabilities": {"text", "json"}},
+    {"name": "llama-3.2-11b-vision-preview", "provider": "groq", "capabilities": {"vision"}},
+]
+
+# Task -> (capability it needs, model it used before routing; preferred while statistics are thin)
+TASKS = {
+    "itinerary": ("json", "gpt-4o-mini"),
+    "chat": ("text", "gpt-4o-mini"),
+    "process_itinerary": ("text", "gemini-2.0-flash"),
+    "detect_waste": ("vision", "llama-3.2-11b-vision-preview"),
+}
+
+# usage: (prompt tokens, completion tokens), either None when the provider doesn't report it
+Completion = namedtuple("Completion", ["text", "model", "provider", "usage"])
+
+
+class RouterError(Exception):
+    pass
+
+
+def create_client(provider):
+    options = {"timeout": LLM_TIMEOUT_S, "max_retries": LLM_CLIENT_RETRIES}
+    if provider == "groq":
+        return Groq(api_key=os.getenv("GROQ_API_KEY"), **options)
+    if provider == "gemini":
+        return openai.OpenAI(api_key=os.getenv("GEMINI_API_KEY"), base_url=GEMINI_OPENAI_BASE_URL, **options)
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), **options)
+
+
+class ModelStats:
+    """Rolling latency and outcome samples of one model."""
+
+    def __init__(self, window=STATS_WINDOW_S, max_samples=STATS_MAX_SAMPLES, clock=time.monotonic):
+        self.window = window
+        self.samples = deque(maxlen=max_samples)
+        self.clock = clock
+
+    def add(self, latency, ok):
+        self.samples.append((self.clock(), latency, ok))
+
+    def summary(self):
+        cutoff = self.clock() - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        latencies = [latency for _, latency, ok in self.samples if ok]
+        failures = len(self.samples) - len(latencies)
+        return {
+            "samples": len(self.samples),
+            "error_rate": failures / len(self.samples) if self.samples else 0.0,
+            "p50": float(np.percentile(latencies, 50)) if latencies else None,
+            "p95": float(np.percentile(latencies, 95)) if latencies else None,
+        }
+
+
+class CircuitBreaker:
+    """Opens after repeated failures; once the cooldown passes a single trial call decides whether to close."""
+
+    def __init__(self, failures=BREAKER_FAILURES, error_rate=BREAKER_ERROR_RATE, cooldown=BREAKER_COOLDOWN_S):
+        self.failures = failures
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+
+    def available(self, now):
+        if self.state == "open":
+            return now - self.opened_at >= self.cooldown
+        if self.state == "half_open":
+            return not self.trial_running
+        return True
+
+    def acquire(self, now):
+        """Claims a call slot; an open breaker past its cooldown lets exactly one trial call through."""
+        if not self.available(now):
+            return False
+        if self.state != "closed":
+            self.state = "half_open"
+            self.trial_running = True
+        return True
+
+    def release(self):
+        """Gives back a trial slot whose call was cancelled before it ran."""
+        if self.state == "half_open":
+            self.trial_running = False
+
+    def record(self, ok, summary, now):
+        if ok:
+            self.consecutive_failures = 0
+            if self.state == "half_open":
+                self.state = "closed"
+                self.trial_running = False
+            return
+        self.consecutive_failures += 1
+        too_many_errors = summary["samples"] >= MIN_SAMPLES and summary["error_rate"] >= self.error_rate
+        if self.state == "half_open" or self.consecutive_failures >= self.failures or too_many_errors:
+            self.state = "open"
+            self.opened_at = now
+            self.trial_running = False
+
+
+def expected_latency(summary):
+    """Median latency inflated by the error rate, i.e. the expected wait for a good answer.
+
+    Models still short of MIN_SAMPLES score 0 so they get probed first.
+    """
+    if summary["samples"] < MIN_SAMPLES or summary["p50"] is None:
+        return 0.0
+    return summary["p50"] / max(1.0 - summary["error_rate"], 0.05)
+
+
+class LLMRouter:
+    """Sends each task to the fastest healthy model that can do it.
+
+    Every call feeds per-model rolling statistics and a circuit breaker.
+    When the chosen model runs past its own p95, a duplicate request goes to
+    the next-best model (on another provider when possible) and whichever
+    answers first wins. Failed calls fail over to the next candidate.
+
+    `clock` times calls, breaker cooldowns and the statistics window, and
+    `client_factory` builds a provider's client; tests swap in fakes.
+    """
+
+    def __init__(self, providers=None, models=MODELS, tasks=TASKS, workers=ROUTER_WORKERS, clock=time.monotonic,
+                 client_factory=create_client):
+        providers = LLM_PROVIDERS if providers is None else providers
+        self.models = {model["name"]: model for model in models if model["provider"] in providers}
+        self.tasks = tasks
+        self._clock = clock
+        self._client_factory = client_factory
+        self._stats = {name: ModelStats(clock=clock) for name in self.models}
+        self._breakers = {name: CircuitBreaker() for name in self.models}
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-router")
+
+    def client(self, provider):
+        with self._clients_lock:
+            if provider not in self._clients:
+                self._clients[provider] = self._client_factory(provider)
+            return self._clients[provider]
+
+    def candidates(self, task, models=None):
+        """Healthy models able to run `task`, fastest first; only those in `models` when given."""
+        capability, preferred = self.tasks[task]
+        names = [name for name, model in self.models.items()
+                 if capability in model["capabilities"] and (models is None or name in models)]
+        names.sort(key=lambda name: name != preferred)
+        now = self._clock()
+        ranked = []
+        with self._lock:
+            for position, name in enumerate(names):
+                if self._breakers[name].available(now):
+                    ranked.append((expected_latency(self._stats[name].summary()), position, name))
+        return [name for _, _, name in sorted(ranked)]
+
+    def hedge_delay(self, name):
+        with self._lock:
+            summary = self._stats[name].summary()
+        return summary["p95"] if summary["samples"] >= MIN_SAMPLES else None
+
+    def status(self):
+        with self._lock:
+            return {
+                name: dict(self._stats[name].summary(), provider=self.models[name]["provider"],
+                           state=self._breakers[name].state)
+                for name in self.models
+            }
+
+    def complete(self, task, messages, operation, response_format=None, models=None, **options):
+        """Runs one chat completion for `task` and returns a Completion from whichever model answered.
+
+        `models` restricts routing, failover and hedging to those models.
+        """
+        with span("model"):
+            return self._complete(task, messages, operation, response_format, models, options)
+
+    def _complete(self, task, messages, operation, response_format, models, options):
+        queue = self.candidates(task, models)
+        if not queue:
+            raise RouterError(f"No healthy model available for {task}")
+        with self._lock:
+            self._requests += 1
+
+        pending = {}
+        # Set once the caller has its answer; hedges that haven't reached the provider by then don't
+        settled = threading.Event()
+
+        def launch(avoid_provider=None):
+            queue.sort(key=lambda name: self.models[name]["provider"] == avoid_provider)
+            while queue:
+                name = queue.pop(0)
+                with self._lock:
+                    breaker = self._breakers[name]
+                    acquired = breaker.acquire(self._clock())
+                    state = breaker.state
+                record_circuit_state(self.models[name]["provider"], name, state)
+                if acquired:
+                    pending[self._pool.submit(bind(self._call), name, messages, operation, response_format, options,
+                                              settled)] = name
+                    return name
+            return None
+
+        try:
+            return self._await(task, operation, queue, pending, launch)
+        finally:
+            # Losing hedges still queued are dropped; one already on the wire runs out in the pool
+            settled.set()
+            for future, name in pending.items():
+                if future.cancel():
+                    self._release(name)
+
+    def _await(self, task, operation, queue, pending, launch):
+        """Waits for the first good answer, hedging a slow call and failing over a failed one."""
+        current = launch()
+        started = self._clock()
+        hedge_after = self.hedge_delay(current) if current else None
+        hedged = False
+        error = None
+        while pending:
+            timeout = None
+            if not hedged and queue and hedge_after is not None:
+                timeout = max(0.0, started + hedge_after - self._clock())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                hedged = True
+                if self._allow_hedge():
+                    hedge = launch(avoid_provider=self.models[current]["provider"])
+                    if hedge:
+                        record_hedge(self.models[hedge]["provider"], operation)
+                        logger.info("Hedging %s: %s slower than %.2fs, also asking %s", task, current, hedge_after, hedge)
+                continue
+
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+                    logger.warning("%s failed on %s: %s", task, name, e)
+
+            if not pending and queue:
+                record_retry(self.models[name]["provider"], operation)
+                current = launch()
+                started = self._clock()
+                hedge_after = self.hedge_delay(current) if current else None
+
+        if error is None:
+            raise RouterError(f"No healthy model available for {task}")
+        raise RouterError(f"All models failed for {task}: {error}") from error
+
+    def _allow_hedge(self):
+        with self._lock:
+            if self._hedges < HEDGE_MAX_RATIO * self._requests:
+                self._hedges += 1
+                return True
+            return False
+
+    def _call(self, name, messages, operation, response_format, options, settled=None):
+        if settled is not None and settled.is_set():
+            # Dequeued just as the request was answered elsewhere
+            self._release(name)
+            raise RouterError(f"{name} call dropped, request already answered")
+        model = self.models[name]
+        provider = model["provider"]
+        request = dict(options)
+        if response_format:
+            if response_format.get("type") == "json_schema" and "json_schema" not in model["capabilities"]:
+                # Output is validated and repaired locally anyway, so plain JSON mode is a safe fallback
+                response_format = {"type": "json_object"}
+            request["response_format"] = response_format
+
+        start = self._clock()
+        try:
+            with provider_call(provider, operation):
+                response = self.client(provider).chat.completions.create(model=name, messages=messages, **request)
+            content = response.choices[0].message.content
+            if content is None:
+                raise RouterError(f"{name} returned an empty response")
+        except Exception:
+            self._record(name, None, False)
+            raise
+        self._record(name, self._clock() - start, True)
+        usage = token_counts(response)
+        record_tokens(provider, operation, *usage)
+        return Completion(content, name, provider, usage)
+
+    def _release(self, name):
+        with self._lock:
+            breaker = self._breakers[name]
+            breaker.release()
+            state = breaker.state
+        record_circuit_state(self.models[name]["provider"], name, state)
+
+    def _record(self, name, latency, ok):
+        with self._lock:
+            stats = self._stats[name]
+            stats.add(latency, ok)
+            breaker = self._breakers[name]
+            breaker.record(ok, stats.summary(), self._clock())
+            state = breaker.state
+        record_circuit_state(self.models[name]["provider"], name, state)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide LLMRouter over the configured providers."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = LLMRouter()
+    return _router
+
+
+MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+class RouterChatModel(BaseChatModel):
+    """LangChain chat model backed by the router, for chains that need a LangChain LLM.
+
+    With pin_model the first call is routed as usual and every later call on
+    this instance goes to the model that answered it, so a multi-step chain
+    doesn't switch provider or model halfway through.
+    """
+
+    task: str
+    operation: str
+    temperature: float | None = None
+    pin_model: bool = False
+    pinned_model: str | None = None
+
+    @property
+    def _llm_type(self):
+        return "llm-router"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        options = {"temperature": self.temperature} if self.temperature is not None else {}
+        if stop:
+            options["stop"] = stop
+        completion = get_router().complete(
+            self.task,
+            [{"role": MESSAGE_ROLES.get(message.type, "user"), "content": message.content} for message in messages],
+            self.operation,
+            models=[self.pinned_model] if self.pinned_model else None,
+            **options
+        )
+        if self.pin_model:
+            self.pinned_model = completion.model
+        message = AIMessage(content=completion.text, response_metadata={"model_name": completion.model})
+        prompt_tokens, completion_tokens = completion.usage
+        if prompt_tokens is not None and completion_tokens is not None:
+            # Lets LangChain callbacks count the chain's tokens too; the metric is recorded by the router
+            message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                                      "total_tokens": prompt_tokens + completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"model_name": completion.model, "provider": completion.provider})
@@ -0,0 +1,225 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets (seconds) sized for model calls, which run from ~100 ms to tens of seconds
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latency of HTTP requests by route.",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+
+PROVIDER_CALL_SECONDS = Histogram(
+    "provider_call_duration_seconds",
+    "Latency of calls to external providers (model APIs, Telegram, Google Places, Nominatim).",
+    ["provider", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+PROVIDER_TOKENS = Counter(
+    "provider_tokens_total",
+    "Tokens consumed by model calls.",
+    ["provider", "operation", "kind"],
+)
+PROVIDER_RETRIES = Counter(
+    "provider_retries_total",
+    "Retried provider calls.",
+    ["provider", "operation"],
+)
+PROVIDER_CACHE_LOOKUPS = Counter(
+    "provider_cache_lookups_total",
+    "Cache lookups in front of provider calls; hit ratio = hit / (hit + miss).",
+    ["provider", "result"],
+)
+PROVIDER_HEDGES = Counter(
+    "provider_hedged_requests_total",
+    "Duplicate requests sent to a second model because the first was slower than its p95.",
+    ["provider", "operation"],
+)
+MODEL_CIRCUIT_STATE = Gauge(
+    "model_circuit_state",
+    "Circuit breaker state per model: 0 closed, 1 half-open, 2 open.",
+    ["provider", "model"],
+    multiprocess_mode="max",
+)
+
+ADMISSION_SHED = Counter(
+    "admission_shed_requests_total",
+    "Requests turned away by admission control: queue_full (429), overloaded or timed_out (503), evicted (503).",
+    ["route", "reason"],
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued_requests",
+    "Requests waiting for a model slot.",
+    ["route"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Time admitted requests spent queued for a model slot.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+ROUTE_STORE_DROPPED = Counter(
+    "route_store_dropped_documents_total",
+    "Route documents never written: overflow (buffer full while Mongo is unreachable) or rejected (write errors).",
+    ["reason"],
+)
+
+CROWD_SCHEDULE_DAYS = Counter(
+    "crowd_schedule_days_total",
+    "Itinerary days re-timed by the crowd scheduler: scheduled, relaxed (meals moved freely) or unfit (left as is).",
+    ["result"],
+)
+
+REQUEST_STAGE_SECONDS = Histogram(
+    "request_stage_duration_seconds",
+    "Time each request spent in a traced stage (upload, parse_document, prompt, model...), summed over its calls.",
+    ["route", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def record_tokens(provider, operation, prompt_tokens=None, completion_tokens=None):
+    if prompt_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "completion").inc(completion_tokens)
+
+
+def token_counts(response):
+    """(prompt, completion) tokens of an OpenAI/Groq-style response or a LangChain message; None when not reported."""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens"), usage.get("output_tokens")
+    return None, None
+
+
+def record_retry(provider, operation):
+    PROVIDER_RETRIES.labels(provider, operation).inc()
+
+
+def record_cache(provider, hit):
+    PROVIDER_CACHE_LOOKUPS.labels(provider, "hit" if hit else "miss").inc()
+
+
+def record_hedge(provider, operation):
+    PROVIDER_HEDGES.labels(provider, operation).inc()
+
+
+def record_circuit_state(provider, model, state):
+    MODEL_CIRCUIT_STATE.labels(provider, model).set({"closed": 0, "half_open": 1, "open": 2}[state])
+
+
+def record_shed(route, reason):
+    ADMISSION_SHED.labels(route, reason).inc()
+
+
+def record_queued(route, delta):
+    ADMISSION_QUEUED.labels(route).inc(delta)
+
+
+def record_admission_wait(route, seconds):
+    ADMISSION_WAIT_SECONDS.labels(route).observe(seconds)
+
+
+def record_route_drop(reason, count=1):
+    ROUTE_STORE_DROPPED.labels(reason).inc(count)
+
+
+def record_schedule(result):
+    CROWD_SCHEDULE_DAYS.labels(result).inc()
+
+
+@lru_cache(maxsize=None)
+def _stage_histogram(route, stage):
+    # Recorded for every stage of every request; routes and stage names are both fixed sets
+    return REQUEST_STAGE_SECONDS.labels(route, stage)
+
+
+def record_stage(route, stage, seconds):
+    _stage_histogram(route, stage).observe(seconds)
+
+
+class ProviderCall:
+    """Handle yielded by provider_call, for failures that come back as a response instead of an exception."""
+
+    def __init__(self):
+        self.failed = False
+
+    def check_status(self, response):
+        """Counts a non-2xx HTTP response as an error; returns the response."""
+        if not 200 <= response.status_code < 300:
+            self.failed = True
+        return response
+
+
+@contextmanager
+def provider_call(provider, operation):
+    """Times one call to an external provider and records whether it raised or was flagged as failed."""
+    start = time.perf_counter()
+    call = ProviderCall()
+    outcome = "error"
+    try:
+        yield call
+        if not call.failed:
+            outcome = "ok"
+    finally:
+        PROVIDER_CALL_SECONDS.labels(provider, operation, outcome).observe(time.perf_counter() - start)
+
+
+def init_app(app):
+    """Adds request latency/in-flight tracking and a /metrics endpoint to a Flask app."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.metrics_start = time.perf_counter()
+        HTTP_IN_FLIGHT.labels(g.metrics_route).inc()
+
+    @app.after_request
+    def _record_request(response):
+        if "metrics_start" in g:
+            HTTP_REQUEST_SECONDS.labels(request.method, g.metrics_route, response.status_code).observe(
+                time.perf_counter() - g.metrics_start
+            )
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        if "metrics_route" in g:
+            HTTP_IN_FLIGHT.labels(g.metrics_route).dec()
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        # Under a pre-fork server each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            from prometheus_client import REGISTRY as registry
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -1,21 +1,14 @@
 from dotenv import load_dotenv
 from langchain.document_loaders import Docx2txtLoader, PyPDFLoader
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains.summarize import load_summarize_chain
 from langchain.prompts import PromptTemplate
 from langchain.text_splitter import CharacterTextSplitter
-from pydantic import SecretStr
-import os
+from utils.llm_router import RouterChatModel
+from utils.tracing import span
 import json
 
 load_dotenv()
 
-# Convert the API key to SecretStr when getting it from environment
-api_key = os.getenv('GEMINI_API_KEY')
-if api_key is None:
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
-gemini_api_key = SecretStr(api_key)
-
 def process_docx(docx_file_path):
     loader = Docx2txtLoader(docx_file_path)
     text = loader.load_and_split()
@@ -46,19 +39,17 @@ def process_cv(file_path):
     print(f"File Path: {file_path}")
     print(f"File Type: {file_extension}")
 
-    if file_extension == "docx":
-        text = process_docx(file_path)
-    elif file_extension == "pdf":
-        text = process_pdf(file_path)
-    else:
-        raise ValueError("Unsupported file format. Please provide a .docx or .pdf file.")
+    with span("parse_document"):
+        if file_extension == "docx":
+            text = process_docx(file_path)
+        elif file_extension == "pdf":
+            text = process_pdf(file_path)
+        else:
+            raise ValueError("Unsupported file format. Please provide a .docx or .pdf file.")
 
-    # Initialize Gemini LLM with SecretStr api_key
-    llm = ChatGoogleGenerativeAI(
-        temperature=0,
-        model="gemini-2.0-flash",
-        api_key=gemini_api_key
-    )
+    # The first step goes to the fastest healthy model (Gemini until others prove faster);
+    # the refine steps stay on that model so the answer isn't rewritten by another one midway
+    llm = RouterChatModel(task="process_itinerary", operation="process_itinerary", temperature=0, pin_model=True)
 
     prompt_template = """You have been given a Itinerary to analyse.
     Extract the following information in a structured format:
@@ -86,24 +77,25 @@ def process_cv(file_path):
     )
     refine_prompt = PromptTemplate.from_template(refine_template)
 
-    chain = load_summarize_chain(
-        llm=llm,
-        chain_type="refine",
-        question_prompt=prompt,
-        refine_prompt=refine_prompt,
-        return_intermediate_steps=True,
-        input_key="input_documents",
-        output_key="output_text",
-    )
-
-    result = chain({"input_documents": text}, return_only_outputs=True)
+    with span("prompt"):
+        chain = load_summarize_chain(
+            llm=llm,
+            chain_type="refine",
+            question_prompt=prompt,
+            refine_prompt=refine_prompt,
+            return_intermediate_steps=True,
+            input_key="input_documents",
+            output_key="output_text",
+        )
+
+    # One model call per chunk; each shows up as a "model" span inside this one
+    with span("refine_chain"):
+        result = chain({"input_documents": text}, return_only_outputs=True)
 
     # Parse the output text as JSON
     try:
-        json_output = json.loads(result['output_text'])
-        print("\nItinerary Details (JSON):")
-        print(json.dumps(json_output, indent=4))
-        return json_output
+        with span("parse_json"):
+            return json.loads(result['output_text'])
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON: {e}")
         print("Raw output:", result['output_text'])
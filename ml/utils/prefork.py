@@ -0,0 +1,79 @@
+import gc
+import logging
+import os
+import sys
+
+import dotenv
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Import the app and load the models once in the pre-fork master; workers share those pages copy-on-write
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+# Keep the collector from writing to the master's objects: no collections in the master, frozen heap in workers
+GC_FREEZE = os.getenv("GC_FREEZE", "true").lower() == "true"
+# Allocations between young-generation collections in workers (CPython's default is 700)
+WORKER_GC_THRESHOLD = int(os.getenv("WORKER_GC_THRESHOLD", "50000"))
+# torch intra-op threads per worker; N workers each using every core oversubscribe the CPU
+WORKER_TORCH_THREADS = int(os.getenv("WORKER_TORCH_THREADS", "1"))
+
+# smaps_rollup fields reported by memory_usage, in kB
+MEMORY_FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+                 "Private_Clean": "private", "Private_Dirty": "private"}
+
+
+def prepare_master():
+    """Call before importing the app: with collection off, freed objects don't leave holes workers would fill."""
+    if GC_FREEZE:
+        gc.disable()
+
+
+def preload_models():
+    """Loads the read-only model state the workers will share."""
+    from utils.crowd_scheduler import load_crowd_curves
+    from utils.review_analytics import get_review_store
+    from utils.sentiment_multilingual import get_sentiment_model
+
+    load_crowd_curves()
+    get_review_store().hotel_stats()
+    try:
+        # Weights only: running inference here would start torch's thread pool, which doesn't survive fork
+        get_sentiment_model()
+    except Exception as e:
+        logger.warning("Sentiment model not preloaded, workers will load it on first use: %s", e)
+
+
+def before_fork():
+    """Moves everything the master allocated into the permanent generation, which collections never visit."""
+    if GC_FREEZE:
+        gc.freeze()
+
+
+def after_fork():
+    gc.enable()
+    if GC_FREEZE:
+        gc.set_threshold(WORKER_GC_THRESHOLD, *gc.get_threshold()[1:])
+    # Only if the master loaded it; importing torch here would undo the point
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(WORKER_TORCH_THREADS)
+
+
+def memory_usage(pid="self"):
+    """RSS, PSS, shared and private memory of a process in bytes (Linux only; None elsewhere).
+
+    PSS splits each shared page between the processes mapping it, so summing
+    it over the workers gives their real footprint; summing RSS counts shared
+    pages once per worker.
+    """
+    usage = {"rss": 0, "pss": 0, "shared": 0, "private": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                field, _, value = line.partition(":")
+                if field in MEMORY_FIELDS:
+                    usage[MEMORY_FIELDS[field]] += int(value.split()[0]) * 1024
+    except OSError:
+        return None
+    return usage
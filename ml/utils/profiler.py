@@ -0,0 +1,324 @@
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+import dotenv
+
+from utils.tracing import current_trace
+
+dotenv.load_dotenv()
+
+# Shared by the app's workers: the control file that switches profiling on, and the stack dumps.
+# Private to the app's user, since whoever can write the control file can start profiling.
+PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+# Bearer token for the /admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Time between stack samples of each profiled thread
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+# Workers look for a new profiling window at most this often, on their next request
+PROFILE_POLL_S = 1.0
+PROFILE_MAX_SECONDS = 600
+
+CONTROL_FILE = "control.json"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{4}$")
+
+
+def has_admin_token(headers):
+    """Whether the request's Authorization header carries ADMIN_TOKEN; never while it is unset."""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = headers.get("Authorization", "").removeprefix("Bearer ")
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+
+def frame_label(code, roots):
+    """py-spy style frame name: `qualname (path:first line)`, the path relative to its import root."""
+    path = code.co_filename
+    for root in roots:
+        if path.startswith(root):
+            path = path[len(root):]
+            break
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads serving selected requests and writes them as folded stacks.
+
+    Profiling is switched on for a window by writing PROFILE_DIR/control.json;
+    each worker process notices on its next request (within PROFILE_POLL_S),
+    starts a sampler thread, picks `sample_rate` of its requests and, when the
+    window closes, writes PROFILE_DIR/<id>-<pid>.folded. Lines are
+    `frame;frame;...;frame count`, the input flamegraph.pl, inferno and
+    speedscope take. While off, the only cost is a clock read per request.
+    """
+
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.profile_id = None
+        self.until = 0.0
+        self.sample_rate = 1.0
+        self.interval = PROFILE_INTERVAL_MS / 1000
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._labels = {}
+        self._next_poll = 0.0
+        self._control_mtime = None
+
+    @property
+    def control_path(self):
+        return os.path.join(self.directory, CONTROL_FILE)
+
+    def dump_path(self, profile_id, pid):
+        return os.path.join(self.directory, f"{profile_id}-{pid}.folded")
+
+    # Admin side: any worker can switch profiling on or off for all of them
+
+    def request_window(self, seconds, sample_rate, interval_ms):
+        control = {
+            "id": f"{time.strftime('%Y%m%d-%H%M%S')}-{random.getrandbits(16):04x}",
+            "until": time.time() + seconds,
+            "sample_rate": sample_rate,
+            "interval_ms": interval_ms,
+        }
+        self._write_control(control)
+        return control
+
+    def stop_window(self):
+        control = self.read_control()
+        if control is None or control["until"] <= time.time():
+            return None
+        control["until"] = time.time()
+        self._write_control(control)
+        return control
+
+    def read_control(self):
+        try:
+            with open(self.control_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _make_directory(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        # Tightens a directory made before, or by hand; fails if another user owns it
+        os.chmod(self.directory, 0o700)
+
+    def _write_control(self, control):
+        self._make_directory()
+        tmp_path = f"{self.control_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(control, f)
+        os.replace(tmp_path, self.control_path)
+        # Let this worker pick it up on its very next request
+        self._next_poll = 0.0
+
+    def profiles(self):
+        """{profile id: number of worker dumps} for the dumps on disk."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return {}
+        return dict(Counter(name.rsplit("-", 1)[0] for name in names if name.endswith(".folded")))
+
+    def merged_profile(self, profile_id):
+        """All workers' stacks for one window, summed, as folded text; None if there are none."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return None
+        counts = Counter()
+        prefix = f"{profile_id}-"
+        for name in names:
+            if not (name.startswith(prefix) and name.endswith(".folded")):
+                continue
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if stack:
+                        counts[stack] += int(count)
+        if not counts:
+            return None
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    # Worker side
+
+    def poll(self):
+        """Starts or stops this worker's sampler to match the control file. Cheap when nothing changed."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + PROFILE_POLL_S
+            try:
+                stat = os.stat(self.control_path)
+            except OSError:
+                return
+            # Only a control file this user wrote can switch profiling on
+            if stat.st_uid != os.getuid() or stat.st_mtime_ns == self._control_mtime:
+                return
+            self._control_mtime = stat.st_mtime_ns
+            control = self.read_control()
+            if control is None:
+                return
+            if control["id"] == self.profile_id:
+                self.until = control["until"]
+            elif control["until"] > time.time():
+                # A sampler still running for an earlier window sees the new id and finishes
+                self.profile_id = control["id"]
+                self.until = control["until"]
+                self.sample_rate = control["sample_rate"]
+                self.interval = control["interval_ms"] / 1000
+                threading.Thread(target=self._run, args=(self.profile_id,), name="sampling-profiler",
+                                 daemon=True).start()
+        finally:
+            self._lock.release()
+
+    @property
+    def active(self):
+        return self.until > time.time()
+
+    def watch(self, threads):
+        with self._lock:
+            self._watched[id(threads)] = threads
+
+    def unwatch(self, threads):
+        with self._lock:
+            self._watched.pop(id(threads), None)
+
+    def _fold(self, frame, roots):
+        labels = self._labels
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = frame_label(code, roots)
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return ";".join(stack)
+
+    def _run(self, profile_id):
+        counts = Counter()
+        own = threading.get_ident()
+        # Longest first, so site-packages wins over the standard library directory above it
+        roots = sorted({os.path.join(os.path.abspath(p), "") for p in sys.path + [os.getcwd()]},
+                       key=len, reverse=True)
+        while self.profile_id == profile_id and time.time() < self.until:
+            time.sleep(self.interval)
+            # Picks up an early stop even if this worker gets no more requests
+            self.poll()
+            with self._lock:
+                watched = set().union(*self._watched.values())
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for ident in watched:
+                frame = frames.get(ident)
+                if frame is not None and ident != own:
+                    counts[self._fold(frame, roots)] += 1
+            del frames
+        self._write_dump(profile_id, counts)
+
+    def _write_dump(self, profile_id, counts):
+        path = self.dump_path(profile_id, os.getpid())
+        tmp_path = f"{path}.tmp"
+        try:
+            self._make_directory()
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing profile {path}: {e}")
+
+
+def init_app(app, profiler=None):
+    """Adds the profiling hooks and the /admin/profiler endpoints; returns the profiler."""
+    from flask import Response, g, jsonify, request
+
+    profiler = profiler or SamplingProfiler()
+
+    @app.before_request
+    def _select_for_profile():
+        profiler.poll()
+        if not profiler.until or not profiler.active or random.random() >= profiler.sample_rate:
+            return
+        trace = current_trace()
+        # Without tracing only the request's own thread is followed, not the pools it hands work to
+        g.profile_threads = trace.threads if trace else {threading.get_ident()}
+        profiler.watch(g.profile_threads)
+
+    @app.teardown_request
+    def _release_from_profile(exc):
+        threads = g.pop("profile_threads", None)
+        if threads is not None:
+            profiler.unwatch(threads)
+
+    def forbidden():
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled; set ADMIN_TOKEN"}), 403
+        if not has_admin_token(request.headers):
+            return jsonify({"error": "Invalid admin token"}), 403
+        return None
+
+    @app.route("/admin/profiler", methods=["GET"])
+    def profiler_status():
+        if denied := forbidden():
+            return denied
+        control = profiler.read_control()
+        running = control if control and control["until"] > time.time() else None
+        return jsonify({"running": running, "profiles": profiler.profiles()})
+
+    @app.route("/admin/profiler", methods=["POST"])
+    def start_profiler():
+        """Profiles `sample_rate` of requests on every worker for `seconds`."""
+        if denied := forbidden():
+            return denied
+        data = request.get_json(silent=True) or {}
+        try:
+            seconds = float(data.get("seconds", 60))
+            sample_rate = float(data.get("sample_rate", 1.0))
+            interval_ms = float(data.get("interval_ms", PROFILE_INTERVAL_MS))
+        except (TypeError, ValueError):
+            return jsonify({"error": "seconds, sample_rate and interval_ms must be numbers"}), 400
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            return jsonify({"error": f"seconds must be between 0 and {PROFILE_MAX_SECONDS}"}), 400
+        if not 0 < sample_rate <= 1:
+            return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+        if not 1 <= interval_ms <= 1000:
+            return jsonify({"error": "interval_ms must be between 1 and 1000"}), 400
+        control = profiler.request_window(seconds, sample_rate, interval_ms)
+        control["profile_url"] = f"/admin/profiler/{control['id']}"
+        return jsonify(control), 202
+
+    @app.route("/admin/profiler", methods=["DELETE"])
+    def stop_profiler():
+        if denied := forbidden():
+            return denied
+        control = profiler.stop_window()
+        if control is None:
+            return jsonify({"error": "No profile is running"}), 404
+        return jsonify(control)
+
+    @app.route("/admin/profiler/<profile_id>", methods=["GET"])
+    def download_profile(profile_id):
+        """The window's folded stacks, summed over workers that have finished it."""
+        if denied := forbidden():
+            return denied
+        folded = profiler.merged_profile(profile_id)
+        if folded is None:
+            return jsonify({"error": "Unknown profile, or no worker has written it yet"}), 404
+        return Response(folded, mimetype="text/plain",
+                        headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
+
+    return profiler
@@ -0,0 +1,129 @@
+import os
+import zlib
+
+import brotli
+import dotenv
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+dotenv.load_dotenv()
+
+# Bodies smaller than this go out uncompressed; the headers would eat most of the saving
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Bodies at least this big are compressed and sent chunk by chunk instead of in one piece
+COMPRESS_STREAM_BYTES = int(os.getenv("COMPRESS_STREAM_BYTES", "262144"))
+STREAM_CHUNK_BYTES = 64 * 1024
+# Fast settings for responses generated per request; the top levels cost several times the CPU for a few % less
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/javascript", "image/svg+xml"}
+# Preferred first when the client accepts both equally
+ENCODINGS = ["br", "gzip"]
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, for jsonify and request.get_json alike.
+
+    Output is compact UTF-8 with keys in insertion order. Types orjson
+    doesn't handle itself (dates, UUIDs, Markup...) go through Flask's
+    default, so they serialize as before.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # Formatting options (indent, separators...) only the standard library understands
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dump_bytes(obj).decode("utf-8")
+
+    def dump_bytes(self, obj, pretty=False):
+        return orjson.dumps(obj, default=self.default,
+                            option=ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if pretty else 0))
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dump_bytes(obj, pretty) + b"\n", mimetype=self.mimetype)
+
+
+def compressor(encoding):
+    """(compress, flush) callables for one response body."""
+    if encoding == "br":
+        stream = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        return stream.process, stream.finish
+    # wbits 31: zlib with a gzip header and trailer
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return stream.compress, stream.flush
+
+
+def compress_chunks(body, encoding, chunk_bytes=STREAM_CHUNK_BYTES):
+    compress, flush = compressor(encoding)
+    view = memoryview(body)
+    for start in range(0, len(view), chunk_bytes):
+        chunk = compress(view[start:start + chunk_bytes])
+        if chunk:
+            yield chunk
+    yield flush()
+
+
+def compressible(response):
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    mimetype = response.headers.get("Content-Type", "").partition(";")[0]
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def negotiate(request):
+    """The encoding to use from ENCODINGS, or None."""
+    header = request.headers.get("Accept-Encoding", "")
+    if not header:
+        return None
+    # Werkzeug's parser is only needed for q-values; plain lists are most clients
+    if ";" in header:
+        return request.accept_encodings.best_match(ENCODINGS)
+    offered = {token.strip() for token in header.split(",")}
+    return next((encoding for encoding in ENCODINGS if encoding in offered), "gzip" if "*" in offered else None)
+
+
+def init_app(app):
+    """Serializes JSON with orjson and compresses responses as the client's Accept-Encoding allows."""
+    from flask import request
+
+    app.json = OrjsonProvider(app)
+
+    @app.after_request
+    def _compress(response):
+        if not compressible(response):
+            return response
+        if "Vary" in response.headers:
+            response.vary.add("Accept-Encoding")
+        else:
+            response.headers["Vary"] = "Accept-Encoding"
+        encoding = negotiate(request)
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+
+        response.headers["Content-Encoding"] = encoding
+        if len(body) < COMPRESS_STREAM_BYTES:
+            compress, flush = compressor(encoding)
+            response.set_data(compress(body) + flush())
+        else:
+            # Chunked transfer: the first bytes leave before the rest is compressed,
+            # and no second full-size copy of the body is held
+            response.response = compress_chunks(body, encoding)
+            response.headers.pop("Content-Length", None)
+        return response
@@ -0,0 +1,350 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import dotenv
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+dotenv.load_dotenv()
+
+REVIEW_STORE_DIR = os.getenv("REVIEW_STORE_DIR", "data/review_store")
+# Corpora loaded into an empty store on first use, separated by ";"
+REVIEW_CORPORA = [p for p in os.getenv("REVIEW_CORPORA", "data/hotel_reviews_extended (1).csv").split(";") if p]
+
+# Share of a hotel's reviews that must praise its sustainability for it to count as eco
+ECO_MIN_SHARE = float(os.getenv("ECO_MIN_SHARE", "0.5"))
+ECO_PATTERN = (r"(?i)sustainab|eco-?friendly|solar|recycl|renewable|organic|biodegradable|"
+               r"plastic-free|waste management|green|energy")
+
+# Review sentiment scores run from -SENTIMENT_SCALE to SENTIMENT_SCALE
+SENTIMENT_SCALE = 10.0
+
+# Lower bounds (INR per night) of each price band
+PRICE_BANDS = [(0, "budget"), (5000, "mid-range"), (15000, "upscale"), (30000, "luxury")]
+
+MANIFEST = "manifest.json"
+
+REVIEW_SCHEMA = pa.schema([
+    ("hotel", pa.string()),
+    ("city", pa.string()),
+    ("review", pa.string()),
+    ("sentiment", pa.float64()),
+    ("price", pa.float64()),
+    ("eco", pa.bool_()),
+])
+
+# Per-hotel running totals; means are derived at read time so totals can be merged
+AGGREGATE_COLUMNS = [
+    ("reviews", "sum"),
+    ("sentiment_sum", "sum"),
+    ("priced", "sum"),
+    ("price_sum", "sum"),
+    ("price_min", "min"),
+    ("price_max", "max"),
+    ("eco_reviews", "sum"),
+]
+
+
+def normalize_city(city):
+    return " ".join(str(city).casefold().split())
+
+
+def value_score(mean_sentiment, mean_price):
+    """Sentiment, shifted to 0..1 so that a pricier hotel never scores higher, per 1000 INR of nightly price."""
+    satisfaction = np.clip((mean_sentiment + SENTIMENT_SCALE) / (2 * SENTIMENT_SCALE), 0.0, 1.0)
+    return satisfaction / (mean_price / 1000)
+
+
+def price_band(price):
+    bounds = [bound for bound, _ in PRICE_BANDS]
+    return PRICE_BANDS[max(int(np.searchsorted(bounds, price, side="right")) - 1, 0)][1]
+
+
+def reviews_from_csv(path):
+    """Reads a review corpus into REVIEW_SCHEMA, scoring sentiment with TextBlob when the file has none."""
+    table = pa_csv.read_csv(path)
+    name_column = "Hotel, City" if "Hotel, City" in table.column_names else "Place_Name_City"
+    names = table.column(name_column).to_pylist()
+    hotels, cities = zip(*[(name.rsplit(",", 1) + [""])[:2] for name in names]) if names else ((), ())
+    reviews = table.column("Review").cast(pa.string())
+
+    if "sentiment_score" in table.column_names:
+        sentiment = table.column("sentiment_score").cast(pa.float64())
+    else:
+        from textblob import TextBlob
+        # TextBlob polarity is -1..1; the bundled scores run roughly -10..10
+        sentiment = pa.array([TextBlob(text or "").sentiment.polarity * 10 for text in reviews.to_pylist()],
+                             pa.float64())
+
+    if "Price (INR per night)" in table.column_names:
+        price = table.column("Price (INR per night)").cast(pa.float64())
+    else:
+        price = pa.nulls(len(table), pa.float64())
+
+    return pa.table({
+        "hotel": pa.array([hotel.strip() for hotel in hotels], pa.string()),
+        "city": pa.array([city.strip() for city in cities], pa.string()),
+        "review": reviews,
+        "sentiment": sentiment,
+        "price": price,
+        "eco": pc.match_substring_regex(reviews, ECO_PATTERN),
+    }, schema=REVIEW_SCHEMA)
+
+
+def aggregate(table):
+    """Per-hotel totals of a review table, or of a concatenation of earlier totals."""
+    if "reviews" not in table.column_names:
+        priced = pc.is_valid(table["price"])
+        table = pa.table({
+            "hotel": table["hotel"],
+            "city": table["city"],
+            "reviews": pa.array(np.ones(len(table), dtype=np.int64)),
+            "sentiment_sum": table["sentiment"],
+            "priced": pc.cast(priced, pa.int64()),
+            "price_sum": pc.fill_null(table["price"], 0.0),
+            "price_min": table["price"],
+            "price_max": table["price"],
+            "eco_reviews": pc.cast(pc.and_(table["eco"], pc.greater(table["sentiment"], 0)), pa.int64()),
+        })
+    grouped = table.group_by(["hotel", "city"]).aggregate(AGGREGATE_COLUMNS)
+    # group_by names its outputs "<column>_<op>"
+    names = {f"{column}_{op}": column for column, op in AGGREGATE_COLUMNS}
+    grouped = grouped.rename_columns([names.get(name, name) for name in grouped.column_names])
+    return grouped.select(["hotel", "city"] + [column for column, _ in AGGREGATE_COLUMNS])
+
+
+def write_arrow(path, table):
+    """Uncompressed Arrow IPC, so readers can memory-map it without decoding."""
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_arrow(path):
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+class ReviewStore:
+    """Append-only columnar store of hotel reviews with incrementally maintained per-hotel totals.
+
+    Reviews land in immutable Arrow segments; each append folds its per-hotel
+    totals into a small aggregates file. Both are memory-mapped, so web
+    processes share one page-cache copy. The manifest is swapped atomically
+    under a file lock.
+    """
+
+    def __init__(self, root=REVIEW_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._read_lock = threading.Lock()
+        self._manifest_mtime = None
+        self._manifest = None
+        self._aggregates = None
+        self._stats = None
+        if not os.path.exists(os.path.join(root, MANIFEST)):
+            with self._locked():
+                if not os.path.exists(os.path.join(root, MANIFEST)):
+                    self._write_manifest({"segments": [], "aggregates": None, "sources": {}})
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        with open(os.path.join(self.root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = os.path.join(self.root, f".{MANIFEST}.{uuid.uuid4().hex[:8]}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST))
+
+    def append(self, reviews, source=None):
+        """Adds a REVIEW_SCHEMA table as a new segment and folds it into the totals; returns rows added.
+
+        `source` (e.g. a file hash) makes the append idempotent.
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            if source and source in manifest["sources"]:
+                return 0
+            if not len(reviews):
+                return 0
+
+            reviews = reviews.cast(REVIEW_SCHEMA)
+            totals = aggregate(reviews)
+            old_aggregates = manifest["aggregates"]
+            if old_aggregates:
+                totals = aggregate(pa.concat_tables([read_arrow(os.path.join(self.root, old_aggregates)), totals]))
+
+            segment = f"reviews-{uuid.uuid4().hex[:12]}.arrow"
+            write_arrow(os.path.join(self.root, segment), reviews)
+            aggregates = f"aggregates-{uuid.uuid4().hex[:12]}.arrow"
+            write_arrow(os.path.join(self.root, aggregates), totals)
+
+            manifest["segments"].append(segment)
+            manifest["aggregates"] = aggregates
+            if source:
+                manifest["sources"][source] = len(reviews)
+            self._write_manifest(manifest)
+            # Readers that already mapped the old file keep their mapping until they reload
+            if old_aggregates:
+                os.remove(os.path.join(self.root, old_aggregates))
+        return len(reviews)
+
+    def append_records(self, records):
+        """Adds reviews given as dicts with hotel, city, review, sentiment and optional price."""
+        reviews = pa.Table.from_pylist([
+            {"hotel": r["hotel"], "city": r["city"], "review": r["review"],
+             "sentiment": float(r["sentiment"]), "price": r.get("price")}
+            for r in records
+        ], schema=REVIEW_SCHEMA.remove(REVIEW_SCHEMA.get_field_index("eco")))
+        return self.append(reviews.append_column("eco", pc.match_substring_regex(reviews["review"], ECO_PATTERN)))
+
+    def ingest_csv(self, path):
+        """Loads a review corpus once; re-ingesting an unchanged file is a no-op."""
+        with open(path, "rb") as f:
+            source = hashlib.sha256(f.read()).hexdigest()
+        if source in self._read_manifest()["sources"]:
+            return 0
+        return self.append(reviews_from_csv(path), source=source)
+
+    def _refresh(self):
+        """Remaps the aggregates when another writer changed the manifest."""
+        with self._read_lock:
+            for _ in range(3):
+                mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+                if mtime == self._manifest_mtime:
+                    break
+                manifest = self._read_manifest()
+                try:
+                    aggregates = read_arrow(os.path.join(self.root, manifest["aggregates"])) \
+                        if manifest["aggregates"] else None
+                except FileNotFoundError:
+                    continue  # Replaced between reading the manifest and opening it
+                self._manifest, self._aggregates, self._stats = manifest, aggregates, None
+                self._manifest_mtime = mtime
+            return self._manifest, self._aggregates
+
+    def hotel_stats(self):
+        """Per-hotel means and shares as numpy columns, derived once per manifest version."""
+        _, aggregates = self._refresh()
+        with self._read_lock:
+            if self._stats is None and aggregates is not None:
+                reviews = aggregates["reviews"].to_numpy()
+                priced = aggregates["priced"].to_numpy()
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    mean_price = np.where(priced > 0, aggregates["price_sum"].to_numpy() / priced, np.nan)
+                self._stats = {
+                    "hotel": np.array(aggregates["hotel"].to_pylist(), dtype=object),
+                    "city": np.array(aggregates["city"].to_pylist(), dtype=object),
+                    "city_key": np.array([normalize_city(c) for c in aggregates["city"].to_pylist()], dtype=object),
+                    "reviews": reviews,
+                    "mean_sentiment": aggregates["sentiment_sum"].to_numpy() / reviews,
+                    "mean_price": mean_price,
+                    "price_min": aggregates["price_min"].to_numpy(zero_copy_only=False),
+                    "price_max": aggregates["price_max"].to_numpy(zero_copy_only=False),
+                    "eco_share": aggregates["eco_reviews"].to_numpy() / reviews,
+                }
+                # Row positions per city, so a query only touches that city's hotels
+                keys, inverse = np.unique(self._stats["city_key"].astype(str), return_inverse=True)
+                order = np.argsort(inverse, kind="stable")
+                bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+                self._stats["rows_by_city"] = {key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys)}
+            return self._stats
+
+    def city_stats(self, city=None):
+        """Review counts, mean sentiment and hotels per price band for each city (or one city)."""
+        stats = self.hotel_stats()
+        if not stats:
+            return []
+        rows_by_city = stats["rows_by_city"]
+        wanted = sorted(rows_by_city) if city is None else [normalize_city(city)]
+        result = []
+        for key in wanted:
+            mask = rows_by_city.get(key)
+            if mask is None:
+                continue
+            reviews = stats["reviews"][mask]
+            prices = stats["mean_price"][mask]
+            bands = {}
+            for price in prices[~np.isnan(prices)]:
+                band = price_band(price)
+                bands[band] = bands.get(band, 0) + 1
+            result.append({
+                "city": stats["city"][mask][0],
+                "hotels": len(mask),
+                "reviews": int(reviews.sum()),
+                "mean_sentiment": round(float((stats["mean_sentiment"][mask] * reviews).sum() / reviews.sum()), 3),
+                "eco_hotels": int((stats["eco_share"][mask] >= ECO_MIN_SHARE).sum()),
+                "price_bands": bands,
+            })
+        return result
+
+    def best_value_eco_hotels(self, city, max_price=None, limit=10, min_reviews=1):
+        """Eco hotels in `city` with stays reviewed at `max_price` a night or less, best value_score first."""
+        stats = self.hotel_stats()
+        if not stats:
+            return []
+        mean_price = stats["mean_price"]
+        rows = stats["rows_by_city"].get(normalize_city(city), np.empty(0, dtype=np.int64))
+        mask = (stats["reviews"][rows] >= min_reviews) & (stats["eco_share"][rows] >= ECO_MIN_SHARE)
+        mask &= ~np.isnan(mean_price[rows])
+        if max_price is not None:
+            # "Under Y" as on booking sites: a stay can be had for Y, even if the average one costs more
+            mask &= stats["price_min"][rows] <= max_price
+        rows = rows[mask]
+        value = value_score(stats["mean_sentiment"][rows], mean_price[rows])
+        top = rows[np.argsort(-value, kind="stable")[:limit]]
+        return [{
+            "hotel": stats["hotel"][i],
+            "city": stats["city"][i],
+            "reviews": int(stats["reviews"][i]),
+            "mean_sentiment": round(float(stats["mean_sentiment"][i]), 3),
+            "eco_share": round(float(stats["eco_share"][i]), 3),
+            "mean_price": round(float(mean_price[i])),
+            "price_range": [float(stats["price_min"][i]), float(stats["price_max"][i])],
+            "price_band": price_band(mean_price[i]),
+            "value_score": round(float(value_score(stats["mean_sentiment"][i], mean_price[i])), 4),
+        } for i in top]
+
+    def reviews(self, city=None, hotel=None):
+        """All stored reviews, optionally filtered, read from the memory-mapped segments."""
+        manifest, _ = self._refresh()
+        tables = [read_arrow(os.path.join(self.root, segment)) for segment in manifest["segments"]]
+        table = pa.concat_tables(tables) if tables else REVIEW_SCHEMA.empty_table()
+        if city is not None:
+            table = table.filter(pc.equal(pc.utf8_lower(table["city"]), normalize_city(city)))
+        if hotel is not None:
+            table = table.filter(pc.equal(table["hotel"], hotel))
+        return table
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_review_store():
+    """Process-wide ReviewStore, loaded with REVIEW_CORPORA the first time."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = ReviewStore()
+                for path in REVIEW_CORPORA:
+                    if os.path.exists(path):
+                        store.ingest_csv(path)
+                _store = store
+    return _store
@@ -3,6 +3,7 @@ import requests
 import pandas as pd
 from textblob import TextBlob
 from dotenv import load_dotenv
+from utils.metrics import provider_call
 
 load_dotenv()
 
@@ -11,8 +12,9 @@ API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 # Function to fetch reviews from Google Places API
 def fetch_reviews(place_id):
     url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&fields=name,reviews&key={API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    with provider_call("google_places", "place_details") as call:
+        response = call.check_status(requests.get(url))
+        data = response.json()
 
     if "reviews" in data.get("result", {}):
         return [{"Location": data["result"]["name"], "Review": rev["text"]} for rev in data["result"]["reviews"]]
@@ -0,0 +1,245 @@
+import heapq
+import json
+import os
+
+import dotenv
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from sklearn.neighbors import BallTree
+
+from utils.route_planner import EARTH_RADIUS_KM
+
+dotenv.load_dotenv()
+
+# Overpass-style JSON export ({"elements": [...]}) of the city's roads
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH")
+# Bound on the dense rows one batch of shortest-path searches may hold before the target columns are kept
+TIME_MATRIX_CHUNK_BYTES = 64 * 1024 * 1024
+# Stops further than this from every graph node are off the map (e.g. another city) and get no road times
+ROAD_MAX_SNAP_M = 300.0
+
+HIGHWAY_CLASSES = [
+    "motorway", "trunk", "primary", "secondary", "tertiary",
+    "unclassified", "residential", "service", "living_street",
+    "cycleway", "footway", "path", "other",
+]
+HIGHWAY_INDEX = {name: i for i, name in enumerate(HIGHWAY_CLASSES)}
+
+# Free-flow speed (km/h) per highway class; 0 means the mode can't use that road
+MODE_SPEEDS = {
+    "scooter": {"motorway": 0, "trunk": 0, "primary": 25, "secondary": 25, "tertiary": 22,
+                "unclassified": 20, "residential": 18, "service": 12, "living_street": 10,
+                "cycleway": 18, "footway": 0, "path": 10, "other": 15},
+    "car": {"motorway": 70, "trunk": 55, "primary": 40, "secondary": 35, "tertiary": 30,
+            "unclassified": 25, "residential": 20, "service": 12, "living_street": 10,
+            "cycleway": 0, "footway": 0, "path": 0, "other": 20},
+    "bus": {"motorway": 55, "trunk": 45, "primary": 30, "secondary": 25, "tertiary": 22,
+            "unclassified": 18, "residential": 15, "service": 0, "living_street": 0,
+            "cycleway": 0, "footway": 0, "path": 0, "other": 15},
+    "walk": {"motorway": 0, "trunk": 0, "primary": 4.5, "secondary": 4.5, "tertiary": 4.5,
+             "unclassified": 4.5, "residential": 4.5, "service": 4.5, "living_street": 4.5,
+             "cycleway": 4.5, "footway": 4.5, "path": 4, "other": 4.5},
+}
+
+
+class RoadGraph:
+    """Directed road graph stored as CSR arrays with per-mode travel-time weights."""
+
+    def __init__(self, node_ids, coords, indptr, indices, length_m, highway):
+        self.node_ids = node_ids          # int64 OSM ids, position = internal index
+        self.coords = coords              # float64 (n, 2) lat/lon in degrees
+        self.indptr = indptr              # int64 (n + 1,)
+        self.indices = indices            # int32 (m,) edge heads
+        self.length_m = length_m          # float32 (m,)
+        self.highway = highway            # uint8 (m,) index into HIGHWAY_CLASSES
+        self._tree = BallTree(np.radians(coords), metric="haversine")
+        self._weights = {}
+        self._matrices = {}
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    def edge_seconds(self, mode):
+        """Per-edge travel time in seconds for a mode; unusable edges are inf."""
+        if mode not in self._weights:
+            speeds = np.array([MODE_SPEEDS[mode][name] for name in HIGHWAY_CLASSES], dtype=np.float32)
+            edge_speed = speeds[self.highway] / 3.6  # m/s
+            with np.errstate(divide="ignore"):
+                self._weights[mode] = np.where(edge_speed > 0, self.length_m / edge_speed, np.inf).astype(np.float32)
+        return self._weights[mode]
+
+    def _matrix(self, mode):
+        """Sparse adjacency for scipy's csgraph routines (unusable edges dropped)."""
+        if mode not in self._matrices:
+            weights = self.edge_seconds(mode)
+            usable = np.isfinite(weights)
+            rows = np.repeat(np.arange(self.num_nodes, dtype=np.int64), np.diff(self.indptr))[usable]
+            cols = self.indices[usable].astype(np.int64)
+            weights = weights[usable]
+            # Overlapping OSM ways give parallel edges, which csr_matrix would add together; keep the fastest
+            keys = rows * self.num_nodes + cols
+            order = np.lexsort((weights, keys))
+            _, first = np.unique(keys[order], return_index=True)
+            keep = order[first]
+            self._matrices[mode] = csr_matrix(
+                (weights[keep], (rows[keep], cols[keep])),
+                shape=(self.num_nodes, self.num_nodes),
+            )
+        return self._matrices[mode]
+
+    def nearest_nodes(self, coords):
+        """Snaps (lat, lon) pairs to their closest graph nodes; returns (node indices, snap distances in metres)."""
+        points = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+        dist, idx = self._tree.query(points, k=1)
+        return idx[:, 0], dist[:, 0] * EARTH_RADIUS_KM * 1000
+
+    def shortest_time(self, source, target, mode):
+        """A* travel time in seconds between two node indices (inf if unreachable).
+
+        The heuristic is the straight-line distance at the mode's top speed,
+        which never overestimates, so the first time `target` is popped is optimal.
+        """
+        weights = self.edge_seconds(mode)
+        max_speed = max(MODE_SPEEDS[mode].values()) / 3.6
+        target_lat, target_lon = self.coords[target]
+
+        def heuristic(node):
+            lat, lon = self.coords[node]
+            return float(_haversine_m(lat, lon, target_lat, target_lon)) / max_speed
+
+        best = {source: 0.0}
+        queue = [(heuristic(source), 0.0, source)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                return cost
+            if cost > best.get(node, np.inf):
+                continue
+            for edge in range(self.indptr[node], self.indptr[node + 1]):
+                weight = weights[edge]
+                if not np.isfinite(weight):
+                    continue
+                head = int(self.indices[edge])
+                new_cost = cost + float(weight)
+                if new_cost < best.get(head, np.inf):
+                    best[head] = new_cost
+                    heapq.heappush(queue, (new_cost + heuristic(head), new_cost, head))
+        return np.inf
+
+    def time_matrix(self, sources, targets, mode, limit=np.inf):
+        """Many-to-many travel times (seconds) between node indices; inf if unreachable within `limit`.
+
+        Each search yields a dense row over the whole graph, so sources are run
+        in batches that fit TIME_MATRIX_CHUNK_BYTES and only the target columns
+        are kept.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        unique_sources, inverse = np.unique(sources, return_inverse=True)
+        graph = self._matrix(mode)
+        chunk = max(1, TIME_MATRIX_CHUNK_BYTES // (8 * self.num_nodes))
+        times = np.empty((len(unique_sources), len(targets)), dtype=np.float64)
+        for start in range(0, len(unique_sources), chunk):
+            rows = dijkstra(graph, directed=True, indices=unique_sources[start:start + chunk], limit=limit)
+            times[start:start + chunk] = rows[:, targets]
+        return times[inverse]
+
+    def travel_time_matrix(self, coords, mode, limit_min=np.inf):
+        """Travel-time matrix in minutes between every pair of (lat, lon) stops.
+
+        Legs to or from a stop more than ROAD_MAX_SNAP_M from the graph are inf,
+        like unreachable ones, so callers fall back to their own estimate.
+        """
+        nodes, snap_m = self.nearest_nodes(coords)
+        minutes = self.time_matrix(nodes, nodes, mode, limit=limit_min * 60.0) / 60.0
+        off_graph = snap_m > ROAD_MAX_SNAP_M
+        minutes[off_graph, :] = np.inf
+        minutes[:, off_graph] = np.inf
+        return minutes
+
+    def save(self, path):
+        np.savez(path, node_ids=self.node_ids, coords=self.coords, indptr=self.indptr,
+                 indices=self.indices, length_m=self.length_m, highway=self.highway)
+
+    @classmethod
+    def load_compiled(cls, path):
+        arrays = np.load(path)
+        return cls(arrays["node_ids"], arrays["coords"], arrays["indptr"],
+                   arrays["indices"], arrays["length_m"], arrays["highway"])
+
+
+def _haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def build_graph_from_osm(elements):
+    """Compiles Overpass-style node/way elements into a RoadGraph."""
+    node_ids = []
+    coords = []
+    ways = []
+    for element in elements:
+        if element.get("type") == "node":
+            node_ids.append(element["id"])
+            coords.append((element["lat"], element["lon"]))
+        elif element.get("type") == "way" and "highway" in element.get("tags", {}):
+            ways.append(element)
+
+    node_ids = np.array(node_ids, dtype=np.int64)
+    coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+    position = {osm_id: i for i, osm_id in enumerate(node_ids.tolist())}
+
+    tails, heads, classes = [], [], []
+    for way in ways:
+        tags = way["tags"]
+        highway = HIGHWAY_INDEX.get(tags["highway"], HIGHWAY_INDEX["other"])
+        oneway = tags.get("oneway") in ("yes", "true", "1")
+        refs = [position.get(ref) for ref in way["nodes"]]
+        for a, b in zip(refs[:-1], refs[1:]):
+            # A ref missing from the export splits the way; its neighbours aren't actually adjacent
+            if a is None or b is None:
+                continue
+            tails.append(a)
+            heads.append(b)
+            classes.append(highway)
+            if not oneway:
+                tails.append(b)
+                heads.append(a)
+                classes.append(highway)
+
+    tails = np.array(tails, dtype=np.int64)
+    heads = np.array(heads, dtype=np.int32)
+    classes = np.array(classes, dtype=np.uint8)
+    length_m = _haversine_m(coords[tails, 0], coords[tails, 1], coords[heads, 0], coords[heads, 1]).astype(np.float32)
+
+    order = np.argsort(tails, kind="stable")
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=len(node_ids)), out=indptr[1:])
+
+    return RoadGraph(node_ids, coords, indptr, heads[order], length_m[order], classes[order])
+
+
+def load_road_graph(path):
+    """Loads a road graph, reusing the compiled .npz next to the JSON export when it's fresh."""
+    compiled = os.path.splitext(path)[0] + ".npz"
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= os.path.getmtime(path):
+        return RoadGraph.load_compiled(compiled)
+
+    with open(path, encoding="utf-8") as f:
+        graph = build_graph_from_osm(json.load(f).get("elements", []))
+    graph.save(compiled)
+    return graph
+
+
+_graph = None
+
+
+def get_road_graph():
+    """Process-wide road graph from ROAD_GRAPH_PATH, or None if none is configured."""
+    global _graph
+    if _graph is None and ROAD_GRAPH_PATH and os.path.exists(ROAD_GRAPH_PATH):
+        _graph = load_road_graph(ROAD_GRAPH_PATH)
+    return _graph
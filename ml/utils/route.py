@@ -1,9 +1,15 @@
 import os
+import threading
 import openai
 import dotenv
-import random
-from pymongo import MongoClient
+import numpy as np
+from functools import lru_cache
+from geopy.geocoders import Nominatim
 from utils.itinerary import generate_itinerary
+from utils.metrics import provider_call, record_cache
+from utils.road_network import get_road_graph
+from utils.route_planner import haversine_matrix, plan_day_route
+from utils.route_store import get_route_store
 
 
 dotenv.load_dotenv()
@@ -11,17 +17,16 @@ dotenv.load_dotenv()
 # OpenAI API Key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# MongoDB Configuration
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(MONGO_URI)
-db = client['TravelPlannerDB']
-routes_collection = db['SustainableRoutes']
+geolocator = Nominatim(user_agent="LOC Project")
+
+# Road searches stop at this many minutes; longer legs fall back to the straight-line estimate
+ROAD_MAX_LEG_MIN = 240
 
 TRANSPORT_OPTIONS = {
-    "solo": {"mode": "electric scooter or shared e-bike", "speed_kmh": 20},
-    "couple": {"mode": "EV taxi or rickshaw", "speed_kmh": 40},
-    "small_group": {"mode": "shared ride-hailing service (e.g., Uber Green)", "speed_kmh": 35},
-    "large_group": {"mode": "electric minivan or public bus", "speed_kmh": 25}
+    "solo": {"mode": "electric scooter or shared e-bike", "speed_kmh": 20, "profile": "scooter"},
+    "couple": {"mode": "EV taxi or rickshaw", "speed_kmh": 40, "profile": "car"},
+    "small_group": {"mode": "shared ride-hailing service (e.g., Uber Green)", "speed_kmh": 35, "profile": "car"},
+    "large_group": {"mode": "electric minivan or public bus", "speed_kmh": 25, "profile": "bus"}
 }
 
 def get_sustainable_transport(num_people):
@@ -39,42 +44,132 @@ def estimate_travel_time(distance_km, speed_kmh):
     """Estimates travel time based on distance and vehicle speed."""
     return round(distance_km / speed_kmh * 60)  # Convert hours to minutes
 
+# Set by _geocode_cached when it actually runs, i.e. on a cache miss; per thread so concurrent lookups don't mix
+_geocode_lookup = threading.local()
+
+@lru_cache(maxsize=1024)
+def _geocode_cached(name):
+    _geocode_lookup.missed = True
+    try:
+        with provider_call("nominatim", "geocode"):
+            location = geolocator.geocode(name, exactly_one=True)
+    except Exception as e:
+        print(f"Error geocoding {name}: {e}")
+        return None
+    if location is None:
+        return None
+    return location.latitude, location.longitude
+
+def geocode_place(name):
+    """Resolves a place name to (lat, lon), or None if it can't be found."""
+    _geocode_lookup.missed = False
+    coords = _geocode_cached(name)
+    record_cache("nominatim", not _geocode_lookup.missed)
+    return coords
+
+def get_stop_coords(stop, place):
+    """Uses coordinates embedded in the activity if present, otherwise geocodes its location."""
+    coords = stop.get("coordinates")
+    if isinstance(coords, dict) and "lat" in coords and "lng" in coords:
+        return float(coords["lat"]), float(coords["lng"])
+    return geocode_place(f"{stop['location']}, {place}")
+
+def collect_day_stops(day, hotel):
+    """Unique activity locations of a day, skipping the hotel itself."""
+    stops = []
+    seen = {hotel.strip().lower()}
+    for activity in day.get("activities", []):
+        location = (activity.get("location") or "").strip()
+        if not location or location.lower() in seen:
+            continue
+        seen.add(location.lower())
+        stops.append(activity)
+    return stops
+
+def plan_day(day, hotel, hotel_coords, place, transport_details):
+    """Orders a day's stops into a hotel-to-hotel loop and estimates every leg."""
+    stops = []
+    coords = []
+    unresolved = []
+    for stop in collect_day_stops(day, hotel):
+        stop_coords = get_stop_coords(stop, place)
+        if stop_coords is None:
+            unresolved.append(stop["location"])
+        else:
+            stops.append(stop)
+            coords.append(stop_coords)
+
+    if not stops:
+        return None
+
+    # Without a resolvable hotel the first stop of the day anchors the loop
+    if hotel_coords is None:
+        start_name, start_coords = stops[0]["location"], coords[0]
+        stops, coords = stops[1:], coords[1:]
+    else:
+        start_name, start_coords = hotel, hotel_coords
+
+    if not stops:
+        return None
+
+    # All of the day's legs in one many-to-many query when a road graph is available
+    road_graph = get_road_graph()
+    road_minutes = None
+    cost = None
+    if road_graph is not None:
+        road_minutes = road_graph.travel_time_matrix([start_coords] + coords, transport_details["profile"],
+                                                     limit_min=ROAD_MAX_LEG_MIN)
+        estimate = haversine_matrix([start_coords] + coords) / transport_details["speed_kmh"] * 60
+        minutes = np.where(np.isfinite(road_minutes), road_minutes, estimate)
+        # The tour heuristics need symmetric costs; one-way streets make road times slightly asymmetric
+        cost = (minutes + minutes.T) / 2
+
+    order, dist = plan_day_route(start_coords, coords, cost)
+    path = [0] + [idx + 1 for idx in order] + [0]
+    names = [start_name] + [stop["location"] for stop in stops]
+
+    route_details = []
+    total_km = 0.0
+    for a, b in zip(path[:-1], path[1:]):
+        distance_km = float(dist[a, b])
+        total_km += distance_km
+        if road_minutes is not None and np.isfinite(road_minutes[a, b]):
+            travel_time = round(float(road_minutes[a, b]))
+        else:
+            travel_time = estimate_travel_time(distance_km, transport_details["speed_kmh"])
+        route_details.append({
+            "from": names[a],
+            "to": names[b],
+            "transport_mode": transport_details["mode"],
+            "distance_km": round(distance_km, 2),
+            "estimated_time_min": travel_time
+        })
+
+    return {
+        "route_plan": route_details,
+        "total_distance_km": round(total_km, 2),
+        "unresolved_stops": unresolved
+    }
+
 def generate_routes(data):
     """Creates optimized travel routes based on an itinerary with sustainability in mind."""
     itinerary_response, status_code = generate_itinerary(data)
     if status_code != 200:
         return itinerary_response, status_code
 
-    itinerary = itinerary_response["itinerary"]
     tourists = data["numberOfPeople"]
+    place = data["placesToVisit"]
+    hotel = data["currentStay"]
     transport_details = get_sustainable_transport(tourists)
+    hotel_coords = geocode_place(f"{hotel}, {place}")
 
     sustainable_routes = {}
 
-    for day, schedule in itinerary.items():
-        places = []
-        for period in ["Morning", "Afternoon", "Evening"]:
-            if period in schedule:
-                places.extend(schedule[period])
-
-        if len(places) < 2:
-            continue  # Skip if there's only one place (no travel needed)
-
-        route_details = []
-        for i in range(len(places) - 1):
-            start = places[i]
-            end = places[i + 1]
-            distance_km = random.uniform(2, 15)  # Simulated distance in km
-            travel_time = estimate_travel_time(distance_km, transport_details["speed_kmh"])
-
-            route_details.append({
-                "from": start,
-                "to": end,
-                "transport_mode": transport_details["mode"],
-                "estimated_time_min": travel_time
-            })
-
-        sustainable_routes[day] = {"route_plan": route_details}
+    for day in itinerary_response.get("days", []):
+        day_plan = plan_day(day, hotel, hotel_coords, place, transport_details)
+        if day_plan is None:
+            continue  # Nothing to route for this day
+        sustainable_routes[f"Day {day.get('day', len(sustainable_routes) + 1)}"] = day_plan
 
     # Save routes to MongoDB
     route_data = {
@@ -83,8 +178,9 @@ def generate_routes(data):
         "dateOfVisit": data["dateOfVisit"],
         "sustainable_routes": sustainable_routes
     }
-    result = routes_collection.insert_one(route_data)
-    route_data["_id"] = str(result.inserted_id)  # Convert ObjectId to string
+    # Persisted write-behind; the id is assigned up front so it can be returned now
+    route_id = get_route_store().add(dict(route_data))
+    route_data["_id"] = str(route_id)  # Convert ObjectId to string
 
     return {"message": "Route generated successfully", "data": route_data}, 200
 
@@ -0,0 +1,131 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Moves must beat this many km to count as an improvement (avoids float ping-pong)
+IMPROVEMENT_EPS = 1e-9
+
+
+def haversine_matrix(coords):
+    """Builds a symmetric great-circle distance matrix (km) from (lat, lon) pairs."""
+    coords = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat = coords[:, 0][:, None]
+    lon = coords[:, 1][:, None]
+
+    dlat = lat - lat.T
+    dlon = lon - lon.T
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lat.T) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tour_length(tour, dist):
+    """Total distance of a tour given as a sequence of matrix indices."""
+    tour = np.asarray(tour)
+    return float(dist[tour[:-1], tour[1:]].sum())
+
+
+def nearest_neighbour_tour(dist, start=0):
+    """Greedy closed tour that always moves to the closest unvisited stop."""
+    n = dist.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    tour = [start]
+
+    current = start
+    for _ in range(n - 1):
+        candidates = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(candidates))
+        visited[current] = True
+        tour.append(current)
+
+    tour.append(start)
+    return np.array(tour, dtype=np.int64)
+
+
+def two_opt(tour, dist):
+    """Reverses tour segments while that shortens the tour. Endpoints stay fixed."""
+    tour = np.array(tour, dtype=np.int64)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(tour) - 2):
+            a, b = tour[i - 1], tour[i]
+            c, e = tour[i + 1:-1], tour[i + 2:]
+            delta = dist[a, c] + dist[b, e] - dist[a, b] - dist[c, e]
+            best = int(np.argmin(delta))
+            if delta[best] < -IMPROVEMENT_EPS:
+                j = i + 1 + best
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                improved = True
+    return tour
+
+
+def or_opt(tour, dist, max_segment=3):
+    """Relocates runs of 1..max_segment stops (optionally reversed) to cheaper positions."""
+    tour = np.array(tour, dtype=np.int64)
+    improved = True
+    while improved:
+        improved = False
+        for k in range(1, max_segment + 1):
+            for i in range(1, len(tour) - k):
+                segment = tour[i:i + k]
+                first, last = segment[0], segment[-1]
+                prev, nxt = tour[i - 1], tour[i + k]
+                removal_gain = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+                rest = np.concatenate((tour[:i], tour[i + k:]))
+                u, v = rest[:-1], rest[1:]
+                forward = dist[u, first] + dist[last, v] - dist[u, v]
+                backward = dist[u, last] + dist[first, v] - dist[u, v]
+                # Re-inserting between prev and nxt is the current tour
+                forward[i - 1] = np.inf
+                backward[i - 1] = np.inf
+
+                j_fwd = int(np.argmin(forward))
+                j_bwd = int(np.argmin(backward))
+                if forward[j_fwd] <= backward[j_bwd]:
+                    j, cost, moved = j_fwd, forward[j_fwd], segment
+                else:
+                    j, cost, moved = j_bwd, backward[j_bwd], segment[::-1]
+
+                if cost - removal_gain < -IMPROVEMENT_EPS:
+                    tour = np.concatenate((rest[:j + 1], moved, rest[j + 1:]))
+                    improved = True
+                    break
+            if improved:
+                break
+    return tour
+
+
+def solve_tour(dist, start=0, max_rounds=10):
+    """Closed visiting order starting and ending at `start` (nearest neighbour + 2-opt + Or-opt)."""
+    n = dist.shape[0]
+    if n <= 3:
+        order = [start] + [i for i in range(n) if i != start] + [start]
+        return np.array(order, dtype=np.int64)
+
+    tour = nearest_neighbour_tour(dist, start)
+    best_length = tour_length(tour, dist)
+    for _ in range(max_rounds):
+        tour = or_opt(two_opt(tour, dist), dist)
+        length = tour_length(tour, dist)
+        if length >= best_length - IMPROVEMENT_EPS:
+            break
+        best_length = length
+    return tour
+
+
+def plan_day_route(hotel_coords, stop_coords, cost=None):
+    """Optimal-ish visiting order for one day's stops, leaving from and returning to the hotel.
+
+    Returns (order, dist) where `order` indexes `stop_coords` and `dist` is the
+    distance matrix with the hotel at index 0 and stop i at index i + 1. The
+    order minimises `cost` (same layout, e.g. road travel minutes) when given,
+    distance otherwise; it must be symmetric.
+    """
+    coords = np.vstack([np.asarray(hotel_coords, dtype=np.float64).reshape(1, 2),
+                        np.asarray(stop_coords, dtype=np.float64).reshape(-1, 2)])
+    dist = haversine_matrix(coords)
+    tour = solve_tour(dist if cost is None else cost, start=0)
+    order = [int(idx) - 1 for idx in tour[1:-1]]
+    return order, dist
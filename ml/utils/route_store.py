@@ -0,0 +1,187 @@
+import atexit
+import os
+import threading
+import time
+
+import dotenv
+from bson import ObjectId
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import BulkWriteError
+
+from utils.metrics import record_route_drop
+
+dotenv.load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "2"))
+
+# Flush the buffer once it holds this many documents or this many seconds have passed
+ROUTE_FLUSH_BATCH_SIZE = int(os.getenv("ROUTE_FLUSH_BATCH_SIZE", "100"))
+ROUTE_FLUSH_INTERVAL_S = float(os.getenv("ROUTE_FLUSH_INTERVAL_S", "2.0"))
+# Most documents held while Mongo is unreachable; the oldest are dropped beyond this
+ROUTE_MAX_BUFFERED = int(os.getenv("ROUTE_MAX_BUFFERED", "10000"))
+# Flushes a document the server rejects (validation, size...) is retried in before it is dropped
+ROUTE_MAX_ATTEMPTS = 5
+
+# Fields returned by list reads; the compound index below holds all of them, _id included, so the reads are covered
+ROUTE_SUMMARY_PROJECTION = {"_id": 1, "name": 1, "dateOfVisit": 1, "numberOfPeople": 1}
+
+
+def create_mongo_client(uri=MONGO_URI):
+    """MongoClient with pool sizes tuned for short bulk writes from a few app threads."""
+    return MongoClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=60_000,
+        connect=False,
+    )
+
+
+class RouteStore:
+    """Write-behind store for route plans: buffers inserts and flushes them with insert_many.
+
+    Batches that fail as a whole (server unreachable) go back in the buffer,
+    which holds at most `max_buffered` documents. Documents the server
+    rejects individually are retried up to ROUTE_MAX_ATTEMPTS flushes.
+    Drops of either kind are counted in route_store_dropped_documents_total.
+    """
+
+    def __init__(self, collection, batch_size=ROUTE_FLUSH_BATCH_SIZE, flush_interval=ROUTE_FLUSH_INTERVAL_S,
+                 max_buffered=ROUTE_MAX_BUFFERED):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self._buffer = []
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._indexes_ready = False
+        self._flusher = threading.Thread(target=self._run, name="route-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def ensure_indexes(self):
+        if self._indexes_ready:
+            return
+        # _id last so summaries, which carry it for find_route, are answered from the index alone
+        self.collection.create_index([("name", ASCENDING), ("dateOfVisit", ASCENDING), ("numberOfPeople", ASCENDING),
+                                      ("_id", ASCENDING)])
+        self.collection.create_index([("dateOfVisit", ASCENDING)])
+        self._indexes_ready = True
+
+    def add(self, document):
+        """Queues a route document and returns its id (assigned client-side, before the write)."""
+        document.setdefault("_id", ObjectId())
+        with self._lock:
+            self._buffer.append(document)
+            self._trim()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return document["_id"]
+
+    def _trim(self):
+        """Drops the oldest documents beyond max_buffered. Call with _lock held."""
+        overflow = len(self._buffer) - self.max_buffered
+        if overflow > 0:
+            for document in self._buffer[:overflow]:
+                self._attempts.pop(document["_id"], None)
+            del self._buffer[:overflow]
+            record_route_drop("overflow", overflow)
+
+    def _requeue(self, documents):
+        with self._lock:
+            self._buffer = documents + self._buffer
+            self._trim()
+
+    def flush(self):
+        """Writes everything buffered so far in a single unordered bulk insert."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            failed = []
+            try:
+                self.ensure_indexes()
+                self.collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate ids are retries of documents already written; the rest are tried again
+                errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                if errors:
+                    print(f"Error flushing {len(errors)} route documents: {errors[0].get('errmsg')}")
+                failed = [batch[err["index"]] for err in errors]
+            except Exception as e:
+                # Put the batch back so the next flush retries it
+                print(f"Error flushing route documents: {e}")
+                self._requeue(batch)
+                return 0
+            retried = {document["_id"] for document in failed}
+            for document in batch:
+                if document["_id"] not in retried:
+                    self._attempts.pop(document["_id"], None)
+            self._retry(failed)
+            return len(batch) - len(failed)
+
+    def _retry(self, documents):
+        """Re-queues documents the server rejected, dropping those out of attempts."""
+        retry = []
+        for document in documents:
+            attempts = self._attempts.get(document["_id"], 0) + 1
+            if attempts >= ROUTE_MAX_ATTEMPTS:
+                self._attempts.pop(document["_id"], None)
+                record_route_drop("rejected")
+            else:
+                self._attempts[document["_id"]] = attempts
+                retry.append(document)
+        if retry:
+            self._requeue(retry)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        self._stopped = True
+        self._wakeup.set()
+        self._flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def find_route(self, route_id):
+        """Full route document by id, including anything still waiting in the buffer."""
+        route_id = ObjectId(route_id) if not isinstance(route_id, ObjectId) else route_id
+        with self._lock:
+            for document in self._buffer:
+                if document["_id"] == route_id:
+                    return document
+        return self.collection.find_one({"_id": route_id})
+
+    def find_routes(self, name, date=None, limit=50):
+        """Route summaries for a traveller, projected to indexed fields only."""
+        query = {"name": name}
+        if date is not None:
+            query["dateOfVisit"] = date
+        cursor = self.collection.find(query, ROUTE_SUMMARY_PROJECTION).sort("dateOfVisit", ASCENDING).limit(limit)
+        return list(cursor)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_route_store():
+    """Process-wide RouteStore backed by TravelPlannerDB.SustainableRoutes."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                client = create_mongo_client()
+                _store = RouteStore(client["TravelPlannerDB"]["SustainableRoutes"])
+                atexit.register(_store.close)
+    return _store
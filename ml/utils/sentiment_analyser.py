@@ -1,27 +1,23 @@
+import sys
+
 import pandas as pd
 import torch
-from transformers import BertTokenizer, BertForSequenceClassification
 from torch.utils.data import DataLoader, Dataset
 import torch.nn.functional as F
 
-# Load the dataset
-file_path = 'D:/djsanghvi/hacks/LOC-WhyTorch/ml/riya/utils/hotel_reviews_india.csv'
-df = pd.read_csv(file_path)
-
-# Check column names
-print(df.head())  # Ensure the correct column name for reviews
+from utils.sentiment_multilingual import get_sentiment_model
 
 # Assuming the reviews are in a column named 'review_text'
 class ReviewDataset(Dataset):
-    def _init_(self, texts, tokenizer, max_length=128):
+    def __init__(self, texts, tokenizer, max_length=128):
         self.texts = texts
         self.tokenizer = tokenizer
         self.max_length = max_length
-    
-    def _len_(self):
+
+    def __len__(self):
         return len(self.texts)
-    
-    def _getitem_(self, idx):
+
+    def __getitem__(self, idx):
         text = str(self.texts[idx])
         encoding = self.tokenizer(
             text,
@@ -32,15 +28,12 @@ class ReviewDataset(Dataset):
         )
         return {key: val.squeeze(0) for key, val in encoding.items()}
 
-# Load pre-trained BERT model and tokenizer
-tokenizer = BertTokenizer.from_pretrained('nlptown/bert-base-multilingual-uncased-sentiment')
-model = BertForSequenceClassification.from_pretrained('nlptown/bert-base-multilingual-uncased-sentiment')
-model.eval()
-
 def predict_sentiment(reviews):
+    # Pre-trained BERT model and tokenizer, shared with the multilingual classifier
+    tokenizer, model = get_sentiment_model()
     dataset = ReviewDataset(reviews, tokenizer)
     dataloader = DataLoader(dataset, batch_size=16, shuffle=False)
-    
+
     sentiments = []
     with torch.no_grad():
         for batch in dataloader:
@@ -48,16 +41,20 @@ def predict_sentiment(reviews):
             attention_mask = batch['attention_mask']
             outputs = model(input_ids, attention_mask=attention_mask)
             scores = F.softmax(outputs.logits, dim=1)
-            sentiment_scores = torch.arange(-10, 11, step=20/5).float()
+            sentiment_scores = torch.linspace(-10, 10, scores.shape[1])  # one value per star rating
             sentiment_values = torch.matmul(scores, sentiment_scores)
             sentiments.extend(sentiment_values.numpy())
-    
+
     return sentiments
 
-# Perform sentiment analysis
-df['sentiment_score'] = predict_sentiment(df['Review'])
+if __name__ == "__main__":
+    # Load the dataset
+    df = pd.read_csv(sys.argv[1] if len(sys.argv) > 1 else 'data/hotel_reviews_india.csv')
+
+    # Perform sentiment analysis
+    df['sentiment_score'] = predict_sentiment(df['Review'])
 
-# Save results
-df.to_csv('D:/djsanghvi/hacks/LOC-WhyTorch/ml/riya/utils/hotel_reviews_with_sentiment.csv', index=False)
+    # Save results
+    df.to_csv('hotel_reviews_with_sentiment.csv', index=False)
 
-print("Sentiment analysis complete! Results saved as hotel_reviews_with_sentiment.csv")
\ No newline at end of file
+    print("Sentiment analysis complete! Results saved as hotel_reviews_with_sentiment.csv")
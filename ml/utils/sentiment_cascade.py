@@ -0,0 +1,87 @@
+import os
+import re
+from collections import namedtuple
+
+import dotenv
+
+from utils.reviews import get_sentiment
+
+dotenv.load_dotenv()
+
+# TextBlob polarity (-1..1) at least this far from neutral is trusted without the transformer
+SENTIMENT_CASCADE_MARGIN = float(os.getenv("SENTIMENT_CASCADE_MARGIN", "0.3"))
+# Share of a text's letters that must be ASCII for it to count as English
+ENGLISH_MIN_ASCII_SHARE = 0.9
+# Share of words that must be common English function words for longer ASCII text to count as English
+ENGLISH_MIN_STOPWORD_SHARE = 0.15
+# Below this many words the stopword share says little ("Excellent sustainable practices."), so it isn't checked
+ENGLISH_STOPWORD_MIN_WORDS = 12
+
+ENGLISH_STOPWORDS = frozenset(
+    "a an the and or but so of to in on at for with from by as is are was were be been it its this that "
+    "they we i you he she not no very too our their my".split()
+)
+WORD_PATTERN = re.compile(r"[A-Za-z']+")
+# The clause after one of these carries the verdict: "lovely garden, but the food was cold"
+CONTRAST_PATTERN = re.compile(r"\b(?:but|however|though|although|yet|except|despite)\b", re.IGNORECASE)
+
+# stage: "lexicon" or "transformer"; reason: "confident", "non_english" or "uncertain"
+Verdict = namedtuple("Verdict", "label stage reason")
+
+
+def ascii_letter_share(text):
+    letters = [char for char in text if char.isalpha()]
+    return sum(char.isascii() for char in letters) / len(letters) if letters else 0.0
+
+
+def is_english(text):
+    """Mostly ASCII letters and, for longer texts, enough English function words (which romanised Hindi lacks)."""
+    if ascii_letter_share(text) < ENGLISH_MIN_ASCII_SHARE:
+        return False
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < ENGLISH_STOPWORD_MIN_WORDS:
+        return True
+    return sum(word in ENGLISH_STOPWORDS for word in words) / len(words) >= ENGLISH_MIN_STOPWORD_SHARE
+
+
+def lexicon_polarity(text):
+    """TextBlob polarity of the clause that carries the verdict (the whole text without a contrast)."""
+    parts = CONTRAST_PATTERN.split(text, maxsplit=1)
+    focus = parts[1] if len(parts) > 1 and parts[1].strip(" ,.!") else text
+    return get_sentiment(focus)
+
+
+def lexicon_verdict(text, margin=SENTIMENT_CASCADE_MARGIN):
+    """GREEN/RED from the lexicon alone, or None when it isn't sure enough."""
+    polarity = lexicon_polarity(text)
+    if abs(polarity) < margin:
+        return None
+    return "GREEN" if polarity > 0 else "RED"
+
+
+def classify_reviews(reviews, transformer=None, margin=SENTIMENT_CASCADE_MARGIN):
+    """Verdicts for a batch of reviews: confident English ones from the lexicon, the rest from the transformer.
+
+    `transformer` takes a list of texts and returns their labels; by default
+    the multilingual BERT model, called once for all escalated reviews.
+    """
+    verdicts = [None] * len(reviews)
+    escalated = []
+    for i, review in enumerate(reviews):
+        text = str(review)
+        if not is_english(text):
+            escalated.append((i, text, "non_english"))
+            continue
+        label = lexicon_verdict(text, margin)
+        if label is None:
+            escalated.append((i, text, "uncertain"))
+        else:
+            verdicts[i] = Verdict(label, "lexicon", "confident")
+
+    if escalated:
+        if transformer is None:
+            from utils.sentiment_multilingual import classify_sentiments as transformer
+        labels = transformer([text for _, text, _ in escalated])
+        for (i, _, reason), label in zip(escalated, labels):
+            verdicts[i] = Verdict(label, "transformer", reason)
+    return verdicts
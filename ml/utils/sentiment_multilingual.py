@@ -1,24 +1,74 @@
+import os
+import sys
+import threading
+
+import dotenv
 import pandas as pd
-from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
 
-# Load the CSV file
-df = pd.read_csv("D:/djsanghvi/hacks/LOC-WhyTorch/ml/riya/utils/synthetic_reviews_unique.csv")
+dotenv.load_dotenv()
+
+# Hugging Face model id or a local directory holding the same model
+SENTIMENT_MODEL = os.getenv("SENTIMENT_MODEL", "nlptown/bert-base-multilingual-uncased-sentiment")
+
+_model = None
+_analyzer = None
+_lock = threading.Lock()
+
+
+def get_sentiment_model():
+    """(tokenizer, model) for the multilingual BERT sentiment model, loaded once per process."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                # Imported here so processes that never classify don't pay for torch
+                from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+                tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+                model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+                model.eval()
+                _model = (tokenizer, model)
+    return _model
+
+
+def get_sentiment_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        tokenizer, model = get_sentiment_model()
+        with _lock:
+            if _analyzer is None:
+                from transformers import pipeline
+
+                _analyzer = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+    return _analyzer
+
+
+def label_from_stars(stars):
+    return "GREEN" if stars in ["4 stars", "5 stars"] else "RED"
 
-# Load pre-trained multilingual BERT model for sentiment analysis
-model_name = "nlptown/bert-base-multilingual-uncased-sentiment"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
-sentiment_analyzer = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
 
 # Function to classify sentiment
 def classify_sentiment(review):
-    result = sentiment_analyzer(review[:512])[0]  # Limit to 512 tokens
-    return "GREEN" if result["label"] in ["4 stars", "5 stars"] else "RED"
+    result = get_sentiment_analyzer()(review[:512])[0]  # Limit to 512 tokens
+    return label_from_stars(result["label"])
+
+
+def classify_sentiments(reviews, batch_size=16):
+    """GREEN/RED for many reviews, run through the model in batches."""
+    results = get_sentiment_analyzer()([review[:512] for review in reviews], batch_size=batch_size)
+    return [label_from_stars(result["label"]) for result in results]
+
+
+if __name__ == "__main__":
+    # Load the CSV file
+    df = pd.read_csv(sys.argv[1] if len(sys.argv) > 1 else "data/hotel_reviews_india.csv")
+
+    # Apply classification to English and Hindi reviews; only the ones the lexicon can't call reach the model
+    from utils.sentiment_cascade import classify_reviews
 
-# Apply classification to English and Hindi reviews
-df["Sentiment"] = df["Review"].apply(classify_sentiment)
+    df["Sentiment"] = [verdict.label for verdict in classify_reviews(df["Review"].tolist())]
 
-# Save results
-df.to_csv("sentiment_analysis_results_multilingual.csv", index=False)
+    # Save results
+    df.to_csv("sentiment_analysis_results_multilingual.csv", index=False)
 
-print("Sentiment analysis completed for English and Hindi. Results saved to sentiment_analysis_results_multilingual.csv.")
\ No newline at end of file
+    print("Sentiment analysis completed for English and Hindi. Results saved to sentiment_analysis_results_multilingual.csv.")
@@ -0,0 +1,216 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+
+import dotenv
+
+from utils.tracing import span
+
+dotenv.load_dotenv()
+
+# Shared by the app's worker processes; results hold user data, so it is kept private to the app's user
+SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR", "data/singleflight")
+
+# How long a finished result is handed to requests that arrive just after it
+SINGLEFLIGHT_RESULT_TTL_S = float(os.getenv("SINGLEFLIGHT_RESULT_TTL_S", "15"))
+# Followers in other processes give up waiting and call upstream themselves after this
+SINGLEFLIGHT_WAIT_TIMEOUT_S = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT_S", "120"))
+
+# Expired result files and idle lock files are swept after every this many published results
+PRUNE_EVERY = 100
+
+
+def normalize(value):
+    """Canonical form of a request payload: trimmed, case-folded strings and sorted keys."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return {str(k): normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+def request_key(*parts):
+    """Stable hash of the normalized request parts."""
+    payload = json.dumps(normalize(list(parts)), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _try_lock(lock_file):
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _is_current(lock_file, path):
+    """Whether `path` still names the open lock file, i.e. it wasn't pruned after we opened it."""
+    try:
+        return os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino
+    except OSError:
+        return False
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent identical calls into one upstream call.
+
+    Threads in the same process wait on the leader's in-memory result. Across
+    worker processes, the leader holds an flock on a per-key lock file and
+    publishes its result to a small JSON file that followers read once the
+    lock is released.
+    """
+
+    def __init__(self, namespace, directory=SINGLEFLIGHT_DIR, result_ttl=SINGLEFLIGHT_RESULT_TTL_S,
+                 wait_timeout=SINGLEFLIGHT_WAIT_TIMEOUT_S):
+        self.directory = os.path.join(directory, namespace)
+        self.result_ttl = result_ttl
+        self.wait_timeout = wait_timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Tightens a directory made before, or by hand; fails if another user owns it
+        os.chmod(directory, 0o700)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+
+    def do(self, key, fn, shareable=lambda result: True):
+        """Returns fn()'s result, sharing one execution among concurrent callers with the same key.
+
+        Only results for which `shareable(result)` is true are published to
+        other processes; errors are never cached.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            with span("shared_wait"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_across_processes(key, fn, shareable)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _result_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_result(self, key):
+        path = self._result_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return tuple(stored["value"]) if stored.get("tuple") else stored["value"]
+
+    def _write_result(self, key, result):
+        path = self._result_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"tuple": isinstance(result, tuple), "value": result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error publishing single-flight result: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if now - entry.stat().st_mtime <= self.result_ttl:
+                    continue
+                if entry.name.endswith(".json"):
+                    os.remove(entry.path)
+                elif entry.name.endswith(".lock"):
+                    self._remove_idle_lock(entry.path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_idle_lock(path):
+        """Unlinks a lock file no process holds; anyone who opened it before the unlink reopens it."""
+        with open(path, "a") as lock_file:
+            if not _try_lock(lock_file):
+                return
+            try:
+                if _is_current(lock_file, path):
+                    os.remove(path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _acquire(self, lock_file):
+        """Waits for the per-key lock; False if another process held it past the timeout."""
+        if _try_lock(lock_file):
+            return True
+        deadline = time.monotonic() + self.wait_timeout
+        with span("shared_wait"):
+            while not _try_lock(lock_file):
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+        return True
+
+    def _do_across_processes(self, key, fn, shareable):
+        cached = self._read_result(key)
+        if cached is not None:
+            return cached
+
+        path = os.path.join(self.directory, f"{key}.lock")
+        while True:
+            lock_file = open(path, "w")
+            locked = self._acquire(lock_file)
+            if not locked or _is_current(lock_file, path):
+                break
+            # Pruned while we waited for it; a lock on the unlinked file excludes nobody
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+        with lock_file:
+            try:
+                if locked:
+                    # Whoever held the lock before us may have just published
+                    cached = self._read_result(key)
+                    if cached is not None:
+                        return cached
+                result = fn()
+                if locked and shareable(result):
+                    self._write_result(key, result)
+                return result
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,243 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import dotenv
+import numpy as np
+from scipy.sparse import csr_matrix, issparse, vstack
+
+dotenv.load_dotenv()
+
+TOURIST_FEATURES_DIR = os.getenv("TOURIST_FEATURES_DIR", "data/tourist_features")
+
+# Dimensionality of the hashed feature space shared with the matcher's vectorizer
+N_FEATURES = 2**18
+
+# Segments are grouped into size tiers (powers of 10 rows); a tier holding more
+# than this many segments is merged in the background
+SEGMENTS_PER_TIER = int(os.getenv("SEGMENTS_PER_TIER", "8"))
+# Segments at least this big are never merged again
+LARGE_SEGMENT_ROWS = int(os.getenv("LARGE_SEGMENT_ROWS", "1000000"))
+# Appends are folded into the newest segment while it stays under this many rows,
+# so profiles saved one at a time don't pile up a segment each
+APPEND_SEGMENT_ROWS = int(os.getenv("APPEND_SEGMENT_ROWS", "1000"))
+
+MANIFEST = "manifest.json"
+
+
+class FeatureSegment:
+    """One immutable, memory-mapped CSR block of tourist feature vectors."""
+
+    def __init__(self, path, n_features):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        data = np.load(os.path.join(path, "data.npy"), mmap_mode="r")
+        indices = np.load(os.path.join(path, "indices.npy"), mmap_mode="r")
+        indptr = np.load(os.path.join(path, "indptr.npy"), mmap_mode="r")
+        # int32 indices/indptr and float32 data keep scipy from copying the mapped arrays
+        self.matrix = csr_matrix((data, indices, indptr), shape=(len(self.ids), n_features), copy=False)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows_for(self, ids):
+        """Row positions of the given tourist ids present in this segment (ids are sorted)."""
+        pos = np.searchsorted(self.ids, ids)
+        pos = np.clip(pos, 0, max(len(self.ids) - 1, 0))
+        found = self.ids[pos] == ids if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        return pos[found]
+
+
+def segment_tier(n_rows):
+    return len(str(max(n_rows, 1)))
+
+
+def write_segment(root, ids, matrix):
+    """Writes a sorted-by-id CSR block as a new segment directory and returns its name."""
+    order = np.argsort(ids, kind="stable")
+    ids = np.asarray(ids, dtype=np.int32)[order]
+    matrix = csr_matrix(matrix, dtype=np.float32)[order]
+    matrix.sort_indices()
+
+    name = f"seg-{int(ids[0]):010d}-{int(ids[-1]):010d}-{uuid.uuid4().hex[:8]}"
+    tmp_path = os.path.join(root, f".tmp-{name}")
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "ids.npy"), ids)
+    np.save(os.path.join(tmp_path, "data.npy"), matrix.data.astype(np.float32))
+    np.save(os.path.join(tmp_path, "indices.npy"), matrix.indices.astype(np.int32))
+    np.save(os.path.join(tmp_path, "indptr.npy"), matrix.indptr.astype(np.int32))
+    os.replace(tmp_path, os.path.join(root, name))
+    return name
+
+
+class FeatureStore:
+    """Append-only segmented store of tourist feature vectors shared read-only across processes.
+
+    An append rewrites the newest segment with the new rows while it is small,
+    and otherwise writes a new segment; a background thread merges crowded
+    size tiers. Readers map segment files, so every worker process shares the
+    same page-cache copy. The manifest is swapped atomically under a file lock.
+    """
+
+    def __init__(self, root=TOURIST_FEATURES_DIR, n_features=N_FEATURES):
+        self.root = root
+        self.n_features = n_features
+        os.makedirs(root, exist_ok=True)
+        self._segments = {}
+        self._manifest_mtime = None
+        self._order = []
+        self._read_lock = threading.Lock()
+        self._merging = threading.Lock()
+        if not os.path.exists(os.path.join(root, MANIFEST)):
+            with self._locked():
+                if not os.path.exists(os.path.join(root, MANIFEST)):
+                    self._write_manifest([])
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        with open(os.path.join(self.root, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)["segments"]
+
+    def _write_manifest(self, segments):
+        tmp_path = os.path.join(self.root, f".{MANIFEST}.{uuid.uuid4().hex[:8]}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segments": segments}, f)
+        os.replace(tmp_path, os.path.join(self.root, MANIFEST))
+
+    def segments(self):
+        """Current segments, remapping only when another writer changed the manifest."""
+        with self._read_lock:
+            for _ in range(3):
+                mtime = os.stat(os.path.join(self.root, MANIFEST)).st_mtime_ns
+                if mtime == self._manifest_mtime:
+                    break
+                names = self._read_manifest()
+                try:
+                    self._segments = {
+                        name: self._segments.get(name) or FeatureSegment(os.path.join(self.root, name), self.n_features)
+                        for name in names
+                    }
+                except FileNotFoundError:
+                    continue  # A merge removed a segment between reading the manifest and opening it
+                self._order = names
+                self._manifest_mtime = mtime
+            return [self._segments[name] for name in self._order]
+
+    def append(self, ids, matrix):
+        """Adds feature rows for the given tourist ids, to the newest segment if it stays small."""
+        if len(ids) == 0:
+            return
+        with self._locked():
+            current = self._read_manifest()
+            last = self._open(current[-1]) if current else None
+            if last is not None and len(last) + len(ids) <= APPEND_SEGMENT_ROWS:
+                name = write_segment(self.root, np.concatenate([last.ids, np.asarray(ids, dtype=np.int32)]),
+                                     vstack([last.matrix, csr_matrix(matrix, dtype=np.float32)], format="csr"))
+                self._write_manifest(current[:-1] + [name])
+                # As after a merge, processes that still have it mapped keep valid mappings
+                shutil.rmtree(last.path, ignore_errors=True)
+            else:
+                self._write_manifest(current + [write_segment(self.root, ids, matrix)])
+        self.maybe_merge()
+
+    def _open(self, name):
+        with self._read_lock:
+            segment = self._segments.get(name)
+        return segment or FeatureSegment(os.path.join(self.root, name), self.n_features)
+
+    def _crowded_tier(self):
+        """Segments of the smallest size tier that holds too many segments, or []."""
+        tiers = {}
+        for seg in self.segments():
+            if len(seg) < LARGE_SEGMENT_ROWS:
+                tiers.setdefault(segment_tier(len(seg)), []).append(seg)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) > SEGMENTS_PER_TIER:
+                return tiers[tier]
+        return []
+
+    def maybe_merge(self):
+        if self._crowded_tier() and not self._merging.locked():
+            threading.Thread(target=self.merge_segments, name="tourist-feature-merge", daemon=True).start()
+
+    def merge_segments(self):
+        """Merges crowded size tiers; segments appended meanwhile are kept as-is."""
+        if not self._merging.acquire(blocking=False):
+            return
+        try:
+            while True:
+                small = self._crowded_tier()
+                if len(small) < 2:
+                    return
+                self._merge(small)
+        finally:
+            self._merging.release()
+
+    def _merge(self, small):
+        ids = np.concatenate([seg.ids for seg in small])
+        matrix = vstack([seg.matrix for seg in small], format="csr")
+        merged = write_segment(self.root, ids, matrix)
+
+        merged_names = {seg.name for seg in small}
+        with self._locked():
+            current = self._read_manifest()
+            if not merged_names.issubset(current):
+                # Another process merged some of these first
+                shutil.rmtree(os.path.join(self.root, merged), ignore_errors=True)
+                return
+            kept = [name for name in current if name not in merged_names]
+            # The merged segment takes the place of the first segment it replaces
+            insert_at = next(i for i, name in enumerate(current) if name in merged_names)
+            kept.insert(insert_at, merged)
+            self._write_manifest(kept)
+        # Other processes may still have these mapped; unlinking keeps their mappings valid
+        for name in merged_names:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def best_match(self, query, candidate_ids):
+        """(tourist_id, score) of the candidate with the highest dot product against `query`.
+
+        Pass `query` as a dense float32 vector when matching many batches; a
+        sparse row is densified here on every call.
+        """
+        candidate_ids = np.unique(np.asarray(candidate_ids, dtype=np.int32))
+        query = np.asarray(query.toarray() if issparse(query) else query, dtype=np.float32).ravel()
+        best_id, best_score = None, 0.0
+        for seg in self.segments():
+            rows = seg.rows_for(candidate_ids)
+            if len(rows) == 0:
+                continue
+            scores = seg.matrix[rows] @ query
+            top = int(np.argmax(scores))
+            if best_id is None or scores[top] > best_score:
+                best_id, best_score = int(seg.ids[rows[top]]), float(scores[top])
+        return best_id, best_score
+
+    def __len__(self):
+        return sum(len(seg) for seg in self.segments())
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeatureStore()
+    return _store
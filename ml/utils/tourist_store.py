@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import dotenv
+
+dotenv.load_dotenv()
+
+TOURIST_DB_PATH = os.getenv("TOURIST_DB_PATH", "data/tourists.db")
+
+# Trips starting/ending this many days apart still count as overlapping
+MATCH_DATE_SLACK_DAYS = int(os.getenv("MATCH_DATE_SLACK_DAYS", "2"))
+
+# Rows pulled from the cursor per round trip while streaming candidates
+CANDIDATE_FETCH_SIZE = 500
+
+DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tourists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS idx_tourists_destination_end
+    ON tourists (destination, end_date, start_date, name);
+"""
+
+
+def parse_date(value):
+    """Parses the date formats the frontend and the PDF extractor produce."""
+    if isinstance(value, date):
+        return value
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value}")
+
+
+def normalize_destination(place):
+    return " ".join(str(place).lower().split())
+
+
+def travel_window(tourist):
+    """(start, end) dates of a trip from `date` plus optional `enddate` or `daysofvisit`."""
+    start = parse_date(tourist["date"])
+    if tourist.get("enddate"):
+        end = parse_date(tourist["enddate"])
+    elif tourist.get("daysofvisit"):
+        end = start + timedelta(days=max(int(tourist["daysofvisit"]) - 1, 0))
+    else:
+        end = start
+    return start, max(start, end)
+
+
+class TouristStore:
+    """SQLite-backed tourist profiles indexed by destination and travel window."""
+
+    def __init__(self, path=TOURIST_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # sqlite3 connections can't be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, tourist):
+        start, end = travel_window(tourist)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO tourists (name, destination, start_date, end_date, profile) VALUES (?, ?, ?, ?, ?)",
+                (tourist["name"], normalize_destination(tourist["placetovisit"]),
+                 start.isoformat(), end.isoformat(), json.dumps(tourist)),
+            )
+        return cursor.lastrowid
+
+    def iter_candidate_ids(self, tourist, slack_days=MATCH_DATE_SLACK_DAYS):
+        """Streams id batches of profiles for the same destination whose trips overlap the tourist's window.
+
+        Profiles under the tourist's own name are left out, so a repeat submission isn't matched with itself.
+        """
+        start, end = travel_window(tourist)
+        window_start = (start - timedelta(days=slack_days)).isoformat()
+        window_end = (end + timedelta(days=slack_days)).isoformat()
+
+        # Answered from the (destination, end_date, start_date, name) index alone; seeking on
+        # end_date first skips every trip that finished before the window instead of scanning them
+        cursor = self._connection().execute(
+            "SELECT id FROM tourists "
+            "WHERE destination = ? AND end_date >= ? AND start_date <= ? AND lower(trim(name)) != ?",
+            (normalize_destination(tourist["placetovisit"]), window_start, window_end,
+             str(tourist["name"]).strip().lower()),
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(CANDIDATE_FETCH_SIZE)
+                if not rows:
+                    break
+                yield [row[0] for row in rows]
+        finally:
+            cursor.close()
+
+    def get_profile(self, tourist_id):
+        row = self._connection().execute("SELECT profile FROM tourists WHERE id = ?", (tourist_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_all(self):
+        """Streams (id, profile) for every stored tourist, oldest first."""
+        cursor = self._connection().execute("SELECT id, profile FROM tourists ORDER BY id")
+        try:
+            while True:
+                rows = cursor.fetchmany(CANDIDATE_FETCH_SIZE)
+                if not rows:
+                    break
+                for row_id, profile in rows:
+                    yield row_id, json.loads(profile)
+        finally:
+            cursor.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_tourist_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TouristStore()
+    return _store
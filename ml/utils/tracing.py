@@ -0,0 +1,170 @@
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import wraps
+
+import dotenv
+
+from utils.metrics import record_stage
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Requests slower than this log their per-stage breakdown
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "5000"))
+# Per-stage totals in a Server-Timing header for every client; requests carrying ADMIN_TOKEN always get it
+TRACE_SERVER_TIMING = os.getenv("TRACE_SERVER_TIMING", "false").lower() == "true"
+
+# id: unique within the trace; parent: id of the enclosing span, None at the top level
+Span = namedtuple("Span", "id name parent duration")
+
+# (trace, id of the innermost open span) for the request the current thread is working on
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Spans recorded while serving one request, from its own thread and any it hands work to."""
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.start = time.perf_counter()
+        self.spans = []
+        self.ids = itertools.count(1)
+        # Threads working on this request right now; the sampling profiler reads it
+        self.threads = {threading.get_ident()}
+
+    def totals(self):
+        """{stage: (seconds, calls)} over all spans, in order of finishing."""
+        totals = {}
+        for s in self.spans:
+            seconds, calls = totals.get(s.name, (0.0, 0))
+            totals[s.name] = (seconds + s.duration, calls + 1)
+        return totals
+
+    @staticmethod
+    def server_timing(totals, elapsed):
+        entries = [f"{name};dur={seconds * 1000:.1f}" + (f';desc="{calls} calls"' if calls > 1 else "")
+                   for name, (seconds, calls) in totals.items()]
+        entries.append(f"total;dur={elapsed * 1000:.1f}")
+        return ", ".join(entries)
+
+    def summary(self, parents=frozenset([None])):
+        """Top-level stages with the stages nested in each, e.g. `refine_chain 9100 ms [model 9050 ms (3 calls)]`.
+
+        Same-named spans under the same parents are summed into one entry,
+        and what is nested in it comes from those spans' own children only.
+        """
+        groups = {}
+        for s in self.spans:
+            if s.parent in parents:
+                seconds, calls, ids = groups.get(s.name, (0.0, 0, frozenset()))
+                groups[s.name] = (seconds + s.duration, calls + 1, ids | {s.id})
+        parts = []
+        for name, (seconds, calls, ids) in groups.items():
+            part = f"{name} {seconds * 1000:.0f} ms" + (f" ({calls} calls)" if calls > 1 else "")
+            nested = self.summary(ids)
+            parts.append(f"{part} [{nested}]" if nested else part)
+        return ", ".join(parts)
+
+
+def current_trace():
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def span(name):
+    """Times a stage of the current request; does nothing outside one (e.g. in background jobs).
+
+    Also usable as a decorator. Spans in worker threads belong to the request
+    only if the work was handed over through bind().
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    trace, parent = current
+    span_id = next(trace.ids)
+    token = _current.set((trace, span_id))
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _current.reset(token)
+        trace.spans.append(Span(span_id, name, parent, end - start))
+
+
+def bind(func):
+    """Wraps `func` to run as part of the current request's trace in whichever thread calls it."""
+    current = _current.get()
+    if current is None:
+        return func
+    trace = current[0]
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        joined = ident not in trace.threads
+        if joined:
+            trace.threads.add(ident)
+        token = _current.set(current)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            if joined:
+                trace.threads.discard(ident)
+    return wrapper
+
+
+def init_app(app):
+    """Traces every request: stage histograms, a Server-Timing header and a log line for slow requests.
+
+    Stage timings reveal how the service works inside, so the header goes only
+    to requests carrying ADMIN_TOKEN unless TRACE_SERVER_TIMING is set.
+
+    Register it before the other hooks so the trace covers them too.
+    """
+    from flask import g, request
+
+    from utils.profiler import has_admin_token
+
+    if not TRACING_ENABLED:
+        return
+
+    @app.before_request
+    def _start_trace():
+        trace = Trace(request.method, request.url_rule.rule if request.url_rule else "unmatched")
+        g.trace_token = _current.set((trace, None))
+        g.trace = trace
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = g.get("trace")
+        if trace is None:
+            return response
+        elapsed = time.perf_counter() - trace.start
+        totals = trace.totals()
+        for name, (seconds, _) in totals.items():
+            record_stage(trace.route, name, seconds)
+        if TRACE_SERVER_TIMING or has_admin_token(request.headers):
+            response.headers["Server-Timing"] = trace.server_timing(totals, elapsed)
+        if elapsed * 1000 >= TRACE_SLOW_MS:
+            logger.warning("Slow request %s %s took %.0f ms: %s", trace.method, trace.route, elapsed * 1000,
+                           trace.summary() or "no traced stages")
+        return response
+
+    @app.teardown_request
+    def _end_trace(exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            _current.reset(token)
@@ -1,20 +1,15 @@
-from groq import Groq
 from dotenv import load_dotenv
-import os
+from utils.llm_router import get_router
 
 load_dotenv()
 
-# Access the variables
-api_key = os.getenv("GROQ_API_KEY")
-
-client = Groq(api_key=api_key)
-
 def analyze_waste_from_url(image_url):
     """
-    Analyze waste in an image from a URL using the Groq API
+    Analyze waste in an image from a URL using the fastest healthy vision model
     """
-    chat_completion = client.chat.completions.create(
-        messages=[
+    completion = get_router().complete(
+        "detect_waste",
+        [
             {
                 "role": "user",
                 "content": [
@@ -35,7 +30,7 @@ def analyze_waste_from_url(image_url):
                 ],
             }
         ],
-        model="llama-3.2-11b-vision-preview",
+        "detect_waste",
     )
 
-    return chat_completion.choices[0].message.content
+    return completion.text